@@ -0,0 +1,163 @@
+"""Column-at-a-time scoring engine producing the same scores as ``score_components``.
+
+The row path in ``detect_anomalies`` rebuilds the count lookups, normalisers
+and four reason strings for every record. ``BatchScorer`` instead encodes each
+feature column into integer codes against the model vocabulary once, turns the
+model counts into per-code impact tables up front and scores a whole column
+with plain indexing. Reason strings are only produced on request, which
+``detect`` does for rows above the anomaly threshold.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+# (feature, weight applied to rarity, impact when the value was never seen)
+FEATURES: Tuple[Tuple[str, float, float], ...] = (
+    ("port", 0.4, 0.6),
+    ("service", 0.3, 0.5),
+    ("product", 0.2, 0.3),
+    ("combo", 0.2, 0.4),
+)
+
+SEVERITY_LEVELS = [
+    (0.85, "critical"),
+    (0.7, "high"),
+    (0.55, "medium"),
+    (0.0, "low"),
+]
+
+
+def score_to_severity(score: float) -> str:
+    for threshold, label in SEVERITY_LEVELS:
+        if score >= threshold:
+            return label
+    return "info"
+
+
+def _reason(feature: str, key: str, rarity: float, unseen: bool) -> str:
+    if feature == "port":
+        return f"Port {key} not seen during training" if unseen else f"Port {key} rarity score {rarity:.2f}"
+    if feature == "service":
+        return f"Service '{key}' unseen during training" if unseen else f"Service '{key}' rarity score {rarity:.2f}"
+    if feature == "product":
+        return f"Product '{key}' unseen during training" if unseen else f"Product '{key}' rarity score {rarity:.2f}"
+    service, port = key.rsplit("|", 1)
+    return f"Combination {service}/{port} never observed" if unseen else f"Combination {service}/{port} rarity {rarity:.2f}"
+
+
+class ImpactTable:
+    """Vocabulary and precomputed rarity/impact for one feature.
+
+    Code ``0`` is reserved for values that were not seen during training.
+    """
+
+    def __init__(self, weight: float, unseen_impact: float, counts: Dict[str, float], max_count: float) -> None:
+        self.codes: Dict[str, int] = {}
+        self.rarity = array("d", [0.0])
+        self.impact = array("d", [unseen_impact])
+        normaliser = max(max_count, 1)
+        for key, count in counts.items():
+            if count == 0:
+                continue
+            rarity = 1 - (count / normaliser)
+            self.codes[key] = len(self.rarity)
+            self.rarity.append(rarity)
+            self.impact.append(weight * rarity)
+
+    def encode(self, keys: Sequence[str]) -> array:
+        get = self.codes.get
+        return array("l", [get(key, 0) for key in keys])
+
+
+class ScoredBatch:
+    """Scores, severities and predictions for a batch; explanations are built lazily."""
+
+    def __init__(
+        self,
+        scorer: "BatchScorer",
+        keys: Dict[str, List[str]],
+        codes: Dict[str, array],
+        scores: array,
+        threshold: float,
+    ) -> None:
+        self._scorer = scorer
+        self._keys = keys
+        self._codes = codes
+        self.scores = scores
+        self.severities = [score_to_severity(score) for score in scores]
+        self.predictions = [score > threshold for score in scores]
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def explanation(self, index: int) -> List[Dict[str, Any]]:
+        explanation = []
+        for feature, _, _ in FEATURES:
+            table = self._scorer.tables[feature]
+            code = self._codes[feature][index]
+            explanation.append(
+                {
+                    "feature": feature,
+                    "impact": round(table.impact[code], 3),
+                    "reason": _reason(feature, self._keys[feature][index], table.rarity[code], code == 0),
+                }
+            )
+        return explanation
+
+
+class BatchScorer:
+    """Score whole columns of records against a baseline model.
+
+    ``model`` is either a baseline dictionary or a ``CompiledModel``, whose
+    mapped tables are used as-is.
+    """
+
+    def __init__(self, model: Any) -> None:
+        if not isinstance(model, dict):
+            self.tables = model.tables
+            return
+        totals = model.get("totals", {})
+        self.tables: Dict[str, Any] = {
+            feature: ImpactTable(
+                weight,
+                unseen,
+                model.get(f"{feature}_counts", {}),
+                totals.get(f"max_{feature}_count", 1),
+            )
+            for feature, weight, unseen in FEATURES
+        }
+
+    def score_columns(
+        self, ports: Sequence[str], services: Sequence[str], products: Sequence[str], threshold: float
+    ) -> ScoredBatch:
+        keys = {
+            "port": list(ports),
+            "service": list(services),
+            "product": list(products),
+            "combo": [f"{service}|{port}" for service, port in zip(services, ports)],
+        }
+        codes = {feature: self.tables[feature].encode(keys[feature]) for feature, _, _ in FEATURES}
+        port_impact = self.tables["port"].impact
+        service_impact = self.tables["service"].impact
+        product_impact = self.tables["product"].impact
+        combo_impact = self.tables["combo"].impact
+        # Same summation order as aggregate_score so results are bit-identical.
+        scores = array(
+            "d",
+            [
+                min(0.0 + port_impact[p] + service_impact[s] + product_impact[r] + combo_impact[c], 1.0)
+                for p, s, r, c in zip(codes["port"], codes["service"], codes["product"], codes["combo"])
+            ],
+        )
+        return ScoredBatch(self, keys, codes, scores, threshold)
+
+    def score_records(self, records: Iterable[Dict[str, Any]], threshold: float) -> ScoredBatch:
+        ports: List[str] = []
+        services: List[str] = []
+        products: List[str] = []
+        for record in records:
+            ports.append(str(record.get("port", "0")))
+            services.append((record.get("service") or "unknown").lower())
+            products.append((record.get("product") or "unknown").lower())
+        return self.score_columns(ports, services, products, threshold)
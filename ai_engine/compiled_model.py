@@ -0,0 +1,233 @@
+"""Compiled, memory-mapped baseline model format.
+
+Layout (little endian, every block 8-byte aligned)::
+
+    header     magic "SOCM", u16 version, u16 feature count, f64 records
+    directory  one entry per feature: name, weight, unseen impact, max count,
+               key count and the offsets of the blocks below
+    offsets    u32[n + 1] byte offsets of each key inside the key blob
+    blob       UTF-8 keys, sorted bytewise and concatenated
+    impact     f64[n + 1] precomputed impact, slot 0 = unseen value
+    rarity     f64[n + 1] precomputed rarity, slot 0 = unseen value
+    counts     f64[n] raw (possibly decayed) counts, kept for retraining
+
+Loading maps the file and reads the header and directory only; arrays are
+zero-copy ``memoryview`` casts over the map and keys are found by binary
+search, so load time does not depend on the vocabulary size.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+from ai_engine.batch_scoring import FEATURES
+
+MAGIC = b"SOCM"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHd")
+_SECTION = struct.Struct("<8sdddQQQQQQ")
+
+
+def _align(buffer: bytearray) -> None:
+    buffer.extend(b"\0" * (-len(buffer) % 8))
+
+
+def compile_model(baseline: Dict[str, Any]) -> bytes:
+    """Serialise a baseline dictionary (as built by ``build_baseline``) into the compiled layout."""
+
+    totals = baseline.get("totals", {})
+    body = bytearray()
+    data_start = _HEADER.size + _SECTION.size * len(FEATURES)
+    directory = bytearray()
+    for feature, weight, unseen in FEATURES:
+        counts = {key: count for key, count in baseline.get(f"{feature}_counts", {}).items() if count != 0}
+        max_count = totals.get(f"max_{feature}_count", 1)
+        normaliser = max(max_count, 1)
+        entries = sorted((str(key).encode("utf-8"), count) for key, count in counts.items())
+
+        offsets = array("I", [0])
+        blob = bytearray()
+        impact = array("d", [unseen])
+        rarity = array("d", [0.0])
+        raw_counts = array("d")
+        for key, count in entries:
+            blob.extend(key)
+            offsets.append(len(blob))
+            value = 1 - (count / normaliser)
+            rarity.append(value)
+            impact.append(weight * value)
+            raw_counts.append(count)
+
+        positions = []
+        for block in (offsets.tobytes(), bytes(blob), impact.tobytes(), rarity.tobytes(), raw_counts.tobytes()):
+            positions.append(data_start + len(body))
+            body.extend(block)
+            _align(body)
+        directory.extend(
+            _SECTION.pack(feature.encode("ascii"), weight, unseen, float(max_count), len(entries), *positions)
+        )
+
+    header = _HEADER.pack(MAGIC, VERSION, len(FEATURES), float(totals.get("records", 0)))
+    return header + bytes(directory) + bytes(body)
+
+
+def write_compiled_model(baseline: Dict[str, Any], path: Path) -> Path:
+    """Write the compiled model atomically so mapped readers keep a consistent file."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(compile_model(baseline))
+    os.replace(tmp_path, path)
+    return path
+
+
+def is_compiled_model(path: Path) -> bool:
+    with path.open("rb") as fh:
+        return fh.read(len(MAGIC)) == MAGIC
+
+
+class CompiledFeature:
+    """Read-only view over one feature section of a mapped model."""
+
+    def __init__(self, buffer: mmap.mmap, view: memoryview, entry: Tuple[Any, ...]) -> None:
+        (
+            name,
+            self.weight,
+            self.unseen_impact,
+            self.max_count,
+            self.size,
+            off_offsets,
+            off_blob,
+            off_impact,
+            off_rarity,
+            off_counts,
+        ) = entry
+        self.name = name.rstrip(b"\0").decode("ascii")
+        self._buffer = buffer
+        self._blob_start = off_blob
+        self._offsets = view[off_offsets : off_offsets + 4 * (self.size + 1)].cast("I")
+        self.impact = view[off_impact : off_impact + 8 * (self.size + 1)].cast("d")
+        self.rarity = view[off_rarity : off_rarity + 8 * (self.size + 1)].cast("d")
+        self.counts = view[off_counts : off_counts + 8 * self.size].cast("d")
+
+    def _key_bytes(self, index: int) -> bytes:
+        return self._buffer[self._blob_start + self._offsets[index] : self._blob_start + self._offsets[index + 1]]
+
+    def code(self, key: str) -> int:
+        """Return the table slot of ``key``: ``0`` if unseen, otherwise its index plus one."""
+
+        target = key.encode("utf-8")
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.size and self._key_bytes(lo) == target:
+            return lo + 1
+        return 0
+
+    def encode(self, keys: Sequence[str]) -> array:
+        memo: Dict[str, int] = {}
+        codes = array("l")
+        for key in keys:
+            code = memo.get(key)
+            if code is None:
+                code = memo[key] = self.code(key)
+            codes.append(code)
+        return codes
+
+    def items(self) -> Iterator[Tuple[str, float]]:
+        for index in range(self.size):
+            yield self._key_bytes(index).decode("utf-8"), self.counts[index]
+
+
+class CompiledModel:
+    """Memory-mapped compiled baseline exposing per-feature lookup tables."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as fh:
+            self._buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, feature_count, records = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            self._buffer.close()
+            raise ValueError(f"{path} is not a compiled SOC model")
+        if version != VERSION:
+            self._buffer.close()
+            raise ValueError(f"Unsupported compiled model version {version} in {path} (expected {VERSION})")
+        self.version = version
+        self.records = records
+        self._view = memoryview(self._buffer)
+        self.tables: Dict[str, CompiledFeature] = {}
+        for index in range(feature_count):
+            entry = _SECTION.unpack_from(self._buffer, _HEADER.size + index * _SECTION.size)
+            feature = CompiledFeature(self._buffer, self._view, entry)
+            self.tables[feature.name] = feature
+
+    def close(self) -> None:
+        for feature in self.tables.values():
+            for view in (feature._offsets, feature.impact, feature.rarity, feature.counts):
+                view.release()
+        self.tables = {}
+        self._view.release()
+        self._buffer.close()
+
+    def to_baseline(self) -> Dict[str, Any]:
+        """Rebuild the JSON baseline dictionary, e.g. for export or retraining."""
+
+        def plain(value: float) -> Any:
+            return int(value) if float(value).is_integer() else value
+
+        baseline: Dict[str, Any] = {"totals": {"records": plain(self.records)}}
+        for feature, _, _ in FEATURES:
+            table = self.tables[feature]
+            baseline["totals"][f"max_{feature}_count"] = plain(table.max_count)
+            baseline[f"{feature}_counts"] = {key: plain(count) for key, count in table.items()}
+        return baseline
+
+
+def load_compiled_model(path: Path) -> CompiledModel:
+    return CompiledModel(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert between JSON and compiled baseline models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compile_cmd = subparsers.add_parser("compile", help="Compile a JSON baseline")
+    compile_cmd.add_argument("source", type=Path, help="JSON baseline model")
+    compile_cmd.add_argument("destination", type=Path, help="Compiled model to write")
+    export_cmd = subparsers.add_parser("export", help="Export a compiled model as JSON")
+    export_cmd.add_argument("source", type=Path, help="Compiled model")
+    export_cmd.add_argument("destination", type=Path, help="JSON baseline to write")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        baseline = json.loads(args.source.read_text(encoding="utf-8"))
+        print(write_compiled_model(baseline, args.destination))
+    else:
+        model = load_compiled_model(args.source)
+        try:
+            baseline = model.to_baseline()
+        finally:
+            model.close()
+        with args.destination.open("w", encoding="utf-8") as fh:
+            json.dump(baseline, fh, indent=2)
+        print(args.destination)
+
+
+if __name__ == "__main__":
+    main()
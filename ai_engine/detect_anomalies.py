@@ -10,18 +10,23 @@ if __package__ in {None, ""}:
 import argparse
 import csv
 import datetime as dt
+import heapq
 import json
-from typing import Any, Dict, Iterable, List, Tuple
-
+import os
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from ai_engine.batch_scoring import SEVERITY_LEVELS, BatchScorer, score_to_severity
+from ai_engine.compiled_model import CompiledModel, is_compiled_model, load_compiled_model
+from ai_engine.detection_store import DetectionStore
+from ai_engine.detectors import DetectorEnsemble, create_ensemble
+from ai_engine.host_scoring import run_host_scoring
+from ai_engine.json_lines import SUFFIX, JsonLinesWriter, is_json_lines, iter_records
+from ai_engine.parallel_detect import detect_parallel, resolve_workers
 from config.loader import load_settings
 from logs.audit import AuditLogger
-
-SEVERITY_LEVELS = [
-    (0.85, "critical"),
-    (0.7, "high"),
-    (0.55, "medium"),
-    (0.0, "low"),
-]
+from logs.metrics import stage
+from scanner.snapshot import read_rows
 
 
 def read_csv_rows(path: Path) -> List[Dict[str, Any]]:
@@ -30,9 +35,11 @@ def read_csv_rows(path: Path) -> List[Dict[str, Any]]:
         return [row for row in reader]
 
 
-def load_model(path: Path) -> Dict[str, Any]:
+def load_model(path: Path) -> Union[Dict[str, Any], CompiledModel]:
     if not path.exists():
         raise FileNotFoundError(f"Model not found at {path}. Train the model first.")
+    if is_compiled_model(path):
+        return load_compiled_model(path)
     return json.loads(path.read_text(encoding="utf-8"))
 
 
@@ -95,65 +102,319 @@ def aggregate_score(components: Iterable[Tuple[str, float, str]]) -> Tuple[float
     return min(score, 1.0), explanations
 
 
-def score_to_severity(score: float) -> str:
-    for threshold, label in SEVERITY_LEVELS:
-        if score >= threshold:
-            return label
-    return "info"
+ScoredRecord = Tuple[float, str, bool, List[Dict[str, Any]]]
 
 
-def detect(data_path: Path, settings_path: Path) -> Path:
-    settings = load_settings(settings_path)
-    ai_conf = settings.get("ai_engine", {})
-    model_path = Path(ai_conf.get("model_path", "ai_engine/models/baseline_model.json"))
-    explanation_dir = Path(ai_conf.get("explanation_dir", "logs/explanations"))
-    explanation_dir.mkdir(parents=True, exist_ok=True)
+def score_rows(records: Iterable[Dict[str, Any]], model: Dict[str, Any], threshold: float) -> Iterator[ScoredRecord]:
+    """Score records one at a time, building every explanation."""
 
-    model = load_model(model_path)
-    records = read_csv_rows(data_path)
+    for record in records:
+        anomaly_score, explanation = aggregate_score(score_components(record, model))
+        yield anomaly_score, score_to_severity(anomaly_score), anomaly_score > threshold, explanation
 
-    logger = AuditLogger(settings_path)
 
-    detections: List[Dict[str, Any]] = []
-    for record in records:
-        components = score_components(record, model)
-        anomaly_score, explanation = aggregate_score(components)
-        severity = score_to_severity(anomaly_score)
-        threshold = ai_conf.get("anomaly_threshold", 0.6)
+def score_batch(
+    records: List[Dict[str, Any]], model: Any, threshold: float, explain_all: bool = False
+) -> Iterator[ScoredRecord]:
+    """Score all records in one columnar pass.
+
+    Only flagged rows get explanations unless ``explain_all`` is set.
+    """
+
+    batch = BatchScorer(model).score_records(records, threshold)
+    for index, (anomaly_score, severity, prediction) in enumerate(zip(batch.scores, batch.severities, batch.predictions)):
+        yield anomaly_score, severity, prediction, batch.explanation(index) if prediction or explain_all else []
+
+
+def score_ensemble(
+    records: List[Dict[str, Any]],
+    model: Any,
+    threshold: float,
+    ensemble: DetectorEnsemble,
+    explain_all: bool = False,
+) -> Iterator[ScoredRecord]:
+    """Blend the baseline batch scores with the ensemble's detectors.
+
+    Severity and the prediction follow the blended score, and only flagged
+    rows get explanations unless ``explain_all`` is set.
+    """
+
+    batch = BatchScorer(model).score_records(records, 1.0)
+    scores, extras = ensemble.combine(records, batch.scores)
+    for index, anomaly_score in enumerate(scores):
         prediction = anomaly_score > threshold
+        explanation = ensemble.explanation(batch.explanation(index), extras[index]) if prediction or explain_all else []
+        yield anomaly_score, score_to_severity(anomaly_score), prediction, explanation
 
-        enriched = {
-            **record,
-            "anomaly_score": round(anomaly_score, 3),
-            "severity": severity,
-            "prediction": prediction,
-            "explanation": explanation,
-        }
-        detections.append(enriched)
-
-        if prediction:
-            logger.log_event(
-                "anomaly_detected",
-                {
-                    "ip": record.get("ip"),
-                    "port": record.get("port"),
-                    "service": record.get("service"),
-                    "score": anomaly_score,
-                    "severity": severity,
-                },
-            )
-
-    timestamp = dt.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    output_path = explanation_dir / f"detections_{timestamp}.json"
-    with output_path.open("w", encoding="utf-8") as fh:
-        json.dump({"generated_at": timestamp, "detections": detections}, fh, indent=2)
 
+def iter_chunks(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def detect_records(
+    records: Iterable[Dict[str, Any]],
+    model: Any,
+    threshold: float,
+    engine: str = "row",
+    logger: Optional[AuditLogger] = None,
+    chunk_size: int = 10000,
+    ensemble: Optional[DetectorEnsemble] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield enriched detections for ``records`` in input order.
+
+    Records are scored ``chunk_size`` at a time so callers can stream through
+    arbitrarily large inputs; with an ``ensemble`` every chunk is also scored
+    by its detectors in one call. Flagged records are audited through ``logger``
+    before they are yielded.
+    """
+
+    # Compiled models only carry lookup tables, so they always score in batch.
+    batch_mode = engine == "batch" or isinstance(model, CompiledModel)
+    for chunk in iter_chunks(records, chunk_size):
+        if ensemble is not None:
+            scored = score_ensemble(chunk, model, threshold, ensemble, explain_all=engine != "batch")
+        elif batch_mode:
+            scored = score_batch(chunk, model, threshold, explain_all=engine != "batch")
+        else:
+            scored = score_rows(chunk, model, threshold)
+        for record, (anomaly_score, severity, prediction, explanation) in zip(chunk, scored):
+            if prediction and logger is not None:
+                logger.log_event(
+                    "anomaly_detected",
+                    {
+                        "ip": record.get("ip"),
+                        "port": record.get("port"),
+                        "service": record.get("service"),
+                        "score": anomaly_score,
+                        "severity": severity,
+                    },
+                )
+            yield {
+                **record,
+                "anomaly_score": round(anomaly_score, 3),
+                "severity": severity,
+                "prediction": prediction,
+                "explanation": explanation,
+            }
+
+
+OUTPUT_FORMATS = {"json": ".json", "ndjson": SUFFIX}
+
+
+class DetectionsOutput:
+    """Write a run's detections as they are scored.
+
+    ``ndjson`` streams every detection to ``detections_<timestamp>.ndjson``
+    between a header and a footer carrying the run's counts; ``json`` keeps
+    the historical indented document, which can only be written at the end.
+    """
+
+    def __init__(self, explanation_dir: Path, output_format: str = "json") -> None:
+        self.timestamp = dt.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        self.path = explanation_dir / f"detections_{self.timestamp}{OUTPUT_FORMATS[output_format]}"
+        self.records = 0
+        self.anomalies = 0
+        self.severity_counts: Counter = Counter()
+        self._buffer: Optional[List[Dict[str, Any]]] = None
+        self._writer: Optional[JsonLinesWriter] = None
+        if output_format == "ndjson":
+            self._writer = JsonLinesWriter(self.path, {"generated_at": self.timestamp, "kind": "detections"})
+        else:
+            self._buffer = []
+
+    def __enter__(self) -> "DetectionsOutput":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.abort()
+
+    @property
+    def detections(self) -> Optional[List[Dict[str, Any]]]:
+        """The detections written so far when the format buffers them (``json``), else ``None``."""
+
+        return self._buffer
+
+    def write(self, detection: Dict[str, Any]) -> None:
+        self.records += 1
+        self.anomalies += bool(detection.get("prediction"))
+        self.severity_counts[detection.get("severity", "low")] += 1
+        if self._writer is not None:
+            self._writer.write(detection)
+        else:
+            self._buffer.append(detection)
+
+    def close(self) -> Path:
+        if self._writer is not None:
+            self._writer.close({"anomalies": self.anomalies, "severity_counts": dict(self.severity_counts)})
+        else:
+            with self.path.open("w", encoding="utf-8") as fh:
+                json.dump({"generated_at": self.timestamp, "detections": self._buffer}, fh, indent=2)
+        return self.path
+
+
+def write_detections(detections: Iterable[Dict[str, Any]], explanation_dir: Path, output_format: str = "json") -> Path:
+    with DetectionsOutput(explanation_dir, output_format) as output:
+        for detection in detections:
+            output.write(detection)
+    return output.path
+
+
+def iter_detections(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the detections of a ``detections_*`` file in either output format."""
+
+    if is_json_lines(path):
+        yield from iter_records(path)
+        return
+    with path.open("r", encoding="utf-8") as fh:
+        yield from json.load(fh).get("detections", [])
+
+
+def latest_detections_file(explanation_dir: Path) -> Optional[Path]:
+    """Return the newest ``detections_<timestamp>`` file of either format, if any."""
+
+    files = [path for path in explanation_dir.glob("detections_*") if path.suffix in OUTPUT_FORMATS.values()]
+    return max(files, key=lambda path: path.stem) if files else None
+
+
+LATEST_RUN_FILE = "latest.json"
+
+
+def write_latest_run(
+    detections: Iterable[Dict[str, Any]], detections_path: Path, run_id: Optional[int] = None, top: int = 5
+) -> Path:
+    """Atomically write the small ``latest.json`` summary next to ``detections_path``.
+
+    It carries the counts and the ``top`` highest scoring detections so quick
+    views never have to open the detections document. ``detections`` is
+    consumed in one pass, holding only the ``top`` candidates.
+    """
+
+    severity_counts: Counter = Counter()
+    anomalies = 0
+
+    def counted() -> Iterator[Dict[str, Any]]:
+        nonlocal anomalies
+        for detection in detections:
+            severity_counts[detection.get("severity", "low")] += 1
+            anomalies += bool(detection.get("prediction"))
+            yield detection
+
+    ranked = heapq.nlargest(top, counted(), key=lambda detection: float(detection.get("anomaly_score", 0)))
+    summary = {
+        "generated_at": dt.datetime.now(tz=dt.timezone.utc).isoformat(timespec="seconds"),
+        "detections_file": detections_path.name,
+        "run_id": run_id,
+        "total": sum(severity_counts.values()),
+        "anomalies": anomalies,
+        "severity_counts": dict(severity_counts),
+        "top": ranked,
+    }
+    output_path = detections_path.with_name(LATEST_RUN_FILE)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    os.replace(tmp_path, output_path)
     return output_path
 
 
+def store_detections(
+    detections: Iterable[Dict[str, Any]], detections_path: Path, store_path: Optional[Path]
+) -> Optional[int]:
+    """Record a run in the detection history store, if one is configured, and return its run id."""
+
+    if store_path is None:
+        return None
+    with DetectionStore(store_path) as store:
+        return store.record_run(detections, detections_file=detections_path.name)
+
+
+def run_detection(
+    data_path: Path, settings_path: Path, model: Optional[Any] = None, partial: bool = False
+) -> Tuple[Path, Optional[List[Dict[str, Any]]]]:
+    """Score ``data_path``, write the detections file and return its path with the detections.
+
+    The detections are only returned for the ``json`` format, which holds
+    them in memory anyway; with ``ndjson`` they are ``None`` and host
+    scoring, the detection store and ``latest.json`` stream the written file,
+    so memory does not grow with the scan.
+
+    A preloaded ``model`` (dictionary or ``CompiledModel``) is used as-is and
+    left open; otherwise the configured model is loaded for this call.
+    ``partial`` marks a scan diff rather than a full scan (see ``run_host_scoring``).
+    """
+
+    ai_conf = load_settings(settings_path).ai_engine
+    explanation_dir = ai_conf.explanation_dir
+    explanation_dir.mkdir(parents=True, exist_ok=True)
+
+    owns_model = model is None
+    if owns_model:
+        model = load_model(ai_conf.model_path)
+    # With host scoring the audit log gets one event per host instead of one per port.
+    host_scoring = bool(ai_conf.host_scoring.get("enabled", False))
+    workers = resolve_workers(ai_conf.workers)
+
+    logger = AuditLogger(settings_path)
+
+    with stage("detect") as measured, DetectionsOutput(explanation_dir, ai_conf.output_format) as output:
+        if workers > 1:
+            with detect_parallel(data_path, model, ai_conf, workers, not host_scoring, explanation_dir) as merged:
+                with logger.batch():
+                    for detection, payload in merged:
+                        if payload is not None:
+                            logger.log_event("anomaly_detected", payload)
+                        output.write(detection)
+        else:
+            with logger.batch():
+                for detection in detect_records(
+                    read_rows(data_path),
+                    model,
+                    ai_conf.anomaly_threshold,
+                    ai_conf.scoring_engine,
+                    None if host_scoring else logger,
+                    ensemble=create_ensemble(ai_conf.detectors),
+                ):
+                    output.write(detection)
+        measured.records = output.records
+    detections_path = output.path
+
+    if host_scoring:
+        with stage("host_scoring", output.records):
+            run_host_scoring(iter_detections(detections_path), model, ai_conf, logger, detections_path, partial)
+    logger.close()
+    if owns_model and isinstance(model, CompiledModel):
+        model.close()
+
+    finish_run(detections_path, ai_conf.detection_store)
+    return detections_path, output.detections
+
+
+def finish_run(detections_path: Path, store_path: Optional[Path]) -> Optional[int]:
+    """Record a written run in the detection store and ``latest.json``, streaming the detections file."""
+
+    run_id = store_detections(iter_detections(detections_path), detections_path, store_path)
+    write_latest_run(iter_detections(detections_path), detections_path, run_id)
+    return run_id
+
+
+def detect(data_path: Path, settings_path: Path, model: Optional[Any] = None) -> Path:
+    """Score ``data_path`` and return the path of the detections document."""
+
+    return run_detection(data_path, settings_path, model)[0]
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Detect anomalies using the baseline model")
-    parser.add_argument("data", type=Path, help="CSV exported from parse_results")
+    parser.add_argument("data", type=Path, help="Snapshot or CSV written by parse_results")
     parser.add_argument(
         "--config",
         type=Path,
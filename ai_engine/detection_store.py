@@ -0,0 +1,220 @@
+"""SQLite history of detection runs with indexed host, time and score queries."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import datetime as dt
+import json
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    generated_at TEXT NOT NULL,
+    detections_file TEXT,
+    total INTEGER NOT NULL,
+    anomalies INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS detections (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    position INTEGER NOT NULL,
+    generated_at TEXT NOT NULL,
+    ip TEXT,
+    hostname TEXT,
+    port INTEGER,
+    state TEXT,
+    service TEXT,
+    product TEXT,
+    anomaly_score REAL,
+    severity TEXT,
+    prediction INTEGER,
+    explanation TEXT,
+    PRIMARY KEY (run_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS detections_host ON detections (ip, port, generated_at);
+CREATE INDEX IF NOT EXISTS detections_time ON detections (generated_at);
+CREATE INDEX IF NOT EXISTS detections_severity ON detections (severity, generated_at);
+CREATE INDEX IF NOT EXISTS detections_score ON detections (anomaly_score DESC);
+"""
+
+_COLUMNS = ("ip", "hostname", "port", "state", "service", "product", "anomaly_score", "severity", "prediction")
+
+Timestamp = Union[str, dt.datetime]
+
+
+def _timestamp(value: Timestamp) -> str:
+    if isinstance(value, dt.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=dt.timezone.utc)
+        return value.astimezone(dt.timezone.utc).isoformat(timespec="seconds")
+    return value
+
+
+class DetectionStore:
+    """Append-only store of detection runs.
+
+    Every run becomes one ``runs`` row plus one ``detections`` row per scored
+    record, written in a single transaction. Query results are dictionaries
+    shaped like the entries of a ``detections_*.json`` document, with
+    ``run_id`` and ``generated_at`` added.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "DetectionStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def record_run(
+        self,
+        detections: Iterable[Dict[str, Any]],
+        generated_at: Optional[Timestamp] = None,
+        detections_file: Optional[str] = None,
+    ) -> int:
+        generated_at = _timestamp(generated_at or dt.datetime.now(tz=dt.timezone.utc))
+        conn = self.conn
+        with conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (generated_at, detections_file, total, anomalies) VALUES (?, ?, 0, 0)",
+                (generated_at, detections_file),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        run_id,
+                        position,
+                        generated_at,
+                        *(detection.get(column) for column in _COLUMNS[:8]),
+                        int(bool(detection.get("prediction"))),
+                        json.dumps(detection.get("explanation", [])),
+                    )
+                    for position, detection in enumerate(detections)
+                ),
+            )
+            conn.execute(
+                "UPDATE runs SET total = (SELECT count(*) FROM detections WHERE run_id = ?),"
+                " anomalies = (SELECT count(*) FROM detections WHERE run_id = ? AND prediction) WHERE run_id = ?",
+                (run_id, run_id, run_id),
+            )
+        return run_id
+
+    @staticmethod
+    def _detection(row: sqlite3.Row) -> Dict[str, Any]:
+        detection = {column: row[column] for column in _COLUMNS}
+        detection["prediction"] = bool(detection["prediction"])
+        detection["explanation"] = json.loads(row["explanation"] or "[]")
+        detection["run_id"] = row["run_id"]
+        detection["generated_at"] = row["generated_at"]
+        return detection
+
+    def latest_run(self) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT * FROM runs ORDER BY run_id DESC LIMIT 1").fetchone()
+        return dict(row) if row is not None else None
+
+    def run_detections(self, run_id: int, anomalies_only: bool = False) -> List[Dict[str, Any]]:
+        """Return a run's detections in their original order."""
+
+        query = "SELECT * FROM detections WHERE run_id = ?" + (" AND prediction" if anomalies_only else "")
+        return [self._detection(row) for row in self.conn.execute(query + " ORDER BY position", (run_id,))]
+
+    def host_timeline(
+        self,
+        ip: str,
+        port: Optional[int] = None,
+        since: Optional[Timestamp] = None,
+        until: Optional[Timestamp] = None,
+        anomalies_only: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Return the detections for ``ip`` (optionally one ``port``) between ``since`` and ``until``, oldest first."""
+
+        clauses, params = ["ip = ?"], [ip]
+        if port is not None:
+            clauses.append("port = ?")
+            params.append(port)
+        if since is not None:
+            clauses.append("generated_at >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append("generated_at < ?")
+            params.append(_timestamp(until))
+        if anomalies_only:
+            clauses.append("prediction")
+        query = f"SELECT * FROM detections WHERE {' AND '.join(clauses)} ORDER BY generated_at, run_id, position"
+        return [self._detection(row) for row in self.conn.execute(query, params)]
+
+    def top_detections(
+        self, limit: int = 10, run_id: Optional[int] = None, since: Optional[Timestamp] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the highest scoring detections of one run or of everything since ``since``."""
+
+        clauses: List[str] = []
+        params: List[Any] = []
+        if run_id is not None:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        if since is not None:
+            clauses.append("generated_at >= ?")
+            params.append(_timestamp(since))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT * FROM detections{where} ORDER BY anomaly_score DESC, run_id DESC, position LIMIT ?"
+        return [self._detection(row) for row in self.conn.execute(query, (*params, limit))]
+
+    def host_ports(self, run_id: int) -> Dict[str, Set[str]]:
+        """Return the ports each host exposed in a run."""
+
+        ports: Dict[str, Set[str]] = {}
+        for ip, port in self.conn.execute("SELECT ip, port FROM detections WHERE run_id = ?", (run_id,)):
+            ports.setdefault(ip, set()).add(str(port))
+        return ports
+
+    def severity_counts(self, run_id: int) -> Dict[str, int]:
+        rows = self.conn.execute(
+            "SELECT severity, count(*) FROM detections WHERE run_id = ? GROUP BY severity", (run_id,)
+        )
+        return {severity: count for severity, count in rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the detection history store")
+    parser.add_argument("store", type=Path, help="SQLite detection store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("latest", help="Show the latest run")
+    host_cmd = subparsers.add_parser("host", help="Show the anomaly timeline of one host")
+    host_cmd.add_argument("ip", help="Host address")
+    host_cmd.add_argument("--port", type=int, default=None, help="Restrict to one port")
+    host_cmd.add_argument("--since", default=None, help="ISO timestamp, e.g. 2024-05-01T00:00:00+00:00")
+    top_cmd = subparsers.add_parser("top", help="Show the highest scoring detections")
+    top_cmd.add_argument("--limit", type=int, default=10, help="Number of detections")
+    top_cmd.add_argument("--since", default=None, help="ISO timestamp")
+    args = parser.parse_args()
+
+    with DetectionStore(args.store) as store:
+        if args.command == "latest":
+            result: Any = store.latest_run()
+        elif args.command == "host":
+            result = store.host_timeline(args.ip, args.port, args.since)
+        else:
+            result = store.top_detections(args.limit, since=args.since)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Additional anomaly detectors blended with the frequency baseline.
+
+Every detector scores a whole batch of records at once and returns anomaly
+scores in ``[0, 1]`` (higher is more anomalous). ``DetectorEnsemble`` blends
+them with the baseline score using the weights configured under
+``ai_engine.detectors``, e.g.::
+
+    "detectors": {
+      "baseline": {"weight": 0.7},
+      "isolation_forest": {"weight": 0.3, "model_path": "ai_engine/models/isolation_forest.pkl"}
+    }
+"""
+from __future__ import annotations
+
+import functools
+import math
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+DEFAULT_ISOLATION_FOREST = Path("ai_engine/models/isolation_forest.pkl")
+
+
+class Detector(ABC):
+    """Batch scorer plugged into ``detect_records`` next to the baseline model."""
+
+    name = "detector"
+
+    @abstractmethod
+    def score(self, records: Sequence[Dict[str, Any]]) -> List[float]:
+        """Return one anomaly score in ``[0, 1]`` per record, in order."""
+
+    def reason(self, score: float) -> str:
+        return f"{self.name} anomaly score {score:.2f}"
+
+
+@functools.lru_cache(maxsize=None)
+def load_isolation_forest(path: Path) -> Any:
+    """Load the scikit-learn pipeline at ``path`` once per process."""
+
+    try:
+        import joblib
+        import pandas  # noqa: F401  (the pipeline's ColumnTransformer selects columns by name)
+    except ImportError as exc:  # optional dependencies
+        raise ValueError("The isolation_forest detector requires scikit-learn, joblib and pandas") from exc
+    if not path.exists():
+        raise FileNotFoundError(f"IsolationForest model not found at {path}")
+    return joblib.load(path)
+
+
+class IsolationForestDetector(Detector):
+    """Score records with the shipped ``Pipeline(preprocessor, IsolationForest)``.
+
+    ``decision_function`` is ``score_samples - offset_``; adding the offset
+    back gives the original isolation score from the paper, which lies in
+    ``(0, 1]`` with values near ``1`` for easily isolated (anomalous) points.
+    """
+
+    name = "isolation_forest"
+    columns = ("ip", "hostname", "port", "state", "service", "product")
+
+    def __init__(self, model_path: Path = DEFAULT_ISOLATION_FOREST) -> None:
+        self.pipeline = load_isolation_forest(Path(model_path))
+        self.offset = float(self.pipeline[-1].offset_)
+
+    def frame(self, records: Sequence[Dict[str, Any]]) -> Any:
+        import pandas as pd
+
+        columns: Dict[str, List[Any]] = {column: [] for column in self.columns}
+        for record in records:
+            for column in self.columns:
+                value = record.get(column)
+                if column == "port":
+                    try:
+                        value = float(value)
+                    except (TypeError, ValueError):
+                        value = 0.0
+                else:
+                    value = "" if value is None else str(value)
+                columns[column].append(value)
+        return pd.DataFrame(columns, columns=list(self.columns))
+
+    def score(self, records: Sequence[Dict[str, Any]]) -> List[float]:
+        if not records:
+            return []
+        decisions = self.pipeline.decision_function(self.frame(records))
+        return [min(max(-(float(decision) + self.offset), 0.0), 1.0) for decision in decisions]
+
+    def reason(self, score: float) -> str:
+        return f"IsolationForest isolation score {score:.2f}"
+
+
+DETECTORS = {"isolation_forest": IsolationForestDetector}
+
+
+class DetectorEnsemble:
+    """Weighted average of the baseline score and the scores of extra detectors."""
+
+    def __init__(self, baseline_weight: float, detectors: Sequence[Tuple[Detector, float]]) -> None:
+        total = baseline_weight + sum(weight for _, weight in detectors)
+        if total <= 0:
+            raise ValueError("At least one detector needs a positive weight")
+        self.baseline_share = baseline_weight / total
+        self.detectors = [(detector, weight / total) for detector, weight in detectors]
+
+    def combine(
+        self, records: Sequence[Dict[str, Any]], baseline_scores: Sequence[float]
+    ) -> Tuple[List[float], List[List[Dict[str, Any]]]]:
+        """Return the blended scores and, per record, the extra detectors' explanation entries."""
+
+        combined = [self.baseline_share * score for score in baseline_scores]
+        extras: List[List[Dict[str, Any]]] = [[] for _ in baseline_scores]
+        for detector, share in self.detectors:
+            for index, score in enumerate(detector.score(records)):
+                combined[index] += share * score
+                extras[index].append(
+                    {"feature": detector.name, "impact": round(share * score, 3), "reason": detector.reason(score)}
+                )
+        return [min(score, 1.0) for score in combined], extras
+
+    def explanation(self, baseline: List[Dict[str, Any]], extras: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Scale the baseline impacts by their share so all impacts add up to the blended score."""
+
+        if math.isclose(self.baseline_share, 1.0):
+            return baseline + extras
+        scaled = [{**item, "impact": round(item["impact"] * self.baseline_share, 3)} for item in baseline]
+        return scaled + extras
+
+
+def create_ensemble(conf: Mapping[str, Mapping[str, Any]]) -> Optional[DetectorEnsemble]:
+    """Build the ensemble described by ``ai_engine.detectors``, or ``None`` for the baseline alone."""
+
+    detectors: List[Tuple[Detector, float]] = []
+    for name, options in conf.items():
+        weight = float(options.get("weight", 0))
+        if name == "baseline" or weight <= 0:
+            continue
+        kwargs = {"model_path": Path(options["model_path"])} if "model_path" in options else {}
+        detectors.append((DETECTORS[name](**kwargs), weight))
+    if not detectors:
+        return None
+    return DetectorEnsemble(float(conf.get("baseline", {}).get("weight", 1.0)), detectors)
+
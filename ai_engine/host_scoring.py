@@ -0,0 +1,182 @@
+"""Aggregate port-level detections into per-host feature vectors and score hosts.
+
+A host that suddenly exposes many unusual ports should raise one alert, not
+one per port. ``score_hosts`` groups the scored records by ``ip`` in a single
+pass, builds one vector per host and scores all hosts column by column:
+
+    max_port_score  highest per-port anomaly score on the host
+    set_rarity      mean baseline rarity of the host's ports (unseen = 1)
+    churn           1 - Jaccard similarity with the host's ports in the previous run
+    exposure        open port count relative to ``exposure_ports``
+
+The host score is the weighted blend of those features, but never lower than
+the host's worst port, so aggregation can only escalate a port-level finding.
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+
+from ai_engine.batch_scoring import BatchScorer, score_to_severity
+from ai_engine.detection_store import DetectionStore
+from config.loader import AiEngineSettings
+from logs.audit import AuditLogger
+
+HOST_FEATURES = (
+    ("max_port_score", 0.4),
+    ("set_rarity", 0.25),
+    ("churn", 0.2),
+    ("exposure", 0.15),
+)
+
+
+def _port_rarity(model: Any, ports: List[str]) -> List[float]:
+    table = BatchScorer(model).tables["port"]
+    return [table.rarity[code] if code else 1.0 for code in table.encode(ports)]
+
+
+def score_hosts(
+    detections: Iterable[Dict[str, Any]],
+    model: Any,
+    threshold: float,
+    previous_ports: Optional[Mapping[str, Set[str]]] = None,
+    exposure_ports: int = 20,
+) -> List[Dict[str, Any]]:
+    """Return one scored entry per host, in order of first appearance.
+
+    ``detections`` is consumed in one pass; per host only its port sets, its
+    worst score and its flagged ports are kept. ``previous_ports`` maps each
+    host of the previous run to its ports; when it is ``None`` (no history)
+    churn is not scored, and a host missing from it counts as entirely new.
+    """
+
+    grouped: Dict[str, Dict[str, Any]] = {}
+    for det in detections:
+        host = grouped.get(str(det.get("ip")))
+        if host is None:
+            host = grouped[str(det.get("ip"))] = {"hostname": "", "ports": set(), "open": set(), "max": 0.0, "flagged": []}
+        port = str(det.get("port"))
+        host["ports"].add(port)
+        if (det.get("state") or "open") == "open":
+            host["open"].add(port)
+        host["max"] = max(host["max"], float(det.get("anomaly_score", 0)))
+        host["hostname"] = host["hostname"] or det.get("hostname") or ""
+        if det.get("prediction"):
+            host["flagged"].append(
+                {
+                    "port": det.get("port"),
+                    "service": det.get("service"),
+                    "anomaly_score": det.get("anomaly_score"),
+                    "severity": det.get("severity"),
+                    "explanation": det.get("explanation", []),
+                }
+            )
+
+    ips = list(grouped)
+    port_sets = [grouped[ip]["ports"] for ip in ips]
+    all_ports = sorted(set().union(*port_sets))
+    rarity_by_port = dict(zip(all_ports, _port_rarity(model, all_ports)))
+    open_counts = [len(grouped[ip]["open"]) for ip in ips]
+
+    columns: Dict[str, List[float]] = {
+        "max_port_score": [grouped[ip]["max"] for ip in ips],
+        "set_rarity": [sum(rarity_by_port[port] for port in ports) / len(ports) for ports in port_sets],
+        "exposure": [min(count / max(exposure_ports, 1), 1.0) for count in open_counts],
+    }
+    similarities: List[Optional[float]] = []
+    for ip, ports in zip(ips, port_sets):
+        if previous_ports is None:
+            similarities.append(None)
+            continue
+        previous = previous_ports.get(ip, set())
+        similarities.append(len(ports & previous) / len(ports | previous))
+    columns["churn"] = [0.0 if similarity is None else 1 - similarity for similarity in similarities]
+
+    blended = [0.0] * len(ips)
+    for feature, weight in HOST_FEATURES:
+        blended = [total + weight * value for total, value in zip(blended, columns[feature])]
+
+    hosts = []
+    for index, ip in enumerate(ips):
+        flagged = grouped[ip]["flagged"]
+        score = min(max(blended[index], columns["max_port_score"][index]), 1.0)
+        previous = previous_ports.get(ip, set()) if previous_ports is not None else None
+        hosts.append(
+            {
+                "ip": ip,
+                "hostname": grouped[ip]["hostname"],
+                "host_score": round(score, 3),
+                "severity": score_to_severity(score),
+                "prediction": score > threshold or bool(flagged),
+                "features": {feature: round(columns[feature][index], 3) for feature, _ in HOST_FEATURES},
+                "open_ports": open_counts[index],
+                "jaccard": None if similarities[index] is None else round(similarities[index], 3),
+                "new_ports": sorted(port_sets[index] - previous, key=_port_key) if previous is not None else [],
+                "ports": flagged,
+            }
+        )
+    return hosts
+
+
+def _port_key(port: str) -> Any:
+    return (0, int(port)) if port.isdigit() else (1, port)
+
+
+def log_host_events(hosts: Iterable[Dict[str, Any]], logger: AuditLogger) -> int:
+    """Write one ``host_anomaly_detected`` event per flagged host and return how many were written."""
+
+    count = 0
+    with logger.batch():
+        for host in hosts:
+            if not host["prediction"]:
+                continue
+            logger.log_event("host_anomaly_detected", host)
+            count += 1
+    return count
+
+
+def previous_host_ports(store_path: Optional[Path]) -> Optional[Dict[str, Set[str]]]:
+    """Return the host ports of the latest run in the detection store, or ``None`` without history."""
+
+    if store_path is None or not store_path.exists():
+        return None
+    with DetectionStore(store_path) as store:
+        run = store.latest_run()
+        return store.host_ports(run["run_id"]) if run is not None else None
+
+
+def run_host_scoring(
+    detections: Iterable[Dict[str, Any]],
+    model: Any,
+    ai_conf: AiEngineSettings,
+    logger: AuditLogger,
+    detections_path: Path,
+    partial: bool = False,
+) -> Path:
+    """Score the hosts of a run, audit the flagged ones and write the hosts document.
+
+    Call it before the run is added to the detection store so churn is
+    measured against the previous run. ``partial`` runs (incremental scans,
+    which only hold the changed services) have no comparable port sets, so
+    churn is not scored for them.
+    """
+
+    hosts = score_hosts(
+        detections,
+        model,
+        ai_conf.anomaly_threshold,
+        None if partial else previous_host_ports(ai_conf.detection_store),
+        int(ai_conf.host_scoring.get("exposure_ports", 20)),
+    )
+    log_host_events(hosts, logger)
+    return write_hosts(hosts, detections_path)
+
+
+def write_hosts(hosts: List[Dict[str, Any]], detections_path: Path) -> Path:
+    """Write ``hosts_<timestamp>.json`` next to the ``detections_<timestamp>`` file it summarises."""
+
+    output_path = detections_path.with_name(detections_path.stem.replace("detections_", "hosts_", 1) + ".json")
+    with output_path.open("w", encoding="utf-8") as fh:
+        json.dump({"detections_file": detections_path.name, "hosts": hosts}, fh, indent=2)
+    return output_path
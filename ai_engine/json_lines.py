@@ -0,0 +1,108 @@
+"""JSON-lines run outputs framed by a header and a footer record.
+
+Layout, one JSON object per line::
+
+    {"header": {...run metadata...}}
+    {...record...}
+    ...
+    {"footer": {"records": n, "index_stride": 1024, "index": [offsets], ...}}
+
+Records are appended as they are produced, so writing never holds the run
+in memory. The footer's sparse ``index`` holds the byte offset of every
+``index_stride``-th record: ``read_record`` seeks to the nearest indexed
+record and reads at most ``index_stride`` lines to reach any position.
+Files are written under a temporary name and renamed on close, so readers
+never see a run without its footer.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+SUFFIX = ".ndjson"
+INDEX_STRIDE = 1024
+
+
+def is_json_lines(path: Path) -> bool:
+    return path.suffix == SUFFIX
+
+
+class JsonLinesWriter:
+    """Append records to a framed JSON-lines file and finish it with the footer."""
+
+    def __init__(self, path: Path, header: Dict[str, Any], index_stride: int = INDEX_STRIDE) -> None:
+        self.path = path
+        self.records = 0
+        self.index_stride = index_stride
+        self._index: List[int] = []
+        self._tmp_path = path.with_name(path.name + ".tmp")
+        self._fh = self._tmp_path.open("wb")
+        self._fh.write(json.dumps({"header": header}).encode("utf-8") + b"\n")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.records % self.index_stride == 0:
+            self._index.append(self._fh.tell())
+        self._fh.write(json.dumps(record).encode("utf-8") + b"\n")
+        self.records += 1
+
+    def close(self, footer: Optional[Dict[str, Any]] = None) -> Path:
+        summary = {**(footer or {}), "records": self.records, "index_stride": self.index_stride, "index": self._index}
+        self._fh.write(json.dumps({"footer": summary}).encode("utf-8") + b"\n")
+        self._fh.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        self._fh.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def read_header(path: Path) -> Dict[str, Any]:
+    with path.open("rb") as fh:
+        return json.loads(fh.readline())["header"]
+
+
+def read_footer(path: Path, block_size: int = 1 << 16) -> Dict[str, Any]:
+    """Return the footer by reading the file backwards from its end."""
+
+    with path.open("rb") as fh:
+        position = fh.seek(0, os.SEEK_END)
+        data = b""
+        # Skip the trailing newline, then grow the window until the footer line is complete.
+        while position > 0 and data.rstrip(b"\n").count(b"\n") == 0:
+            step = min(block_size, position)
+            position -= step
+            fh.seek(position)
+            data = fh.read(step) + data
+        return json.loads(data.rstrip(b"\n").rsplit(b"\n", 1)[-1])["footer"]
+
+
+def iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the records between the header and the footer, one line at a time."""
+
+    with path.open("rb") as fh:
+        fh.readline()
+        for line in fh:
+            record = json.loads(line)
+            if "footer" in record and len(record) == 1:
+                return
+            yield record
+
+
+def read_record(path: Path, position: int, footer: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Return the record at ``position`` through the footer's sparse index.
+
+    Pass an already read ``footer`` to look up many positions in one file.
+    """
+
+    footer = footer or read_footer(path)
+    if not 0 <= position < footer["records"]:
+        raise IndexError(f"Record {position} out of range for {path} ({footer['records']} records)")
+    stride = footer["index_stride"]
+    with path.open("rb") as fh:
+        fh.seek(footer["index"][position // stride])
+        for _ in range(position % stride):
+            fh.readline()
+        return json.loads(fh.readline())
@@ -0,0 +1,184 @@
+"""Score a parsed scan on several processes and merge the shards in input order.
+
+The input is partitioned by host (rows by their ``ip`` dictionary code) so
+every port of a host lands in the same partition. The parent computes every
+partition's row positions in one pass over the ``ip`` column (a CSV input is
+first converted to a snapshot once), and each worker decodes only its own
+rows straight from the mapped snapshot, so no rows are pickled. Workers score
+their partition with ``detect_records`` and stream one pickled ``(position,
+detection, audit payload)`` per record to a shard file. The parent merges the
+shards by input position, which reproduces the serial detections and audit
+order exactly.
+
+The model reaches each worker once: with the ``fork`` start method workers
+inherit the parent's loaded model (a compiled model's mapped pages stay
+shared), otherwise the pool initializer loads it from ``model_path``.
+"""
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import os
+import pickle
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ai_engine.detectors import create_ensemble
+from config.loader import AiEngineSettings
+from scanner.parse_results import PORT_COLUMNS
+from scanner.snapshot import DICTIONARY, ScanSnapshot, is_snapshot, read_rows, write_snapshot
+
+# More partitions than workers keeps every core busy when host sizes are skewed.
+PARTITIONS_PER_WORKER = 4
+
+# Per-process worker state; filled before forking or by ``_init_worker``.
+_WORKER: Dict[str, Any] = {}
+
+
+def resolve_workers(workers: int) -> int:
+    """Return the process count for ``ai_engine.workers`` (``0`` means one per core)."""
+
+    return workers or os.cpu_count() or 1
+
+
+def _open_snapshot(path: Path) -> Tuple[List[Any], List[Optional[List[str]]], Any]:
+    """Return the mapped columns, decoded dictionaries and ip codes of a snapshot, once per process.
+
+    The parent opens the snapshot before forking so workers inherit the
+    decoded dictionaries instead of each decoding them again.
+    """
+
+    snapshots = _WORKER.setdefault("snapshots", {})
+    if path not in snapshots:
+        snapshot = ScanSnapshot(path)
+        columns = [snapshot.columns[name] for name in PORT_COLUMNS]
+        dictionaries = [column.dictionary if column.kind == DICTIONARY else None for column in columns]
+        snapshots[path] = (columns, dictionaries, snapshot.columns["ip"].values, snapshot)
+    return snapshots[path][:3]
+
+
+def partition_positions(path: Path, partitions: int) -> List[array]:
+    """Return the row positions of every host partition of a snapshot, in input order."""
+
+    selected = [array("q") for _ in range(partitions)]
+    for position, code in enumerate(_open_snapshot(path)[2]):
+        selected[code % partitions].append(position)
+    return selected
+
+
+def iter_partition(path: Path, positions: Iterable[int]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield ``(position, row)`` for the given snapshot rows, decoding only those rows."""
+
+    columns, dictionaries, _ = _open_snapshot(path)
+    for position in positions:
+        row = {}
+        for name, column, dictionary in zip(PORT_COLUMNS, columns, dictionaries):
+            value = column.values[position]
+            if dictionary is not None:
+                row[name] = dictionary[value]
+            else:
+                row[name] = "" if value < 0 else str(value)
+        yield position, row
+
+
+class _EventCapture:
+    """Stand-in audit logger keeping the payload of the event logged for the current record."""
+
+    def __init__(self) -> None:
+        self.payload: Optional[Dict[str, Any]] = None
+
+    def log_event(self, event_type: str, payload: Dict[str, Any]) -> None:
+        self.payload = payload
+
+    def pop(self) -> Optional[Dict[str, Any]]:
+        payload, self.payload = self.payload, None
+        return payload
+
+
+def _init_worker(ai_conf: AiEngineSettings, audit: bool) -> None:
+    if "model" not in _WORKER:
+        from ai_engine.detect_anomalies import load_model
+
+        _WORKER["model"] = load_model(ai_conf.model_path)
+        _WORKER["ensemble"] = create_ensemble(ai_conf.detectors)
+    _WORKER["ai_conf"] = ai_conf
+    _WORKER["audit"] = audit
+
+
+def _score_partition(data_path: str, positions: array, shard_path: str) -> int:
+    from ai_engine.detect_anomalies import detect_records
+
+    ai_conf: AiEngineSettings = _WORKER["ai_conf"]
+    capture = _EventCapture() if _WORKER["audit"] else None
+    detections = detect_records(
+        (row for _, row in iter_partition(Path(data_path), positions)),
+        _WORKER["model"],
+        ai_conf.anomaly_threshold,
+        ai_conf.scoring_engine,
+        capture,
+        ensemble=_WORKER["ensemble"],
+    )
+    count = 0
+    with open(shard_path, "wb") as fh:
+        for count, detection in enumerate(detections, start=1):
+            payload = capture.pop() if capture is not None else None
+            pickle.dump((positions[count - 1], detection, payload), fh, pickle.HIGHEST_PROTOCOL)
+    return count
+
+
+def _read_shard(path: Path) -> Iterator[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]]:
+    with path.open("rb") as fh:
+        while fh.peek(1):
+            yield pickle.load(fh)
+
+
+@contextmanager
+def detect_parallel(
+    data_path: Path,
+    model: Any,
+    ai_conf: AiEngineSettings,
+    workers: int,
+    audit: bool = True,
+    shard_dir: Optional[Path] = None,
+) -> Iterator[Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]]:
+    """Score ``data_path`` on ``workers`` processes and yield the merged results.
+
+    The pool has finished when the block is entered; the yielded iterator
+    produces ``(detection, audit payload)`` for every row in input order, the
+    payload being the ``anomaly_detected`` event ``detect_records`` would have
+    logged (``None`` for unflagged rows or when ``audit`` is off). ``model``
+    is the parent's loaded baseline, reused by forked workers.
+    """
+
+    partitions = workers * PARTITIONS_PER_WORKER
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    context = multiprocessing.get_context(start_method)
+    with tempfile.TemporaryDirectory(prefix="detect_shards_", dir=shard_dir) as tmp:
+        if not is_snapshot(data_path):
+            # Parse a CSV once instead of once per partition.
+            data_path = write_snapshot(read_rows(data_path), Path(tmp) / "input.snap")
+        if start_method == "fork":
+            _WORKER["model"] = model
+            _WORKER["ensemble"] = create_ensemble(ai_conf.detectors)
+        shards = []
+        try:
+            # Opening the snapshot here also lets forked workers inherit its decoded dictionaries.
+            selected = [positions for positions in partition_positions(data_path, partitions) if positions]
+            shards = [Path(tmp) / f"shard_{partition:04d}.pickle" for partition in range(len(selected))]
+            with ProcessPoolExecutor(workers, context, _init_worker, (ai_conf, audit)) as pool:
+                futures = [
+                    pool.submit(_score_partition, str(data_path), positions, str(shard))
+                    for positions, shard in zip(selected, shards)
+                ]
+                for future in futures:
+                    future.result()
+        finally:
+            for *_, snapshot in _WORKER.get("snapshots", {}).values():
+                snapshot.close()
+            _WORKER.clear()
+        merged = heapq.merge(*(_read_shard(shard) for shard in shards), key=lambda item: item[0])
+        yield ((detection, payload) for _, detection, payload in merged)
@@ -10,10 +10,15 @@ if __package__ in {None, ""}:
 import argparse
 import csv
 import json
+import os
 from collections import Counter
-from typing import Dict, Iterable, Tuple
+from typing import Any, Dict, Iterable, Optional, Tuple
 
+from ai_engine.compiled_model import is_compiled_model, load_compiled_model, write_compiled_model
 from config.loader import load_settings
+from logs.rotation import strip_compression
+from scanner.parse_results import iter_results
+from scanner.snapshot import ScanSnapshot, is_snapshot, read_rows
 
 
 def read_csv_rows(path: Path) -> Iterable[Dict[str, str]]:
@@ -23,11 +28,24 @@ def read_csv_rows(path: Path) -> Iterable[Dict[str, str]]:
             yield row
 
 
-def build_baseline(rows: Iterable[Dict[str, str]]) -> Dict[str, Dict[str, int]]:
-    port_counts: Counter[str] = Counter()
-    service_counts: Counter[str] = Counter()
-    product_counts: Counter[str] = Counter()
-    combo_counts: Counter[Tuple[str, str]] = Counter()
+def _is_scan_file(path: Path) -> bool:
+    return strip_compression(path).suffix in {".xml", ".json"}
+
+
+def iter_training_rows(path: Path) -> Iterable[Dict[str, Any]]:
+    """Stream training rows from a parsed snapshot or CSV, or directly from a raw scan file."""
+
+    if _is_scan_file(path):
+        return iter_results(path)
+    return read_rows(path)
+
+
+FEATURES = ("port", "service", "product", "combo")
+
+
+def count_features(rows: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, Counter], int]:
+    counts: Dict[str, Counter] = {feature: Counter() for feature in FEATURES}
+    port_counts, service_counts, product_counts, combo_counts = (counts[feature] for feature in FEATURES)
 
     total = 0
     for row in rows:
@@ -37,52 +55,251 @@ def build_baseline(rows: Iterable[Dict[str, str]]) -> Dict[str, Dict[str, int]]:
         port_counts[port] += 1
         service_counts[service] += 1
         product_counts[product] += 1
-        combo_counts[(service, port)] += 1
+        combo_counts[f"{service}|{port}"] += 1
         total += 1
+    return counts, total
 
-    return {
-        "totals": {
-            "records": total,
-            "max_port_count": max(port_counts.values(), default=1),
-            "max_service_count": max(service_counts.values(), default=1),
-            "max_product_count": max(product_counts.values(), default=1),
-            "max_combo_count": max(combo_counts.values(), default=1),
-        },
-        "port_counts": dict(port_counts),
-        "service_counts": dict(service_counts),
-        "product_counts": dict(product_counts),
-        "combo_counts": {f"{service}|{port}": count for (service, port), count in combo_counts.items()},
-    }
-
-
-def train_model(data_path: Path, settings_path: Path) -> Path:
-    settings = load_settings(settings_path)
-    ai_conf = settings.get("ai_engine", {})
-    model_path = Path(ai_conf.get("model_path", "ai_engine/models/baseline_model.json"))
-    model_path.parent.mkdir(parents=True, exist_ok=True)
 
-    rows = list(read_csv_rows(data_path))
-    if not rows:
-        raise ValueError("No data available to train the baseline model.")
+def count_snapshot(snapshot: ScanSnapshot) -> Tuple[Dict[str, Counter], int]:
+    """Count features like ``count_features`` straight from the snapshot's code arrays.
+
+    Only the distinct values are normalised; the per-row work is counting
+    integers over zero-copy views, with no row dictionaries or strings.
+    """
+
+    counts: Dict[str, Counter] = {feature: Counter() for feature in FEATURES}
+    ports = snapshot.columns["port"].values
+    services = snapshot.columns["service"]
+    products = snapshot.columns["product"]
+    service_keys = [(value or "unknown").lower() for value in services.dictionary]
+    product_keys = [(value or "unknown").lower() for value in products.dictionary]
+
+    def port_key(value: int) -> str:
+        return "" if value < 0 else str(value)
+
+    # Counter keeps first-seen order, so the baseline matches the row-based one key for key.
+    for value, count in Counter(ports).items():
+        counts["port"][port_key(value)] += count
+    for code, count in Counter(services.values).items():
+        counts["service"][service_keys[code]] += count
+    for code, count in Counter(products.values).items():
+        counts["product"][product_keys[code]] += count
+    for (code, value), count in Counter(zip(services.values, ports)).items():
+        counts["combo"][f"{service_keys[code]}|{port_key(value)}"] += count
+    return counts, len(snapshot)
+
+
+def count_path(path: Path) -> Tuple[Dict[str, Counter], int]:
+    """Count the features of a snapshot, CSV or raw scan file."""
+
+    if not _is_scan_file(path) and is_snapshot(path):
+        with ScanSnapshot(path) as snapshot:
+            return count_snapshot(snapshot)
+    return count_features(iter_training_rows(path))
+
+
+def baseline_from_counts(counts: Dict[str, Counter], total: int) -> Dict[str, Any]:
+    baseline: Dict[str, Any] = {"totals": {"records": total}}
+    for feature in FEATURES:
+        baseline["totals"][f"max_{feature}_count"] = max(counts[feature].values(), default=1)
+    for feature in FEATURES:
+        baseline[f"{feature}_counts"] = dict(counts[feature])
+    return baseline
+
+
+def build_baseline(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    return baseline_from_counts(*count_features(rows))
+
+
+def merge_counts(
+    baseline: Dict[str, Any], counts: Dict[str, Counter], records: int, decay: float = 1.0, prune_below: float = 0.0
+) -> Dict[str, Any]:
+    """Fold one scan's counts into ``baseline`` in place.
+
+    Existing counts are first multiplied by ``decay`` (``1.0`` keeps the full
+    history), values that fall under ``prune_below`` are dropped, then the new
+    counts are added. Counts only grow after the decay step, so each
+    ``max_*`` normaliser is the decayed previous maximum or one of the keys
+    touched by this scan.
+    """
+
+    totals = baseline.setdefault("totals", {})
+    for feature in FEATURES:
+        stored: Dict[str, Any] = baseline.setdefault(f"{feature}_counts", {})
+        max_key = f"max_{feature}_count"
+        current_max = totals.get(max_key, 0) if stored else 0
+        if decay != 1.0:
+            current_max *= decay
+            for key in list(stored):
+                value = stored[key] * decay
+                if value < prune_below:
+                    del stored[key]
+                else:
+                    stored[key] = value
+        for key, count in counts[feature].items():
+            value = stored.get(key, 0) + count
+            stored[key] = value
+            if value > current_max:
+                current_max = value
+        totals[max_key] = current_max or 1
+    totals["records"] = totals.get("records", 0) * decay + records
+    return baseline
+
+
+def expire_counts(baseline: Dict[str, Any], expired: Dict[str, Dict[str, int]], records: int) -> Dict[str, Any]:
+    """Remove a scan that slid out of the training window from ``baseline`` in place.
+
+    A ``max_*`` normaliser is only recomputed when a key at the maximum lost
+    counts, which keeps the common case proportional to the expired scan.
+    """
+
+    totals = baseline["totals"]
+    for feature in FEATURES:
+        stored = baseline[f"{feature}_counts"]
+        max_key = f"max_{feature}_count"
+        current_max = totals.get(max_key, 1)
+        stale = False
+        for key, count in expired.get(feature, {}).items():
+            old = stored.get(key, 0)
+            if old >= current_max:
+                stale = True
+            if old - count <= 0:
+                stored.pop(key, None)
+            else:
+                stored[key] = old - count
+        if stale:
+            totals[max_key] = max(stored.values(), default=1)
+    totals["records"] = max(totals.get("records", 0) - records, 0)
+    return baseline
+
+
+def write_model(baseline: Dict[str, Any], model_path: Path) -> Path:
+    """Write ``baseline`` as JSON for ``.json`` paths, otherwise as a compiled model."""
 
-    baseline = build_baseline(rows)
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    if model_path.suffix != ".json":
+        return write_compiled_model(baseline, model_path)
     with model_path.open("w", encoding="utf-8") as fh:
         json.dump(baseline, fh, indent=2)
+    return model_path
+
+
+def train_model(data_path: Path, settings_path: Path, export_json: Optional[Path] = None) -> Path:
+    """Train the baseline from scratch on ``data_path``.
+
+    Any training window kept by ``update_model`` describes the replaced model
+    and is dropped; the next windowed update reseeds it from this baseline.
+    """
+
+    model_path = load_settings(settings_path).ai_engine.model_path
+
+    baseline = baseline_from_counts(*count_path(data_path))
+    if not baseline["totals"]["records"]:
+        raise ValueError("No data available to train the baseline model.")
+
+    write_model(baseline, model_path)
+    window_state_path(model_path).unlink(missing_ok=True)
+    if export_json is not None:
+        write_model(baseline, export_json)
 
     return model_path
 
 
+def read_baseline(model_path: Path) -> Dict[str, Any]:
+    if is_compiled_model(model_path):
+        model = load_compiled_model(model_path)
+        try:
+            return model.to_baseline()
+        finally:
+            model.close()
+    return json.loads(model_path.read_text(encoding="utf-8"))
+
+
+def window_state_path(model_path: Path) -> Path:
+    return model_path.with_name(model_path.name + ".window.json")
+
+
+def update_model(data_path: Path, settings_path: Path) -> Path:
+    """Merge one new scan into the existing baseline instead of retraining from scratch.
+
+    ``ai_engine.incremental_training`` selects either exponential decay of the
+    previous counts (``decay`` < 1) or a sliding window of the last
+    ``window_scans`` scans, whose per-scan counts are kept next to the model.
+    Work is proportional to the new rows plus the model vocabulary, never to
+    the history that produced it.
+    """
+
+    ai_conf = load_settings(settings_path).ai_engine
+    model_path = ai_conf.model_path
+    conf = ai_conf.incremental_training
+    decay = float(conf.get("decay", 1.0))
+    window = int(conf.get("window_scans") or 0)
+    if window and decay != 1.0:
+        raise ValueError("incremental_training supports either decay or window_scans, not both")
+
+    counts, records = count_path(data_path)
+    if not records:
+        raise ValueError("No data available to train the baseline model.")
+
+    baseline = read_baseline(model_path) if model_path.exists() else {"totals": {"records": 0}}
+    if not window:
+        merge_counts(baseline, counts, records, decay, float(conf.get("prune_below", 0.0)))
+        return write_model(baseline, model_path)
+
+    state_path = window_state_path(model_path)
+    if state_path.exists():
+        scans = json.loads(state_path.read_text(encoding="utf-8"))["scans"]
+    elif model_path.exists():
+        # Seed the window with whatever the existing model was trained on.
+        scans = [
+            {
+                "records": baseline["totals"].get("records", 0),
+                "counts": {feature: dict(baseline.get(f"{feature}_counts", {})) for feature in FEATURES},
+            }
+        ]
+    else:
+        scans = []
+
+    merge_counts(baseline, counts, records)
+    scans.append({"records": records, "counts": {feature: dict(counts[feature]) for feature in FEATURES}})
+    while len(scans) > window:
+        expired = scans.pop(0)
+        expire_counts(baseline, expired["counts"], expired["records"])
+
+    write_model(baseline, model_path)
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(json.dumps({"window_scans": window, "scans": scans}), encoding="utf-8")
+    os.replace(tmp_path, state_path)
+    return model_path
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Train the baseline anomaly model")
-    parser.add_argument("data", type=Path, help="CSV exported from parse_results")
+    parser.add_argument("data", type=Path, help="Snapshot or CSV written by parse_results, or a raw scan file")
     parser.add_argument(
         "--config",
         type=Path,
         default=Path("config/settings.yaml"),
         help="Settings file",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Merge the data into the existing baseline instead of retraining",
+    )
+    parser.add_argument(
+        "--export-json",
+        type=Path,
+        default=None,
+        help="Also write the baseline as a JSON document",
+    )
     args = parser.parse_args()
-    model_path = train_model(args.data, args.config)
+    if args.incremental:
+        model_path = update_model(args.data, args.config)
+        if args.export_json is not None:
+            write_model(read_baseline(model_path), args.export_json)
+    else:
+        model_path = train_model(args.data, args.config, args.export_json)
     print(model_path)
 
 
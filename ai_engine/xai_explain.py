@@ -9,56 +9,173 @@ if __package__ in {None, ""}:
 
 import argparse
 import json
-from typing import Any, Dict, List
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, List, Optional
 
+from ai_engine.detect_anomalies import OUTPUT_FORMATS, iter_detections
+from ai_engine.json_lines import JsonLinesWriter, is_json_lines, iter_records, read_header
 from config.loader import load_settings
 from logs.audit import AuditLogger
+from logs.metrics import stage
 
 
-def generate_explanations(data_path: Path, settings_path: Path, detections_path: Path) -> Path:
+def explain_record(record: Dict[str, Any], index: int, logger: Optional[AuditLogger] = None) -> Dict[str, Any]:
+    """Return the explanation entry for the detection at ``index``, auditing flagged records.
+
+    Entries only point at their detection; the feature breakdown stays in the
+    detections file and is resolved by ``load_explanations``.
+    """
+
+    if record.get("prediction") and logger is not None:
+        logger.log_event(
+            "xai_explanation",
+            {
+                "ip": record.get("ip"),
+                "port": record.get("port"),
+                "service": record.get("service"),
+                "explanation": record.get("explanation", []),
+            },
+        )
+    return {
+        "index": index,
+        "ip": record.get("ip"),
+        "port": record.get("port"),
+        "service": record.get("service"),
+        "severity": record.get("severity"),
+        "prediction": record.get("prediction"),
+    }
+
+
+def explain_detections(detections: Iterable[Dict[str, Any]], logger: Optional[AuditLogger] = None) -> List[Dict[str, Any]]:
+    return [explain_record(record, index, logger) for index, record in enumerate(detections)]
+
+
+EXPLANATIONS_STEM = "xai_explanations"
+
+
+class ExplanationsOutput:
+    """Write explanation entries as they are built, in the configured output format."""
+
+    def __init__(self, explanation_dir: Path, detections_path: Path, output_format: str = "json") -> None:
+        self.path = explanation_dir / f"{EXPLANATIONS_STEM}{OUTPUT_FORMATS[output_format]}"
+        self.detections_file = detections_path.name
+        self._buffer: Optional[List[Dict[str, Any]]] = None
+        self._writer: Optional[JsonLinesWriter] = None
+        if output_format == "ndjson":
+            self._writer = JsonLinesWriter(self.path, {"detections_file": self.detections_file, "kind": "explanations"})
+        else:
+            self._buffer = []
+
+    def __enter__(self) -> "ExplanationsOutput":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.abort()
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        if self._writer is not None:
+            self._writer.write(entry)
+        else:
+            self._buffer.append(entry)
+
+    def close(self) -> Path:
+        if self._writer is not None:
+            return self._writer.close()
+        with self.path.open("w", encoding="utf-8") as fh:
+            json.dump({"detections_file": self.detections_file, "explanations": self._buffer}, fh, separators=(",", ":"))
+        return self.path
+
+
+def write_explanations(
+    explanations: Iterable[Dict[str, Any]], explanation_dir: Path, detections_path: Path, output_format: str = "json"
+) -> Path:
+    with ExplanationsOutput(explanation_dir, detections_path, output_format) as output:
+        for entry in explanations:
+            output.write(entry)
+    return output.path
+
+
+def explanations_file(explanation_dir: Path) -> Optional[Path]:
+    """Return the most recently written explanations file of either format, if any."""
+
+    files = [explanation_dir / f"{EXPLANATIONS_STEM}{suffix}" for suffix in OUTPUT_FORMATS.values()]
+    files = [path for path in files if path.exists()]
+    return max(files, key=lambda path: path.stat().st_mtime_ns) if files else None
+
+
+def load_explanations(path: Path) -> List[Dict[str, Any]]:
+    """Read an explanations file and attach each entry's feature breakdown.
+
+    The detections file is streamed alongside the index-ordered entries, so
+    neither format has to be loaded as one document. Documents written before
+    entries became indexes embed the explanation and are returned as-is.
+    """
+
+    if is_json_lines(path):
+        explanations = list(iter_records(path))
+        detections_file = read_header(path).get("detections_file")
+    else:
+        document = json.loads(path.read_text(encoding="utf-8"))
+        explanations = document.get("explanations", [])
+        detections_file = document.get("detections_file")
+    if detections_file is None:
+        return explanations
+    detections_path = path.parent / detections_file
+    if not detections_path.exists():
+        return [{**entry, "explanation": []} for entry in explanations]
+    detections = enumerate(iter_detections(detections_path))
+    resolved = []
+    for position, entry in enumerate(explanations):
+        index, detection = next(detections, (None, None))
+        while index is not None and index < entry["index"]:
+            index, detection = next(detections, (None, None))
+        if index != entry["index"]:
+            # A truncated or mismatched detections file; keep the rest of the entries unexplained.
+            resolved.extend({**rest, "explanation": []} for rest in explanations[position:])
+            break
+        resolved.append({**entry, "explanation": detection.get("explanation", [])})
+    return resolved
+
+
+def generate_explanations(
+    data_path: Path,
+    settings_path: Path,
+    detections_path: Path,
+    detections: Optional[Iterable[Dict[str, Any]]] = None,
+) -> Path:
+    """Write the explanations index for ``detections_path``.
+
+    Pass the in-memory ``detections`` returned by ``run_detection`` to skip
+    re-reading the file; otherwise it is streamed.
+    """
+
     # Data path is currently unused but kept for interface compatibility
-    settings = load_settings(settings_path)
-    ai_conf = settings.get("ai_engine", {})
-    explanation_dir = Path(ai_conf.get("explanation_dir", "logs/explanations"))
+    ai_conf = load_settings(settings_path).ai_engine
+    explanation_dir = ai_conf.explanation_dir
     explanation_dir.mkdir(parents=True, exist_ok=True)
 
-    detections = json.loads(detections_path.read_text(encoding="utf-8"))
-    logger = AuditLogger(settings_path)
-
-    explanations: List[Dict[str, Any]] = []
-    for record in detections.get("detections", []):
-        explanation = record.get("explanation", [])
-        enriched = {
-            "ip": record.get("ip"),
-            "port": record.get("port"),
-            "service": record.get("service"),
-            "severity": record.get("severity"),
-            "prediction": record.get("prediction"),
-            "explanation": explanation,
-        }
-        explanations.append(enriched)
-        if record.get("prediction"):
-            logger.log_event(
-                "xai_explanation",
-                {
-                    "ip": record.get("ip"),
-                    "port": record.get("port"),
-                    "service": record.get("service"),
-                    "explanation": explanation,
-                },
-            )
-
-    output_path = explanation_dir / "xai_explanations.json"
-    with output_path.open("w", encoding="utf-8") as fh:
-        json.dump({"explanations": explanations}, fh, indent=2)
-
-    return output_path
+    if detections is None:
+        detections = iter_detections(detections_path)
+    # With host scoring, host events already carry the flagged ports' explanations.
+    logger = None if ai_conf.host_scoring.get("enabled", False) else AuditLogger(settings_path)
+    with stage("explain", 0) as measured:
+        with ExplanationsOutput(explanation_dir, detections_path, ai_conf.output_format) as output:
+            with logger.batch() if logger is not None else nullcontext():
+                for index, record in enumerate(detections):
+                    output.write(explain_record(record, index, logger))
+                    measured.records = index + 1
+    if logger is not None:
+        logger.close()
+    return output.path
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate XAI explanations")
     parser.add_argument("data", type=Path, help="CSV used for detection")
-    parser.add_argument("detections", type=Path, help="JSON generated by detect_anomalies.py")
+    parser.add_argument("detections", type=Path, help="Detections file generated by detect_anomalies.py")
     parser.add_argument(
         "--config",
         type=Path,
@@ -2,26 +2,256 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
 
+# Filesystem timestamps can be coarser than the time between two writes, so a
+# file modified this recently is re-read (but only re-parsed if it changed).
+_RACY_SECONDS = 2.0
 
-def load_settings(path: Path) -> Dict[str, Any]:
-    """Load configuration data from a JSON/YAML file.
 
-    The project ships its configuration as JSON so we can keep the loader free
-    from third-party dependencies. JSON is a valid subset of YAML which keeps
-    backwards compatibility with the previous ``.yaml`` extension.
+def freeze(value: Any) -> Any:
+    """Return a deeply read-only copy: mappings become proxies, lists become tuples."""
+
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _number(
+    section: str, conf: Mapping[str, Any], key: str, default: float, minimum: float = 0.0, strict: bool = False
+) -> float:
+    value = conf.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < minimum or (strict and value == minimum):
+        bound = ">" if strict else ">="
+        raise ValueError(f"{section}.{key} must be a number {bound} {minimum}, got {value!r}")
+    return value
+
+
+DETECTOR_NAMES = {"baseline", "isolation_forest"}
+
+
+@dataclass(frozen=True)
+class AiEngineSettings:
+    model_path: Path
+    explanation_dir: Path
+    anomaly_threshold: float
+    scoring_engine: str
+    incremental_training: Mapping[str, Any]
+    detection_store: Optional[Path]
+    detectors: Mapping[str, Mapping[str, Any]]
+    host_scoring: Mapping[str, Any]
+    workers: int
+    output_format: str
+
+    @classmethod
+    def from_mapping(cls, conf: Mapping[str, Any]) -> "AiEngineSettings":
+        scoring_engine = conf.get("scoring_engine", "row")
+        if scoring_engine not in {"row", "batch"}:
+            raise ValueError(f"ai_engine.scoring_engine must be 'row' or 'batch', got {scoring_engine!r}")
+        output_format = conf.get("output_format", "json")
+        if output_format not in {"json", "ndjson"}:
+            raise ValueError(f"ai_engine.output_format must be 'json' or 'ndjson', got {output_format!r}")
+        detectors = conf.get("detectors", MappingProxyType({}))
+        # The baseline keeps weight 1 unless configured; extra detectors are off until weighted.
+        weights = {"baseline": _number("ai_engine.detectors.baseline", detectors.get("baseline", {}), "weight", 1.0)}
+        for name, options in detectors.items():
+            if name not in DETECTOR_NAMES:
+                raise ValueError(f"Unknown detector ai_engine.detectors.{name}; use one of {sorted(DETECTOR_NAMES)}")
+            weights[name] = _number(f"ai_engine.detectors.{name}", options, "weight", weights.get(name, 0.0))
+        if not any(weight > 0 for weight in weights.values()):
+            raise ValueError("ai_engine.detectors needs at least one detector with a positive weight")
+        host_scoring = conf.get("host_scoring", MappingProxyType({}))
+        _number("ai_engine.host_scoring", host_scoring, "exposure_ports", 20, 1)
+        return cls(
+            model_path=Path(conf.get("model_path", "ai_engine/models/baseline_model.socm")),
+            explanation_dir=Path(conf.get("explanation_dir", "logs/explanations")),
+            anomaly_threshold=float(_number("ai_engine", conf, "anomaly_threshold", 0.6)),
+            scoring_engine=scoring_engine,
+            incremental_training=conf.get("incremental_training", MappingProxyType({})),
+            # An empty value turns the detection history off.
+            detection_store=Path(store) if (store := conf.get("detection_store", "logs/detections.sqlite")) else None,
+            detectors=detectors,
+            host_scoring=host_scoring,
+            # 1 scores in-process, 0 uses one worker process per core.
+            workers=int(_number("ai_engine", conf, "workers", 1, 0)),
+            output_format=output_format,
+        )
+
+
+@dataclass(frozen=True)
+class AuditSettings:
+    audit_log: Path
+    wazuh_event_log: Path
+    flush_every_events: int
+    flush_interval_ms: int
+    queue_size: int
+    rotation: Mapping[str, Any]
+    wazuh_forwarder: Mapping[str, Any]
+
+    @classmethod
+    def from_mapping(cls, conf: Mapping[str, Any]) -> "AuditSettings":
+        forwarder = conf.get("wazuh_forwarder", MappingProxyType({}))
+        transport = forwarder.get("transport", "tcp")
+        if transport not in {"tcp", "unix"}:
+            raise ValueError(f"audit.wazuh_forwarder.transport must be 'tcp' or 'unix', got {transport!r}")
+        _number("audit.wazuh_forwarder", forwarder, "port", 514, 1)
+        _number("audit.wazuh_forwarder", forwarder, "timeout_seconds", 5, strict=True)
+        _number("audit.wazuh_forwarder", forwarder, "retry_seconds", 30)
+        _number("audit.wazuh_forwarder", forwarder, "batch_events", 500, 1)
+        _number("audit.wazuh_forwarder", forwarder, "spool_max_bytes", 104857600, 1)
+        return cls(
+            audit_log=Path(conf.get("audit_log", "logs/audit.ndjson")),
+            wazuh_event_log=Path(conf.get("wazuh_event_log", "logs/wazuh_events.ndjson")),
+            flush_every_events=int(_number("audit", conf, "flush_every_events", 500, 1)),
+            flush_interval_ms=int(_number("audit", conf, "flush_interval_ms", 1000, 1)),
+            queue_size=int(_number("audit", conf, "queue_size", 10000, 1)),
+            rotation=conf.get("rotation", MappingProxyType({})),
+            wazuh_forwarder=forwarder,
+        )
+
+
+@dataclass(frozen=True)
+class SchedulerSettings:
+    scan_interval_minutes: float
+    retrain_interval_hours: float
+    status_file: Path
+    lock_file: Path
+
+    @classmethod
+    def from_mapping(cls, conf: Mapping[str, Any]) -> "SchedulerSettings":
+        return cls(
+            scan_interval_minutes=float(_number("scheduler", conf, "scan_interval_minutes", 30, strict=True)),
+            retrain_interval_hours=float(_number("scheduler", conf, "retrain_interval_hours", 24, strict=True)),
+            status_file=Path(conf.get("status_file", "logs/scheduler_status.json")),
+            lock_file=Path(conf.get("lock_file", "logs/scheduler.lock")),
+        )
+
+
+@dataclass(frozen=True)
+class PipelineSettings:
+    streaming: bool
+    chunk_size: int
+    queue_size: int
+    keep_intermediate: bool
+    export_csv: bool
+    metrics: Mapping[str, Any]
+
+    @classmethod
+    def from_mapping(cls, conf: Mapping[str, Any]) -> "PipelineSettings":
+        metrics = conf.get("metrics", MappingProxyType({}))
+        _number("pipeline.metrics", metrics, "prometheus_port", 0)
+        return cls(
+            streaming=bool(conf.get("streaming", False)),
+            chunk_size=int(_number("pipeline", conf, "chunk_size", 1000, 1)),
+            queue_size=int(_number("pipeline", conf, "queue_size", 8, 1)),
+            keep_intermediate=bool(conf.get("keep_intermediate", True)),
+            export_csv=bool(conf.get("export_csv", False)),
+            metrics=metrics,
+        )
+
+
+class Settings(Mapping[str, Any]):
+    """Immutable snapshot of a settings file.
+
+    It reads like the parsed document (``settings.get("scanner", {})``) and
+    exposes validated, typed views of the ``ai_engine``, ``audit``,
+    ``scheduler`` and ``pipeline`` sections. A new object is returned
+    whenever the file changes, so ``is`` comparisons detect reloads.
     """
 
-    text = path.read_text(encoding="utf-8") if path.exists() else "{}"
+    def __init__(self, data: Dict[str, Any], path: Optional[Path] = None) -> None:
+        self._data: Mapping[str, Any] = freeze(data)
+        self.path = path
+        self.ai_engine = AiEngineSettings.from_mapping(self._data.get("ai_engine", {}))
+        self.audit = AuditSettings.from_mapping(self._data.get("audit", {}))
+        self.scheduler = SchedulerSettings.from_mapping(self._data.get("scheduler", {}))
+        self.pipeline = PipelineSettings.from_mapping(self._data.get("pipeline", {}))
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"Settings({self.path})"
+
+
+def _parse(path: Path, text: str) -> Settings:
     text = text.strip()
     if not text:
-        return {}
+        return Settings({}, path)
     try:
-        return json.loads(text)
+        data = json.loads(text)
     except json.JSONDecodeError as exc:
         raise ValueError(f"Unable to parse configuration file at {path}: {exc}") from exc
+    return Settings(data, path)
+
+
+_cache: Dict[Path, Tuple[Tuple[int, int, int], float, str, Settings]] = {}
+_cache_lock = threading.Lock()
+
+
+def load_settings(path: Path) -> Settings:
+    """Load configuration data from a JSON/YAML file.
+
+    The project ships its configuration as JSON so we can keep the loader free
+    from third-party dependencies. JSON is a valid subset of YAML which keeps
+    backwards compatibility with the previous ``.yaml`` extension.
+
+    Snapshots are cached per resolved path and reused until the file's inode,
+    modification time or size changes, so calling this on every use is cheap
+    and long-running callers pick up edits without a restart.
+    """
+
+    key = Path(os.path.abspath(path))
+    try:
+        stat = key.stat()
+    except FileNotFoundError:
+        with _cache_lock:
+            _cache.pop(key, None)
+        return Settings({}, path)
+    stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == stamp and cached[1] - stat.st_mtime > _RACY_SECONDS:
+        return cached[3]
+
+    read_at = time.time()
+    text = key.read_text(encoding="utf-8")
+    if cached is not None and cached[2] == text:
+        settings = cached[3]
+    else:
+        settings = _parse(path, text)
+    with _cache_lock:
+        _cache[key] = (stamp, read_at, text, settings)
+    return settings
+
+
+def clear_settings_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
 
 
-__all__ = ["load_settings"]
+__all__ = [
+    "AiEngineSettings",
+    "AuditSettings",
+    "PipelineSettings",
+    "SchedulerSettings",
+    "Settings",
+    "clear_settings_cache",
+    "freeze",
+    "load_settings",
+]
@@ -7,12 +7,27 @@ from pathlib import Path
 if __package__ in {None, ""}:
     sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+import argparse
 import json
+import time
+from collections import Counter
 from textwrap import indent
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from ai_engine.detect_anomalies import LATEST_RUN_FILE, iter_detections, latest_detections_file
+from ai_engine.detection_store import DetectionStore
+from logs.audit import AuditTail
+from logs.metrics import read_runs, stage_totals
 
 LOGS_DIR = Path("logs")
 EXPLANATIONS_DIR = LOGS_DIR / "explanations"
+AUDIT_LOG = LOGS_DIR / "audit.ndjson"
+LEGACY_AUDIT_LOG = LOGS_DIR / "audit.json"
+DETECTION_STORE = LOGS_DIR / "detections.sqlite"
+LATEST_RUN = EXPLANATIONS_DIR / LATEST_RUN_FILE
+RUN_METRICS = LOGS_DIR / "run_metrics.ndjson"
+AUDIT_EVENTS = 5
+TREND_RUNS = 5
 
 
 def load_json(path: Path, default: Dict | List | None = None):
@@ -22,23 +37,52 @@ def load_json(path: Path, default: Dict | List | None = None):
         return json.load(fh)
 
 
-def render_metrics(detections: List[Dict[str, Any]]) -> str:
-    total = len(detections)
-    severities: Dict[str, int] = {"critical": 0, "high": 0, "medium": 0, "low": 0}
-    for det in detections:
-        severity = det.get("severity", "low")
-        severities[severity] = severities.get(severity, 0) + 1
+def load_latest_detections(top: int = 5) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Return the latest run's detections and its ``top`` highest scoring ones."""
+
+    if DETECTION_STORE.exists():
+        with DetectionStore(DETECTION_STORE) as store:
+            run = store.latest_run()
+            if run is not None:
+                return store.run_detections(run["run_id"]), store.top_detections(top, run_id=run["run_id"])
+
+    # Without a detection store the newest detections file is the only record of a run.
+    detections_path = latest_detections_file(EXPLANATIONS_DIR) if EXPLANATIONS_DIR.exists() else None
+    detections = list(iter_detections(detections_path)) if detections_path else []
+    ranked = sorted(detections, key=lambda det: float(det.get("anomaly_score", 0)), reverse=True)
+    return detections, ranked[:top]
+
+
+def load_latest_run(top: int = 5) -> Dict[str, Any]:
+    """Return the ``latest.json`` summary, or build one from the full detection history.
+
+    The summary is written by every detection run, so reading it costs the
+    same however many runs or detections have accumulated.
+    """
+
+    summary = load_json(LATEST_RUN, default={})
+    if summary:
+        return summary
+    detections, top_detections = load_latest_detections(top)
+    return {
+        "total": len(detections),
+        "severity_counts": dict(Counter(det.get("severity", "low") for det in detections)),
+        "top": top_detections,
+    }
+
+
+def render_metrics(total: int, severity_counts: Mapping[str, int]) -> str:
     lines = ["=== TRUSTED AI SOC LITE ===", f"Detections: {total}"]
     for level in ["critical", "high", "medium", "low"]:
-        lines.append(f"  {level.title():<8}: {severities.get(level, 0)}")
+        lines.append(f"  {level.title():<8}: {severity_counts.get(level, 0)}")
     return "\n".join(lines)
 
 
 def render_alerts(detections: List[Dict[str, Any]]) -> str:
     if not detections:
         return "No anomalies detected in the latest run."
-    lines = ["--- Recent Alerts ---"]
-    for det in detections[:5]:
+    lines = ["--- Top Alerts ---"]
+    for det in detections:
         lines.append(
             f"[{det.get('severity', 'low').upper()}] {det.get('ip')}:{det.get('port')} {det.get('service', '')}"
             f" — score {float(det.get('anomaly_score', 0)):.2f}"
@@ -46,11 +90,12 @@ def render_alerts(detections: List[Dict[str, Any]]) -> str:
     return "\n".join(lines)
 
 
-def render_explanations(explanations: List[Dict[str, Any]]) -> str:
-    if not explanations:
+def render_explanations(detections: List[Dict[str, Any]]) -> str:
+    explained = [det for det in detections if det.get("prediction") and det.get("explanation")]
+    if not explained:
         return "No explanations generated yet."
     lines = ["--- Explainability Highlights ---"]
-    for item in explanations[:3]:
+    for item in explained[:3]:
         reason_lines = [
             f"* {exp['feature']}: {exp.get('reason', 'n/a')} (impact {exp.get('impact', 0)})"
             for exp in item.get("explanation", [])
@@ -62,10 +107,7 @@ def render_explanations(explanations: List[Dict[str, Any]]) -> str:
     return "\n".join(lines)
 
 
-def render_audit() -> str:
-    audit_path = LOGS_DIR / "audit.json"
-    audit = load_json(audit_path, default={"events": []})
-    events = audit.get("events", [])[-5:]
+def render_audit(events: List[Dict[str, Any]]) -> str:
     if not events:
         return "No audit events recorded."
     lines = ["--- Recent Audit Events ---"]
@@ -74,21 +116,83 @@ def render_audit() -> str:
     return "\n".join(lines)
 
 
-def main() -> None:
-    detection_files = sorted(EXPLANATIONS_DIR.glob("detections_*.json"), reverse=True)
-    detections_doc = load_json(detection_files[0], default={"detections": []}) if detection_files else {"detections": []}
-    detections = detections_doc.get("detections", [])
+def render_trends(runs: List[Dict[str, Any]]) -> str:
+    """Summarise the last pipeline runs, newest first, with their slowest stages."""
+
+    if not runs:
+        return "No pipeline runs measured yet."
+    lines = ["--- Pipeline Runs ---"]
+    for index in range(len(runs) - 1, -1, -1):
+        run = runs[index]
+        change = ""
+        if index > 0 and runs[index - 1]["wall_seconds"] > 0:
+            change = f" ({run['wall_seconds'] / runs[index - 1]['wall_seconds'] - 1:+.0%})"
+        slowest = sorted(stage_totals(run).items(), key=lambda item: item[1]["wall_seconds"], reverse=True)[:3]
+        stages = ", ".join(f"{name} {values['wall_seconds']:.1f}s" for name, values in slowest)
+        lines.append(
+            f"{run['started_at']} [{run['status']}] {run['wall_seconds']:.1f}s{change},"
+            f" peak {run['peak_rss_bytes'] / 2**20:.0f} MiB — {stages}"
+        )
+    return "\n".join(lines)
 
-    explanations_doc = load_json(EXPLANATIONS_DIR / "xai_explanations.json", default={"explanations": []})
-    explanations = explanations_doc.get("explanations", [])
 
+def render(summary: Mapping[str, Any], events: List[Dict[str, Any]], runs: Optional[List[Dict[str, Any]]] = None) -> str:
+    top_detections = summary.get("top", [])
     sections = [
-        render_metrics(detections),
-        render_alerts(detections),
-        render_explanations(explanations),
-        render_audit(),
+        render_metrics(summary.get("total", 0), summary.get("severity_counts", {})),
+        render_alerts(top_detections),
+        render_explanations(top_detections),
+        render_audit(events),
+        render_trends(runs or []),
     ]
-    print("\n\n".join(sections))
+    return "\n\n".join(sections)
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Console dashboard for TRUSTED AI SOC LITE")
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Keep running and redraw when a new run or audit event appears",
+    )
+    args = parser.parse_args()
+
+    audit_tail = AuditTail(AUDIT_LOG if AUDIT_LOG.exists() else LEGACY_AUDIT_LOG, AUDIT_EVENTS)
+    audit_tail.poll()
+    summary_mtime, metrics_mtime = _mtime(LATEST_RUN), _mtime(RUN_METRICS)
+    summary = load_latest_run()
+    runs = read_runs(RUN_METRICS, TREND_RUNS)
+    if args.watch is None:
+        print(render(summary, list(audit_tail.events), runs))
+        return
+
+    try:
+        changed = True
+        while True:
+            if changed:
+                # Clear the terminal and move the cursor home before redrawing.
+                print("\033[2J\033[H" + render(summary, list(audit_tail.events), runs), flush=True)
+            time.sleep(args.watch)
+            changed = audit_tail.poll()
+            if _mtime(LATEST_RUN) != summary_mtime:
+                summary_mtime = _mtime(LATEST_RUN)
+                summary = load_latest_run()
+                changed = True
+            if _mtime(RUN_METRICS) != metrics_mtime:
+                metrics_mtime = _mtime(RUN_METRICS)
+                runs = read_runs(RUN_METRICS, TREND_RUNS)
+                changed = True
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
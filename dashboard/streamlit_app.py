@@ -1,13 +1,25 @@
 """Streamlit dashboard for TRUSTED AI SOC LITE."""
 from __future__ import annotations
 
-import json
+import sys
 from pathlib import Path
-from typing import Dict
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 import streamlit as st
 
+from ai_engine import xai_explain
+from ai_engine.detect_anomalies import iter_detections, latest_detections_file
+from ai_engine.detection_store import DetectionStore
+from config.loader import load_settings
+from logs.audit import AuditTail
+from logs.metrics import read_runs, stage_totals
+
 st.set_page_config(page_title="Trusted AI SOC Lite", layout="wide", page_icon="🛡️")
 
 DASHBOARD_STYLE = """
@@ -61,22 +73,104 @@ st.caption("Autonomous and explainable SOC powered by Nmap, Wazuh and AI")
 
 LOGS_DIR = Path("logs")
 EXPLANATIONS_DIR = LOGS_DIR / "explanations"
+AUDIT_LOG = LOGS_DIR / "audit.ndjson"
+LEGACY_AUDIT_LOG = LOGS_DIR / "audit.json"
+DETECTION_STORE = LOGS_DIR / "detections.sqlite"
+RUN_METRICS = LOGS_DIR / "run_metrics.ndjson"
+CONFIG_PATH = Path("config/settings.yaml")
+
+dashboard_conf = load_settings(CONFIG_PATH).get("dashboard", {})
+REFRESH_SECONDS = float(dashboard_conf.get("refresh_seconds", 10))
+AUDIT_ROWS = int(dashboard_conf.get("audit_rows", 200))
+TREND_RUNS = int(dashboard_conf.get("trend_runs", 30))
+
+
+def file_key(path: Path) -> Optional[Tuple[int, int, int]]:
+    """Identify a file version by inode, modification time and size."""
+
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
 
+def detections_cursor() -> Tuple[Any, ...]:
+    """Cheaply identify the latest run: its id in the store, else the newest detections file."""
+
+    if DETECTION_STORE.exists():
+        with DetectionStore(DETECTION_STORE) as store:
+            run = store.latest_run()
+        if run is not None:
+            return ("store", run["run_id"])
+    latest = latest_detections_file(EXPLANATIONS_DIR) if EXPLANATIONS_DIR.exists() else None
+    return ("file", str(latest), file_key(latest)) if latest else ("none",)
+
+
+def explanations_cursor() -> Tuple[Optional[str], Optional[Tuple[int, int, int]]]:
+    path = xai_explain.explanations_file(EXPLANATIONS_DIR) if EXPLANATIONS_DIR.exists() else None
+    return (str(path), file_key(path)) if path else (None, None)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_detections(cursor: Tuple[Any, ...]) -> Dict:
+    """Load the run identified by ``cursor``; a new run yields a new cursor and a cache miss."""
+
+    if cursor[0] == "store":
+        with DetectionStore(DETECTION_STORE) as store:
+            detections = store.run_detections(cursor[1])
+            top = store.top_detections(5, run_id=cursor[1])
+        document: Dict[str, Any] = {"detections": detections, "top": top}
+    elif cursor[0] == "file":
+        detections = list(iter_detections(Path(cursor[1])))
+        ranked = sorted(detections, key=lambda det: float(det.get("anomaly_score", 0)), reverse=True)
+        document = {"detections": detections, "top": ranked[:5]}
+    else:
+        return {"detections": [], "top": []}
+    if document["detections"]:
+        document["service_scores"] = pd.DataFrame(document["detections"]).groupby("service")["anomaly_score"].mean()
+    return document
 
-@st.cache_data(show_spinner=False)
-def load_detections() -> Dict:
-    files = sorted(EXPLANATIONS_DIR.glob("detections_*.json"), reverse=True)
-    if not files:
-        return {"detections": []}
-    return json.loads(files[0].read_text(encoding="utf-8"))
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_explanations(path: Optional[str], key: Optional[Tuple[int, int, int]]) -> List[Dict]:
+    if path is None or key is None:
+        return []
+    return xai_explain.load_explanations(Path(path))
 
-@st.cache_data(show_spinner=False)
-def load_explanations() -> Dict:
-    path = EXPLANATIONS_DIR / "xai_explanations.json"
-    if not path.exists():
-        return {"explanations": []}
-    return json.loads(path.read_text(encoding="utf-8"))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_run_metrics(key: Optional[Tuple[int, int, int]]) -> pd.DataFrame:
+    """Per-stage wall seconds of the last ``TREND_RUNS`` pipeline runs, one row per run."""
+
+    if key is None:
+        return pd.DataFrame()
+    rows = []
+    for run in read_runs(RUN_METRICS, TREND_RUNS):
+        stages = {name: values["wall_seconds"] for name, values in stage_totals(run).items()}
+        rows.append({"started_at": run["started_at"], "total": run["wall_seconds"], **stages})
+    return pd.DataFrame(rows).set_index("started_at") if rows else pd.DataFrame()
+
+
+def load_audit() -> Tuple[List[Dict], pd.DataFrame]:
+    """Return the last ``AUDIT_ROWS`` audit events and their table, reading only new lines.
+
+    Each session keeps an ``AuditTail`` positioned at the end of the log, so a
+    rerun parses and normalises just the events appended since the last one.
+    """
+
+    audit_path = AUDIT_LOG if AUDIT_LOG.exists() else LEGACY_AUDIT_LOG
+    tail = st.session_state.get("audit_tail")
+    if tail is None or tail.path != audit_path:
+        tail = st.session_state["audit_tail"] = AuditTail(audit_path, AUDIT_ROWS)
+        st.session_state["audit_df"] = pd.DataFrame()
+    reset, new_events = tail.read_new()
+    if reset:
+        st.session_state["audit_df"] = pd.json_normalize(new_events)
+    elif new_events:
+        frame = pd.concat([st.session_state["audit_df"], pd.json_normalize(new_events)], ignore_index=True)
+        st.session_state["audit_df"] = frame.tail(AUDIT_ROWS).reset_index(drop=True)
+    return list(tail.events), st.session_state["audit_df"]
 
 
 def severity_color(severity: str) -> str:
@@ -88,69 +182,93 @@ def severity_color(severity: str) -> str:
     }.get(severity, "#38bdf8")
 
 
-detections = load_detections().get("detections", [])
-explanations_map = {
-    (item.get("ip"), item.get("port")): item.get("explanation", [])
-    for item in load_explanations().get("explanations", [])
-}
+def render_dashboard() -> None:
+    latest = load_detections(detections_cursor())
+    detections = latest.get("detections", [])
+    explanations_map = {
+        (item.get("ip"), item.get("port")): item.get("explanation", [])
+        for item in load_explanations(*explanations_cursor())
+    }
+    audit_events, audit_df = load_audit()
+
+    high = sum(1 for d in detections if d.get("severity") == "high")
+    medium = sum(1 for d in detections if d.get("severity") == "medium")
+    critical = sum(1 for d in detections if d.get("severity") == "critical")
 
-high = sum(1 for d in detections if d.get("severity") == "high")
-medium = sum(1 for d in detections if d.get("severity") == "medium")
-critical = sum(1 for d in detections if d.get("severity") == "critical")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Vulnerabilities Detected", len(detections), help="Total anomalies flagged by the AI")
+    col2.metric("High Severity", high)
+    col3.metric("Medium Severity", medium)
 
-col1, col2, col3 = st.columns(3)
-col1.metric("Vulnerabilities Detected", len(detections), help="Total anomalies flagged by the AI")
-col2.metric("High Severity", high)
-col3.metric("Medium Severity", medium)
+    st.divider()
 
-st.divider()
+    left_col, right_col = st.columns([2, 1])
 
-left_col, right_col = st.columns([2, 1])
+    with left_col:
+        st.markdown('<div class="section-title">AI Analysis</div>', unsafe_allow_html=True)
+        if detections:
+            st.bar_chart(latest["service_scores"])
+        else:
+            st.info("No detections available. Run the pipeline to populate data.")
 
-with left_col:
-    st.markdown('<div class="section-title">AI Analysis</div>', unsafe_allow_html=True)
-    if detections:
-        df = pd.DataFrame(detections)
-        st.bar_chart(df.groupby("service")["anomaly_score"].mean())
-    else:
-        st.info("No detections available. Run the pipeline to populate data.")
-
-    st.markdown('<div class="section-title">Real-Time Alerts</div>', unsafe_allow_html=True)
-    if detections:
-        for det in detections[:5]:
-            severity = det.get("severity", "low")
-            st.markdown(
-                f'<div class="alert-card alert-{severity}"><strong>{severity.upper()}</strong> '
-                f"Anomaly detected on {det.get('ip')}:{det.get('port')} ({det.get('service')})" \
-                f" — score {det.get('anomaly_score'):.2f}</div>",
-                unsafe_allow_html=True,
-            )
+        st.markdown('<div class="section-title">Real-Time Alerts</div>', unsafe_allow_html=True)
+        if detections:
+            for det in latest.get("top", []):
+                severity = det.get("severity", "low")
+                st.markdown(
+                    f'<div class="alert-card alert-{severity}"><strong>{severity.upper()}</strong> '
+                    f"Anomaly detected on {det.get('ip')}:{det.get('port')} ({det.get('service')})" \
+                    f" — score {det.get('anomaly_score'):.2f}</div>",
+                    unsafe_allow_html=True,
+                )
+        else:
+            st.success("All clear! No anomalies detected in the latest scan.")
+
+    with right_col:
+        st.markdown('<div class="section-title">Recent Scans</div>', unsafe_allow_html=True)
+        scans = sorted((LOGS_DIR / "scans").glob("*") , reverse=True)[:5]
+        for scan in scans:
+            st.text(scan.name)
+
+        st.markdown('<div class="section-title">Automated Actions</div>', unsafe_allow_html=True)
+        if audit_events:
+            for event in audit_events[-5:][::-1]:
+                st.markdown(
+                    f"<div class='alert-card'><strong>{event['type']}</strong><br/>{event['timestamp']}</div>",
+                    unsafe_allow_html=True,
+                )
+        else:
+            st.write("No automated actions logged yet.")
+
+    st.divider()
+
+    st.markdown('<div class="section-title">Audit Log</div>', unsafe_allow_html=True)
+    if audit_events:
+        st.dataframe(audit_df.tail(10))
     else:
-        st.success("All clear! No anomalies detected in the latest scan.")
-
-with right_col:
-    st.markdown('<div class="section-title">Recent Scans</div>', unsafe_allow_html=True)
-    scans = sorted((LOGS_DIR / "scans").glob("*") , reverse=True)[:5]
-    for scan in scans:
-        st.text(scan.name)
-
-    st.markdown('<div class="section-title">Automated Actions</div>', unsafe_allow_html=True)
-    audit_path = Path("logs/audit.json")
-    if audit_path.exists():
-        audit = json.loads(audit_path.read_text(encoding="utf-8"))
-        for event in audit.get("events", [])[-5:][::-1]:
-            st.markdown(
-                f"<div class='alert-card'><strong>{event['type']}</strong><br/>{event['timestamp']}</div>",
-                unsafe_allow_html=True,
-            )
+        st.write("Audit log not found. Run the detection pipeline to generate entries.")
+
+    st.markdown('<div class="section-title">Pipeline Performance</div>', unsafe_allow_html=True)
+    run_metrics = load_run_metrics(file_key(RUN_METRICS))
+    if run_metrics.empty:
+        st.write("No pipeline runs measured yet.")
     else:
-        st.write("No automated actions logged yet.")
+        last = run_metrics["total"].iloc[-1]
+        previous = run_metrics["total"].iloc[-2] if len(run_metrics) > 1 else None
+        st.metric(
+            "Last Run",
+            f"{last:.1f}s",
+            None if previous is None else f"{last - previous:+.1f}s",
+            delta_color="inverse",
+        )
+        st.line_chart(run_metrics.drop(columns="total"))
 
-st.divider()
 
-st.markdown('<div class="section-title">Audit Log</div>', unsafe_allow_html=True)
-if Path("logs/audit.json").exists():
-    audit_df = pd.json_normalize(json.loads(Path("logs/audit.json").read_text(encoding="utf-8"))["events"])
-    st.dataframe(audit_df.tail(10))
+if REFRESH_SECONDS > 0 and hasattr(st, "fragment"):
+    # Only the data section reruns on the timer; the page chrome stays put.
+    st.fragment(run_every=REFRESH_SECONDS)(render_dashboard)()
 else:
-    st.write("Audit log not found. Run the detection pipeline to generate entries.")
+    render_dashboard()
+    if REFRESH_SECONDS > 0:  # Streamlit releases without fragments
+        time.sleep(REFRESH_SECONDS)
+        st.rerun()
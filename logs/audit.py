@@ -1,43 +1,366 @@
 """Audit logging utilities for TRUSTED AI SOC LITE."""
 from __future__ import annotations
 
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
 import json
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from config.loader import load_settings
+from logs.metrics import tally
+from logs.rotation import RotationPolicy, iter_lines, rotate_if_needed, tail_lines
+from logs.wazuh_forwarder import create_forwarder
+
+
+def is_legacy_document(path: Path) -> bool:
+    """Return ``True`` when ``path`` holds a legacy ``{"events": [...]}`` document.
+
+    The legacy audit log was a single (usually indented) JSON object, whereas the
+    append-only store writes one event object per line. Only the first line is
+    inspected so the check is cheap regardless of the history size.
+    """
+
+    if not path.exists():
+        return False
+    with path.open("r", encoding="utf-8") as fh:
+        first_line = fh.readline().strip()
+    if not first_line:
+        return False
+    try:
+        head = json.loads(first_line)
+    except json.JSONDecodeError:
+        # A bare brace opens an indented document; anything else is a torn NDJSON event.
+        return first_line == "{"
+    return isinstance(head, dict) and "events" in head
+
+
+def read_audit_events(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield audit events from either the NDJSON store or a legacy JSON document.
+
+    Rotated (possibly compressed) segments of the store are read first.
+    """
+
+    if is_legacy_document(path):
+        with path.open("r", encoding="utf-8") as fh:
+            yield from json.load(fh).get("events", [])
+        return
+    for line in iter_lines(path):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def tail_audit_events(path: Path, count: int) -> List[Dict[str, Any]]:
+    """Return the last ``count`` events, oldest first, without reading the whole history."""
+
+    if is_legacy_document(path):
+        return list(read_audit_events(path))[-count:] if count else []
+    return [json.loads(line) for line in tail_lines(path, count)]
+
+
+class AuditTail:
+    """Keep the last ``count`` events of an audit log up to date by reading only appended bytes.
+
+    A rotation (new inode) or truncation is detected on ``poll`` and the
+    window is rebuilt from the end of the log.
+    """
+
+    def __init__(self, path: Path, count: int) -> None:
+        self.path = path
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=count)
+        self._inode: Optional[int] = None
+        self._offset = 0
+
+    def _complete_size(self, size: int) -> int:
+        """Return the offset just past the last complete line within the first ``size`` bytes."""
+
+        with self.path.open("rb") as fh:
+            start = max(size - 65536, 0)
+            fh.seek(start)
+            data = fh.read(size - start)
+        return start + data.rfind(b"\n") + 1 if b"\n" in data else start
+
+    def read_new(self) -> Tuple[bool, List[Dict[str, Any]]]:
+        """Pick up new events and return ``(reset, events)``.
+
+        ``events`` are the events appended since the last call, or the whole
+        rebuilt window when ``reset`` is ``True``.
+        """
+
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return False, []
+        if stat.st_ino == self._inode and stat.st_size == self._offset:
+            return False, []
+        if stat.st_ino != self._inode or stat.st_size < self._offset or is_legacy_document(self.path):
+            self.events.clear()
+            self.events.extend(tail_audit_events(self.path, self.events.maxlen or 0))
+            self._inode, self._offset = stat.st_ino, self._complete_size(stat.st_size)
+            return True, list(self.events)
+        with self.path.open("rb") as fh:
+            fh.seek(self._offset)
+            data = fh.read(stat.st_size - self._offset)
+        complete = data[: data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        new_events = [json.loads(line) for line in complete.decode("utf-8").splitlines() if line.strip()]
+        self.events.extend(new_events)
+        return False, new_events
+
+    def poll(self) -> bool:
+        """Pick up new events and return ``True`` if the window changed."""
+
+        reset, new_events = self.read_new()
+        return reset or bool(new_events)
+
+
+def load_audit_document(path: Path) -> Dict[str, Any]:
+    """Return the audit history in the historical ``{"events": [...]}`` shape."""
+
+    return {"events": list(read_audit_events(path))}
+
+
+class AuditStore:
+    """Append-only NDJSON event store; each append costs O(1) regardless of history.
+
+    With a ``rotation`` policy the file is rolled over before an append once
+    it is due.
+    """
+
+    def __init__(self, path: Path, rotation: Optional[RotationPolicy] = None) -> None:
+        self.path = path
+        self.rotation = rotation or RotationPolicy()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if is_legacy_document(self.path):
+            raise ValueError(
+                f"{self.path} is a legacy JSON audit document. Migrate it with "
+                f"`python logs/audit.py migrate {self.path} <new-path>` first."
+            )
+        self.path.touch(exist_ok=True)
+
+    def append(self, event: Dict[str, Any]) -> None:
+        self.append_many([event])
+
+    def append_many(self, events: Iterable[Dict[str, Any]]) -> None:
+        payload = "".join(json.dumps(event) + "\n" for event in events)
+        if not payload:
+            return
+        rotate_if_needed(self.path, self.rotation)
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(payload)
+
+    def iter_events(self) -> Iterator[Dict[str, Any]]:
+        return read_audit_events(self.path)
+
+
+def migrate_legacy_audit(source: Path, destination: Path) -> int:
+    """Copy events from a legacy JSON document into an append-only store."""
+
+    if source.resolve() == destination.resolve():
+        raise ValueError("Migration destination must differ from the legacy document")
+    store = AuditStore(destination)
+    count = 0
+    batch = []
+    for event in read_audit_events(source):
+        batch.append(event)
+        if len(batch) >= 1000:
+            store.append_many(batch)
+            count += len(batch)
+            batch = []
+    store.append_many(batch)
+    return count + len(batch)
+
+
+_STOP = object()
+
+
+class _BatchWriter(threading.Thread):
+    """Background thread draining a bounded queue into coalesced writes.
+
+    A batch is flushed once ``flush_every`` events are buffered or
+    ``flush_interval_ms`` has elapsed since the first buffered event, whichever
+    comes first. Producers block when the queue is full, which bounds memory.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[Dict[str, Any]]], None],
+        flush_every: int,
+        flush_interval_ms: int,
+        queue_size: int,
+    ) -> None:
+        super().__init__(name="audit-writer", daemon=True)
+        self._write = write
+        self._flush_every = max(flush_every, 1)
+        self._flush_interval = max(flush_interval_ms, 1) / 1000
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(queue_size, 1))
+        self.error: Optional[BaseException] = None
+        # Events handed to the thread that never reached the store once a write failed.
+        self.dropped = 0
+
+    def put(self, event: Dict[str, Any]) -> None:
+        if self.error is not None:
+            raise self._failure() from self.error
+        self._queue.put(event)
+
+    def _failure(self) -> RuntimeError:
+        return RuntimeError(f"Audit writer thread failed; {self.dropped} events were not written")
+
+    def run(self) -> None:
+        buffer: List[Dict[str, Any]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if buffer else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(buffer)
+                return
+            if item is not None:
+                if not buffer:
+                    deadline = time.monotonic() + self._flush_interval
+                buffer.append(item)
+            if len(buffer) >= self._flush_every or (buffer and time.monotonic() >= deadline):
+                self._flush(buffer)
+                buffer = []
+
+    def _flush(self, buffer: List[Dict[str, Any]]) -> None:
+        if not buffer:
+            return
+        if self.error is not None:
+            self.dropped += len(buffer)
+            return
+        try:
+            self._write(buffer)
+        except BaseException as exc:  # surfaced to the producer in close()
+            self.error = exc
+            self.dropped += len(buffer)
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self.join()
+        if self.error is not None:
+            raise self._failure() from self.error
 
 
 class AuditLogger:
-    """Lightweight audit logger storing events both in JSON and NDJSON."""
+    """Lightweight audit logger storing events in the audit store and NDJSON."""
 
     def __init__(self, settings_path: Path = Path("config/settings.yaml")) -> None:
-        settings = load_settings(settings_path)
-        audit_conf = settings.get("audit", {})
-        self.audit_path = Path(audit_conf.get("audit_log", "logs/audit.json"))
-        self.audit_path.parent.mkdir(parents=True, exist_ok=True)
-        self.ndjson_path = Path(audit_conf.get("wazuh_event_log", "logs/wazuh_events.ndjson"))
+        audit_conf = load_settings(settings_path).audit
+        self.audit_path = audit_conf.audit_log
+        self.rotation = RotationPolicy.from_mapping(audit_conf.rotation)
+        self.store = AuditStore(self.audit_path, self.rotation)
+        self.ndjson_path = audit_conf.wazuh_event_log
         self.ndjson_path.parent.mkdir(parents=True, exist_ok=True)
+        # With a forwarder, events go straight to Wazuh instead of the tailed NDJSON file.
+        self.forwarder = create_forwarder(audit_conf.wazuh_forwarder)
+        self.flush_every = audit_conf.flush_every_events
+        self.flush_interval_ms = audit_conf.flush_interval_ms
+        self.queue_size = audit_conf.queue_size
+        self._writer: Optional[_BatchWriter] = None
+
+    def __enter__(self) -> "AuditLogger":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
-        if not self.audit_path.exists():
-            with self.audit_path.open("w", encoding="utf-8") as fh:
-                json.dump({"events": []}, fh, indent=2)
+    def close(self) -> None:
+        """Close the forwarder's connection; a later event reconnects."""
+
+        if self.forwarder is not None:
+            self.forwarder.close()
 
     def _now(self) -> str:
         return datetime.now(tz=timezone.utc).isoformat()
 
-    def log_event(self, event_type: str, payload: Dict[str, Any]) -> None:
-        event = {"timestamp": self._now(), "type": event_type, "payload": payload}
+    def _write(self, events: List[Dict[str, Any]]) -> None:
+        with tally("audit_write", len(events)):
+            self._write_events(events)
 
-        # Append to JSON list
-        with self.audit_path.open("r+", encoding="utf-8") as fh:
-            data = json.load(fh)
-            data.setdefault("events", []).append(event)
-            fh.seek(0)
-            json.dump(data, fh, indent=2)
-            fh.truncate()
+    def _write_events(self, events: List[Dict[str, Any]]) -> None:
+        # Append to the audit store
+        self.store.append_many(events)
+
+        if self.forwarder is not None:
+            self.forwarder.send(events)
+            return
 
         # Append to NDJSON for Wazuh ingestion
+        rotate_if_needed(self.ndjson_path, self.rotation)
         with self.ndjson_path.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(event) + "\n")
+            fh.write("".join(json.dumps(event) + "\n" for event in events))
+
+    def log_event(self, event_type: str, payload: Dict[str, Any]) -> None:
+        event = {"timestamp": self._now(), "type": event_type, "payload": payload}
+        writer = self._writer
+        if writer is not None:
+            writer.put(event)
+        else:
+            self._write([event])
+
+    def log_events(self, events: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Log ``(event_type, payload)`` pairs through a single batch."""
+
+        with self.batch():
+            for event_type, payload in events:
+                self.log_event(event_type, payload)
+
+    @contextmanager
+    def batch(self) -> Iterator["AuditLogger"]:
+        """Buffer events logged inside the block and write them in large chunks.
+
+        Everything logged in the block is on disk when the block exits. Nested
+        ``batch()`` calls reuse the outer writer. A failed write is raised when
+        the block exits cleanly; an exception from the block itself takes
+        precedence and carries the write failure as its cause.
+        """
+
+        if self._writer is not None:
+            yield self
+            return
+        writer = _BatchWriter(self._write, self.flush_every, self.flush_interval_ms, self.queue_size)
+        writer.start()
+        self._writer = writer
+        try:
+            yield self
+        except BaseException as exc:
+            self._writer = None
+            try:
+                writer.close()
+            except RuntimeError as write_error:
+                raise exc from write_error
+            raise
+        self._writer = None
+        writer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Audit log maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Convert a legacy audit.json into the NDJSON store")
+    migrate.add_argument("source", type=Path, help="Legacy {\"events\": [...]} document")
+    migrate.add_argument("destination", type=Path, help="Append-only NDJSON store to write")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        count = migrate_legacy_audit(args.source, args.destination)
+        print(f"Migrated {count} events to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
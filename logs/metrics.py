@@ -0,0 +1,279 @@
+"""Per-stage timing and resource metrics for pipeline runs.
+
+``run_metrics`` opens the collector of one pipeline run. While it is active,
+``stage`` blocks and ``tally`` calls anywhere in the process (any thread)
+add to it; outside a run they only cost a global lookup, so instrumented
+functions can still be called on their own.
+
+    stage   one entry per block: wall time, CPU time of the process and its
+            finished children (the nmap subprocess), peak RSS so far and
+            records/sec
+    tally   totals per name for hot paths called many times per run, such as
+            audit writes; CPU is the calling thread's
+
+Each run is appended as one JSON line to the metrics file, and the last run
+can be rendered in the Prometheus text format, as a textfile for
+node_exporter or served over HTTP by ``serve_prometheus``.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from logs.rotation import tail_lines
+
+METRIC_PREFIX = "trusted_ai_soc"
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def _cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_bytes() -> int:
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * _RSS_UNIT
+
+
+def _rate(records: Optional[int], seconds: float) -> Optional[float]:
+    if records is None:
+        return None
+    return round(records / seconds, 1) if seconds > 0 else None
+
+
+class Stage:
+    """Handle yielded by ``stage``; set ``records`` to report throughput."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.records: Optional[int] = None
+
+
+class RunMetrics:
+    """Stages and tallies measured during one pipeline run."""
+
+    def __init__(self) -> None:
+        self.started_at = dt.datetime.now(tz=dt.timezone.utc)
+        self.stages: List[Dict[str, Any]] = []
+        self.tallies: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = _cpu_seconds()
+
+    def add_stage(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.stages.append(entry)
+
+    def add_tally(self, name: str, wall: float, cpu: float, records: int) -> None:
+        with self._lock:
+            totals = self.tallies.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "records": 0})
+            totals["calls"] += 1
+            totals["wall"] += wall
+            totals["cpu"] += cpu
+            totals["records"] += records
+
+    def summary(self, status: str) -> Dict[str, Any]:
+        wall = time.perf_counter() - self._wall_start
+        with self._lock:
+            stages = list(self.stages)
+            for name, totals in self.tallies.items():
+                stages.append(
+                    {
+                        "stage": name,
+                        "calls": totals["calls"],
+                        "wall_seconds": round(totals["wall"], 4),
+                        "cpu_seconds": round(totals["cpu"], 4),
+                        "records": totals["records"],
+                        "records_per_second": _rate(totals["records"], totals["wall"]),
+                    }
+                )
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "status": status,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(_cpu_seconds() - self._cpu_start, 4),
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "stages": stages,
+        }
+
+
+_active: Optional[RunMetrics] = None
+
+
+@contextmanager
+def stage(name: str, records: Optional[int] = None) -> Iterator[Stage]:
+    """Measure the block as one stage of the active run."""
+
+    handle = Stage(name)
+    handle.records = records
+    run = _active
+    if run is None:
+        yield handle
+        return
+    wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+    try:
+        yield handle
+    finally:
+        wall = time.perf_counter() - wall_start
+        run.add_stage(
+            {
+                "stage": name,
+                "wall_seconds": round(wall, 4),
+                "cpu_seconds": round(_cpu_seconds() - cpu_start, 4),
+                "peak_rss_bytes": _peak_rss_bytes(),
+                "records": handle.records,
+                "records_per_second": _rate(handle.records, wall),
+            }
+        )
+
+
+@contextmanager
+def tally(name: str, records: int = 0) -> Iterator[None]:
+    """Add the block's wall and thread CPU time to the run's totals for ``name``."""
+
+    run = _active
+    if run is None:
+        yield
+        return
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        run.add_tally(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start, records)
+
+
+@contextmanager
+def run_metrics(path: Optional[Path], textfile: Optional[Path] = None) -> Iterator[RunMetrics]:
+    """Collect the stages of one run and write them when the block exits.
+
+    A nested call joins the outer run. Failed runs are recorded with
+    ``"status": "error"``.
+    """
+
+    global _active
+    if _active is not None:
+        yield _active
+        return
+    run = _active = RunMetrics()
+    status = "error"
+    try:
+        yield run
+        status = "ok"
+    finally:
+        _active = None
+        summary = run.summary(status)
+        if path is not None:
+            append_run(summary, path)
+        if textfile is not None:
+            write_textfile(summary, textfile)
+
+
+def append_run(summary: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps(summary) + "\n")
+
+
+def read_runs(path: Path, count: int) -> List[Dict[str, Any]]:
+    """Return the last ``count`` runs, oldest first, reading only the end of the file."""
+
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in tail_lines(path, count)]
+
+
+def stage_totals(summary: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Sum the entries of each stage name (a run may write the same stage twice)."""
+
+    totals: Dict[str, Dict[str, float]] = {}
+    for entry in summary.get("stages", []):
+        merged = totals.setdefault(entry["stage"], {"wall_seconds": 0.0, "cpu_seconds": 0.0, "records": 0})
+        merged["wall_seconds"] += entry.get("wall_seconds") or 0.0
+        merged["cpu_seconds"] += entry.get("cpu_seconds") or 0.0
+        merged["records"] += entry.get("records") or 0
+        if entry.get("peak_rss_bytes"):
+            merged["peak_rss_bytes"] = max(merged.get("peak_rss_bytes", 0), entry["peak_rss_bytes"])
+    return totals
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(summary: Optional[Dict[str, Any]]) -> str:
+    """Render a run in the Prometheus text exposition format."""
+
+    if not summary:
+        return ""
+    finished = dt.datetime.fromisoformat(summary["started_at"]).timestamp() + summary["wall_seconds"]
+    lines = []
+    run_gauges = [
+        ("run_wall_seconds", "Wall time of the last pipeline run.", summary["wall_seconds"]),
+        ("run_cpu_seconds", "CPU time of the last pipeline run, including child processes.", summary["cpu_seconds"]),
+        ("run_peak_rss_bytes", "Peak resident set size during the last pipeline run.", summary["peak_rss_bytes"]),
+        ("run_success", "1 if the last pipeline run succeeded.", int(summary["status"] == "ok")),
+        ("run_finished_timestamp_seconds", "Unix time the last pipeline run finished.", round(finished, 3)),
+    ]
+    for name, help_text, value in run_gauges:
+        lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} gauge"]
+        lines.append(f"{METRIC_PREFIX}_{name} {value}")
+    totals = stage_totals(summary)
+    stage_metrics = [
+        ("wall_seconds", "Wall time per stage of the last pipeline run."),
+        ("cpu_seconds", "CPU time per stage of the last pipeline run."),
+        ("records", "Records processed per stage of the last pipeline run."),
+        ("peak_rss_bytes", "Peak resident set size at the end of each stage."),
+    ]
+    for key, help_text in stage_metrics:
+        name = f"{METRIC_PREFIX}_stage_{key}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for stage_name, values in totals.items():
+            if key in values:
+                lines.append(f'{name}{{stage="{_escape(stage_name)}"}} {values[key]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(summary: Dict[str, Any], path: Path) -> None:
+    """Atomically write the node_exporter textfile for ``summary``."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(render_prometheus(summary), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def serve_prometheus(metrics_path: Path, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the last run in ``metrics_path`` at ``/metrics`` from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            runs = read_runs(metrics_path, 1)
+            body = render_prometheus(runs[-1] if runs else None).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,257 @@
+"""Size- and time-based rotation of append-only logs and retention of scan outputs.
+
+A log ``events.ndjson`` is rotated by renaming it to
+``events.ndjson.<UTC timestamp>`` (atomic, so a tailing agent keeps reading the
+old inode and reopens the path when it notices the rename). The newest
+segment stays uncompressed until the next rotation, like logrotate's
+``delaycompress``, so a tailer that is still behind can finish it; older
+segments are compressed to ``.gz`` or ``.zst``. The next append creates a
+fresh file. ``iter_lines`` reads the rotated segments oldest first followed by
+the live file, transparently decompressing them.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import io
+import os
+import re
+import shutil
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, List, Mapping, Optional
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+_STAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def _zstandard() -> Any:
+    try:
+        import zstandard
+    except ImportError as exc:  # optional dependency
+        raise ValueError("zstd compression requires the 'zstandard' package") from exc
+    return zstandard
+
+
+def open_segment(path: Path, mode: str = "rt") -> IO[Any]:
+    """Open a plain, ``.gz`` or ``.zst`` file for reading."""
+
+    binary = "b" in mode
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb" if binary else "rt", encoding=None if binary else "utf-8")
+    if path.suffix == ".zst":
+        reader = _zstandard().ZstdDecompressor().stream_reader(path.open("rb"), closefd=True)
+        return reader if binary else io.TextIOWrapper(reader, encoding="utf-8")
+    return path.open("rb" if binary else "r", encoding=None if binary else "utf-8")
+
+
+def strip_compression(path: Path) -> Path:
+    """Return ``path`` without a ``.gz``/``.zst`` suffix, e.g. to find a scan's format."""
+
+    return path.with_suffix("") if path.suffix in {".gz", ".zst"} else path
+
+
+def compress_file(path: Path, compression: str) -> Path:
+    """Compress ``path`` next to itself, replace it atomically and return the new path."""
+
+    suffix = COMPRESSION_SUFFIXES[compression]
+    if not suffix:
+        return path
+    target = path.with_name(path.name + suffix)
+    tmp_path = target.with_name(target.name + ".tmp")
+    with path.open("rb") as src, tmp_path.open("wb") as raw:
+        if compression == "gzip":
+            with gzip.GzipFile(filename=path.name, mode="wb", fileobj=raw, mtime=int(path.stat().st_mtime)) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+        else:
+            with _zstandard().ZstdCompressor().stream_writer(raw, closefd=False) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+    shutil.copystat(path, tmp_path)
+    os.replace(tmp_path, target)
+    path.unlink()
+    return target
+
+
+@dataclass(frozen=True)
+class RotationPolicy:
+    """When to roll a log over and how many rolled segments to keep.
+
+    ``max_bytes`` rotates once the live file reaches that size, and
+    ``interval_hours`` rotates when the last write happened in an earlier
+    interval than now (e.g. ``24`` gives one segment per UTC day). ``0``
+    disables either trigger; ``retention`` ``0`` keeps every segment.
+    """
+
+    max_bytes: int = 0
+    interval_hours: float = 0
+    retention: int = 0
+    compression: str = "gzip"
+
+    def __post_init__(self) -> None:
+        if self.compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported compression {self.compression!r}; use one of {sorted(COMPRESSION_SUFFIXES)}")
+        if self.compression == "zstd":
+            _zstandard()
+
+    @classmethod
+    def from_mapping(cls, conf: Mapping[str, Any]) -> "RotationPolicy":
+        return cls(
+            max_bytes=int(conf.get("max_bytes", 0)),
+            interval_hours=float(conf.get("interval_hours", 0)),
+            retention=int(conf.get("retention", 0)),
+            compression=conf.get("compression", "gzip"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.interval_hours > 0
+
+    def should_rotate(self, path: Path, now: Optional[float] = None) -> bool:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        if stat.st_size == 0:
+            return False
+        if self.max_bytes and stat.st_size >= self.max_bytes:
+            return True
+        if self.interval_hours:
+            width = self.interval_hours * 3600
+            now = time.time() if now is None else now
+            return int(stat.st_mtime // width) < int(now // width)
+        return False
+
+
+def _segment_pattern(path: Path) -> "re.Pattern[str]":
+    return re.compile(re.escape(path.name) + r"\.(\d{8}T\d{6}Z)(?:_(\d+))?(\.gz|\.zst)?$")
+
+
+def rotated_segments(path: Path) -> List[Path]:
+    """Return the rotated segments of ``path``, oldest first."""
+
+    pattern = _segment_pattern(path)
+    if not path.parent.exists():
+        return []
+    found = []
+    for candidate in path.parent.iterdir():
+        match = pattern.match(candidate.name)
+        if match:
+            found.append((match.group(1), int(match.group(2) or 0), candidate))
+    return [candidate for _, _, candidate in sorted(found)]
+
+
+def rotate(path: Path, policy: RotationPolicy, now: Optional[float] = None) -> Optional[Path]:
+    """Roll ``path`` over, compress the older segments, apply retention and return the new segment."""
+
+    now = time.time() if now is None else now
+    stamp = dt.datetime.fromtimestamp(now, tz=dt.timezone.utc).strftime(_STAMP_FORMAT)
+    # Segments rolled within the same second get increasing counters so they keep sorting by age.
+    pattern = _segment_pattern(path)
+    counters = [
+        int(match.group(2) or 0)
+        for match in (pattern.match(existing.name) for existing in rotated_segments(path))
+        if match and match.group(1) == stamp
+    ]
+    counter = max(counters) + 1 if counters else 0
+    segment = path.with_name(f"{path.name}.{stamp}_{counter}" if counter else f"{path.name}.{stamp}")
+    try:
+        os.rename(path, segment)
+    except FileNotFoundError:  # another writer rotated it first
+        return None
+    for previous in rotated_segments(path):
+        if previous != segment and previous.suffix not in {".gz", ".zst"}:
+            try:
+                compress_file(previous, policy.compression)
+            except FileNotFoundError:  # compressed or pruned by another writer
+                continue
+    if policy.retention:
+        for stale in rotated_segments(path)[: -policy.retention]:
+            stale.unlink(missing_ok=True)
+    return segment
+
+
+def rotate_if_needed(path: Path, policy: RotationPolicy, now: Optional[float] = None) -> Optional[Path]:
+    if policy.enabled and policy.should_rotate(path, now):
+        return rotate(path, policy, now)
+    return None
+
+
+def iter_lines(path: Path) -> Iterator[str]:
+    """Yield the lines of every rotated segment of ``path`` (oldest first), then of ``path`` itself."""
+
+    for segment in [*rotated_segments(path), path]:
+        fh = None
+        # A segment may have been compressed (or pruned) since it was listed.
+        for candidate in (segment, *(segment.with_name(segment.name + suffix) for suffix in (".gz", ".zst"))):
+            try:
+                fh = open_segment(candidate)
+                break
+            except FileNotFoundError:
+                continue
+        if fh is None:
+            continue
+        with fh:
+            yield from fh
+
+
+def _tail_plain(path: Path, count: int, block_size: int) -> List[str]:
+    with path.open("rb") as fh:
+        end = fh.seek(0, os.SEEK_END)
+        position = end
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(block_size, position)
+            position -= step
+            fh.seek(position)
+            data = fh.read(step) + data
+    if not data.endswith(b"\n"):
+        # Ignore a line that is still being written.
+        data = data[: data.rfind(b"\n") + 1]
+    if position > 0:
+        data = data[data.find(b"\n") + 1 :]  # the first line may be cut off
+    lines = [line for line in data.decode("utf-8", errors="replace").splitlines() if line.strip()]
+    return lines[-count:] if count else []
+
+
+def tail_lines(path: Path, count: int, block_size: int = 1 << 16) -> List[str]:
+    """Return the last ``count`` non-empty lines of ``path``, continuing into rotated segments.
+
+    The live file is read backwards block by block, so the cost depends on
+    ``count`` rather than on the size of the log. Compressed segments are only
+    opened when the live file holds fewer than ``count`` lines.
+    """
+
+    lines: List[str] = []
+    for segment in [path, *reversed(rotated_segments(path))]:
+        needed = count - len(lines)
+        if needed <= 0:
+            break
+        try:
+            if segment.suffix in {".gz", ".zst"}:
+                with open_segment(segment) as fh:
+                    chunk = list(deque((line.rstrip("\n") for line in fh if line.strip()), maxlen=needed))
+            else:
+                chunk = _tail_plain(segment, needed, block_size)
+        except FileNotFoundError:
+            continue
+        lines = chunk + lines
+    return lines
+
+
+def archive_outputs(
+    paths: Iterable[Path], keep_uncompressed: int, keep: int = 0, compression: str = "gzip"
+) -> None:
+    """Compress all but the newest ``keep_uncompressed`` files and delete all but the newest ``keep``.
+
+    Files are ordered by modification time; ``keep`` ``0`` deletes nothing.
+    """
+
+    ordered = sorted(paths, key=lambda item: item.stat().st_mtime, reverse=True)
+    for index, path in enumerate(ordered):
+        if keep and index >= keep:
+            path.unlink(missing_ok=True)
+        elif index >= keep_uncompressed and path.suffix not in {".gz", ".zst"}:
+            compress_file(path, compression)
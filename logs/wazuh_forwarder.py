@@ -0,0 +1,317 @@
+"""Forward audit events to Wazuh over syslog/TCP or the local agent socket.
+
+Every event becomes one RFC 3164 line tagged with the ``trusted_ai_soc``
+program name that ``trusted-ai-soc_decoders.xml`` matches, carrying the
+event as compact JSON (``"type":"anomaly_detected"``) as the rules expect::
+
+    Oct 17 05:01:37 soc-host trusted_ai_soc: {"timestamp":...,"type":...}
+
+Transports:
+
+    tcp   newline-framed syslog to a manager ``<remote>`` syslog listener
+    unix  datagrams to the agent queue socket (``/var/ossec/queue/sockets/queue``)
+
+Delivery is at least once and in order. Events that cannot be delivered go
+to an on-disk spool; while the spool holds anything, new events queue behind
+it and are replayed oldest first once the manager is reachable again.
+Failed deliveries are retried after ``retry_seconds``. A slow manager blocks
+``send`` for up to ``timeout_seconds``, which stalls the audit writer thread
+and, through its bounded queue, the code logging events.
+
+Each process shares one forwarder per spool (see ``create_forwarder``), and
+every send or replay holds an ``flock`` on ``<spool>.lock`` so the ``drain``
+command and a running pipeline never deliver or truncate the spool at once.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import atexit
+import datetime as dt
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from config.loader import load_settings
+
+PROGRAM_NAME = "trusted_ai_soc"
+AGENT_QUEUE = Path("/var/ossec/queue/sockets/queue")
+# local0.info, the facility Wazuh's syslog listener expects from applications.
+SYSLOG_PRIORITY = 16 * 8 + 6
+
+
+def format_event(event: Dict[str, Any], hostname: Optional[str] = None, now: Optional[dt.datetime] = None) -> bytes:
+    """Return the syslog line (without priority) for one audit event."""
+
+    now = now or dt.datetime.now()
+    stamp = f"{now:%b} {now.day:2d} {now:%H:%M:%S}"
+    payload = json.dumps(event, separators=(",", ":"))
+    return f"{stamp} {hostname or socket.gethostname()} {PROGRAM_NAME}: {payload}".encode("utf-8")
+
+
+class TcpTransport:
+    """Newline-framed syslog over one persistent TCP connection."""
+
+    def __init__(self, host: str, port: int, timeout: float = 5.0) -> None:
+        self.address = (host, port)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+
+    def send(self, lines: List[bytes]) -> None:
+        prefix = f"<{SYSLOG_PRIORITY}>".encode("ascii")
+        try:
+            if self._sock is None:
+                self._sock = socket.create_connection(self.address, self.timeout)
+            self._sock.sendall(b"".join(prefix + line + b"\n" for line in lines))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class UnixTransport:
+    """One datagram per event to the agent queue, in its ``1:<location>:<message>`` form."""
+
+    def __init__(self, path: Path = AGENT_QUEUE, timeout: float = 5.0) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+
+    def send(self, lines: List[bytes]) -> None:
+        header = f"1:{PROGRAM_NAME}:".encode("utf-8")
+        try:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._sock.settimeout(self.timeout)
+                self._sock.connect(str(self.path))
+            for line in lines:
+                self._sock.send(header + line)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class Spool:
+    """Append-only file of undelivered lines and the offset replayed so far.
+
+    The offset lives in ``<spool>.offset`` and is replaced atomically after
+    each delivered batch; both files are emptied once everything is replayed.
+    Callers hold ``lock()`` around any sequence of reads and writes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        self.path = path
+        self.offset_path = path.with_name(path.name + ".offset")
+        self.lock_path = path.with_name(path.name + ".lock")
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def lock(self) -> Iterator["Spool"]:
+        """Hold an exclusive lock on the spool across processes."""
+
+        with self.lock_path.open("a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def offset(self) -> int:
+        if not self.offset_path.exists():
+            return 0
+        return int(self.offset_path.read_text(encoding="ascii") or 0)
+
+    def pending(self) -> bool:
+        return self.size() > self.offset()
+
+    def append(self, lines: List[bytes]) -> int:
+        """Spool as many ``lines`` as fit under ``max_bytes`` and return how many were dropped."""
+
+        room = self.max_bytes - self.size()
+        accepted = []
+        for line in lines:
+            room -= len(line) + 1
+            if room < 0:
+                break
+            accepted.append(line)
+        if accepted:
+            with self.path.open("ab") as fh:
+                fh.write(b"".join(line + b"\n" for line in accepted))
+        return len(lines) - len(accepted)
+
+    def read_batch(self, count: int) -> Tuple[List[bytes], int]:
+        """Return up to ``count`` undelivered lines and the offset just past them."""
+
+        with self.path.open("rb") as fh:
+            fh.seek(self.offset())
+            lines = []
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                lines.append(line[:-1])
+                if len(lines) >= count:
+                    break
+            return lines, fh.tell() if lines else self.offset()
+
+    def commit(self, offset: int) -> None:
+        if offset >= self.size():
+            self.path.unlink(missing_ok=True)
+            self.offset_path.unlink(missing_ok=True)
+            return
+        tmp_path = self.offset_path.with_name(self.offset_path.name + ".tmp")
+        tmp_path.write_text(str(offset), encoding="ascii")
+        os.replace(tmp_path, self.offset_path)
+
+
+class WazuhForwarder:
+    """Batch events to a transport, spooling them while the manager is unreachable."""
+
+    def __init__(
+        self,
+        transport: Any,
+        spool: Spool,
+        batch_events: int = 500,
+        retry_seconds: float = 30.0,
+        hostname: Optional[str] = None,
+    ) -> None:
+        self.transport = transport
+        self.spool = spool
+        self.batch_events = batch_events
+        self.retry_seconds = retry_seconds
+        self.hostname = hostname or socket.gethostname()
+        self.dropped = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def send(self, events: Iterable[Dict[str, Any]]) -> None:
+        lines = [format_event(event, self.hostname) for event in events]
+        if not lines:
+            return
+        with self._lock, self.spool.lock():
+            self._send(lines)
+
+    def _send(self, lines: List[bytes]) -> None:
+        if self.spool.pending() or time.monotonic() < self._retry_at:
+            # Queue behind the spooled events so the manager sees them in order.
+            self.dropped += self.spool.append(lines)
+            self._drain(False)
+            return
+        for start in range(0, len(lines), self.batch_events):
+            batch = lines[start : start + self.batch_events]
+            try:
+                self.transport.send(batch)
+            except OSError:
+                self._retry_at = time.monotonic() + self.retry_seconds
+                self.dropped += self.spool.append(lines[start:])
+                return
+
+    def drain(self, force: bool = False) -> int:
+        """Replay spooled events in order and return how many were delivered.
+
+        Nothing is attempted before the retry delay has passed unless ``force`` is set.
+        """
+
+        with self._lock, self.spool.lock():
+            return self._drain(force)
+
+    def _drain(self, force: bool) -> int:
+        if not force and time.monotonic() < self._retry_at:
+            return 0
+        delivered = 0
+        while self.spool.pending():
+            lines, offset = self.spool.read_batch(self.batch_events)
+            if not lines:
+                break
+            try:
+                self.transport.send(lines)
+            except OSError:
+                self._retry_at = time.monotonic() + self.retry_seconds
+                break
+            self.spool.commit(offset)
+            delivered += len(lines)
+        return delivered
+
+    def close(self) -> None:
+        """Close the transport; the next ``send`` reconnects."""
+
+        with self._lock:
+            self.transport.close()
+
+
+_forwarders: Dict[Path, WazuhForwarder] = {}
+_forwarders_lock = threading.Lock()
+
+
+def create_forwarder(conf: Mapping[str, Any]) -> Optional[WazuhForwarder]:
+    """Return the process-wide forwarder described by ``audit.wazuh_forwarder``, or ``None`` when it is disabled.
+
+    Every audit logger writing to the same spool shares one forwarder, so their
+    sends are serialised and the transport is closed when the process exits.
+    """
+
+    if not conf.get("enabled", False):
+        return None
+    spool_path = Path(conf.get("spool_path", "logs/wazuh_spool.ndjson"))
+    key = spool_path.resolve()
+    with _forwarders_lock:
+        forwarder = _forwarders.get(key)
+        if forwarder is None:
+            forwarder = _forwarders[key] = _build_forwarder(conf, spool_path)
+            atexit.register(forwarder.close)
+        return forwarder
+
+
+def _build_forwarder(conf: Mapping[str, Any], spool_path: Path) -> WazuhForwarder:
+    timeout = float(conf.get("timeout_seconds", 5))
+    if conf.get("transport", "tcp") == "unix":
+        transport: Any = UnixTransport(Path(conf.get("socket_path", AGENT_QUEUE)), timeout)
+    else:
+        transport = TcpTransport(conf.get("host", "127.0.0.1"), int(conf.get("port", 514)), timeout)
+    spool = Spool(spool_path, int(conf.get("spool_max_bytes", 104857600)))
+    return WazuhForwarder(
+        transport, spool, int(conf.get("batch_events", 500)), float(conf.get("retry_seconds", 30))
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Wazuh forwarder maintenance")
+    parser.add_argument("command", choices=["status", "drain"], help="Show the spool or replay it now")
+    parser.add_argument("--config", type=Path, default=Path("config/settings.yaml"), help="Settings file")
+    args = parser.parse_args()
+
+    forwarder = create_forwarder(load_settings(args.config).audit.wazuh_forwarder)
+    if forwarder is None:
+        parser.error("audit.wazuh_forwarder is not enabled")
+    if args.command == "drain":
+        print(f"Replayed {forwarder.drain(force=True)} events")
+        forwarder.close()
+    with forwarder.spool.lock() as spool:
+        pending = spool.size() - spool.offset() if spool.pending() else 0
+    print(f"{spool.path}: {pending} bytes pending")
+
+
+if __name__ == "__main__":
+    main()
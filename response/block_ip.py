@@ -1,4 +1,12 @@
-"""Simple firewall integration for automatic blocking of IP addresses."""
+"""Firewall integration for automatic blocking of IP addresses.
+
+``block_ips`` is the response engine: it drops addresses that are already
+blocked (in this process or in the persisted ``state_file``), collapses the
+rest into the smallest exact set of CIDR networks and hands them to the
+configured backend in one call. The ``ipset``, ``nftables`` and
+``iptables-restore`` backends load the whole batch with a single process;
+``ufw`` has no bulk interface and still runs one command per network.
+"""
 from __future__ import annotations
 
 import sys
@@ -8,41 +16,262 @@ if __package__ in {None, ""}:
     sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 import argparse
+import ipaddress
+import json
+import os
 import subprocess
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
 
 from config.loader import load_settings
 from logs.audit import AuditLogger
 
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def _label(network: Network) -> str:
+    return str(network.network_address) if network.num_addresses == 1 else str(network)
+
+
+def _by_version(networks: Iterable[Network]) -> Dict[int, List[Network]]:
+    grouped: Dict[int, List[Network]] = {4: [], 6: []}
+    for network in networks:
+        grouped[network.version].append(network)
+    return grouped
+
+
+def collapse(networks: Iterable[Network]) -> List[Network]:
+    """Merge adjacent networks into CIDR blocks without covering any extra address."""
+
+    collapsed: List[Network] = []
+    for version, group in sorted(_by_version(networks).items()):
+        collapsed.extend(ipaddress.collapse_addresses(group))
+    return collapsed
+
+
+class FirewallBackend(ABC):
+    """Apply a batch of networks to a firewall. ``apply`` raises ``FileNotFoundError`` when the tool is missing."""
+
+    name = ""
+
+    @abstractmethod
+    def apply(self, networks: List[Network]) -> None:
+        """Block ``networks``, which may contain networks blocked by an earlier batch."""
+
+
+class UfwBackend(FirewallBackend):
+    name = "ufw"
+
+    def apply(self, networks: List[Network]) -> None:
+        for network in networks:
+            subprocess.run(["ufw", "deny", "from", str(network)], check=True, capture_output=True)
+
+
+class IpsetBackend(FirewallBackend):
+    """Add networks to ``hash:net`` sets (``<set_name>`` and ``<set_name>6``) via one ``ipset restore``.
+
+    The sets are created if needed; a firewall rule matching them is expected
+    to exist already.
+    """
+
+    name = "ipset"
+
+    def __init__(self, set_name: str = "soc_lite_blocklist") -> None:
+        self.set_name = set_name
+
+    def script(self, networks: List[Network]) -> str:
+        lines = []
+        for version, group in sorted(_by_version(networks).items()):
+            if not group:
+                continue
+            name, family = (self.set_name, "inet") if version == 4 else (f"{self.set_name}6", "inet6")
+            lines.append(f"create {name} hash:net family {family} -exist")
+            lines.extend(f"add {name} {network} -exist" for network in group)
+        return "\n".join(lines) + "\n"
+
+    def apply(self, networks: List[Network]) -> None:
+        subprocess.run(["ipset", "restore"], input=self.script(networks), text=True, check=True, capture_output=True)
+
+
+class NftablesBackend(FirewallBackend):
+    """Add networks to interval sets ``<set_name>4``/``<set_name>6`` in ``inet <table>`` in one ``nft -f`` transaction.
+
+    The sets use ``auto-merge``: an interval set rejects overlapping elements
+    otherwise, and a new network may contain ones blocked earlier.
+    """
+
+    name = "nftables"
+
+    def __init__(self, table: str = "soc_lite", set_name: str = "blocklist") -> None:
+        self.table = table
+        self.set_name = set_name
+
+    def script(self, networks: List[Network]) -> str:
+        lines = [f"add table inet {self.table}"]
+        for version, group in sorted(_by_version(networks).items()):
+            name = f"{self.set_name}{version}"
+            lines.append(f"add set inet {self.table} {name} {{ type ipv{version}_addr; flags interval; auto-merge; }}")
+            if group:
+                elements = ", ".join(str(network) for network in group)
+                lines.append(f"add element inet {self.table} {name} {{ {elements} }}")
+        return "\n".join(lines) + "\n"
+
+    def apply(self, networks: List[Network]) -> None:
+        subprocess.run(["nft", "-f", "-"], input=self.script(networks), text=True, check=True, capture_output=True)
+
+
+class IptablesRestoreBackend(FirewallBackend):
+    """Append DROP rules to ``chain`` with one ``iptables-restore --noflush`` (and ``ip6tables-restore``) batch."""
+
+    name = "iptables"
+
+    def __init__(self, chain: str = "INPUT") -> None:
+        self.chain = chain
+
+    def script(self, networks: List[Network]) -> str:
+        lines = ["*filter"]
+        lines.extend(f"-A {self.chain} -s {network} -j DROP" for network in networks)
+        lines.append("COMMIT")
+        return "\n".join(lines) + "\n"
+
+    def apply(self, networks: List[Network]) -> None:
+        for version, group in sorted(_by_version(networks).items()):
+            if group:
+                command = "iptables-restore" if version == 4 else "ip6tables-restore"
+                subprocess.run(
+                    [command, "--noflush"], input=self.script(group), text=True, check=True, capture_output=True
+                )
+
+
+class StubBackend(FirewallBackend):
+    """Record every batch instead of touching the firewall (dry runs and tests)."""
+
+    name = "stub"
+
+    def __init__(self) -> None:
+        self.calls: List[List[Network]] = []
+
+    def apply(self, networks: List[Network]) -> None:
+        self.calls.append(list(networks))
+
+
+def create_backend(firewall_conf: Dict[str, Any]) -> FirewallBackend:
+    backend = firewall_conf.get("backend", "ufw")
+    if backend == "ufw":
+        return UfwBackend()
+    if backend == "ipset":
+        return IpsetBackend(firewall_conf.get("set_name", "soc_lite_blocklist"))
+    if backend == "nftables":
+        return NftablesBackend(firewall_conf.get("table", "soc_lite"), firewall_conf.get("set_name", "blocklist"))
+    if backend == "iptables":
+        return IptablesRestoreBackend(firewall_conf.get("chain", "INPUT"))
+    if backend == "stub":
+        return StubBackend()
+    raise ValueError(f"Unsupported firewall backend: {backend}")
+
+
+class FirewallResponder:
+    """Block addresses in batches, remembering what is already blocked.
+
+    Keep one instance around to reuse the loaded block list; it is also
+    written to ``response.firewall.state_file`` after every applied batch so
+    other processes and later runs skip those addresses too.
+    """
+
+    def __init__(self, settings_path: Path = Path("config/settings.yaml"), backend: Optional[FirewallBackend] = None) -> None:
+        self.settings_path = settings_path
+        firewall_conf = load_settings(settings_path).get("response", {}).get("firewall", {})
+        self.logger = AuditLogger(settings_path)
+        if backend is None:
+            try:
+                backend = create_backend(firewall_conf)
+            except ValueError as exc:
+                self.logger.log_event("response_error", {"reason": str(exc)})
+                raise
+        self.backend = backend
+        self.state_path = Path(firewall_conf.get("state_file", "logs/blocked_ips.json"))
+        self.blocked: Set[Network] = set()
+        if self.state_path.exists():
+            document = json.loads(self.state_path.read_text(encoding="utf-8"))
+            self.blocked = {ipaddress.ip_network(entry) for entry in document.get("blocked", [])}
+
+    def is_blocked(self, network: Network) -> bool:
+        # Only a handful of distinct prefix lengths are ever stored, so probe each candidate supernet.
+        for prefix in {entry.prefixlen for entry in self.blocked if entry.version == network.version}:
+            if prefix <= network.prefixlen and network.supernet(new_prefix=prefix) in self.blocked:
+                return True
+        return False
+
+    def _drop_covered(self, networks: List[Network]) -> None:
+        """Forget blocked entries that one of ``networks`` contains, so the state stays minimal."""
+
+        added = set(networks)
+        prefixes = {network.prefixlen for network in added}
+        self.blocked = {
+            entry
+            for entry in self.blocked
+            if not any(
+                prefix < entry.prefixlen and entry.supernet(new_prefix=prefix) in added for prefix in prefixes
+            )
+        }
+
+    def _save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        entries = sorted(self.blocked, key=lambda network: (network.version, network))
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp_path.write_text(json.dumps({"blocked": [str(network) for network in entries]}, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.state_path)
+
+    def block_ips(self, ips: Iterable[str]) -> List[str]:
+        """Block every address or CIDR in ``ips`` that is not blocked yet and return the applied networks."""
+
+        pending: Set[Network] = set()
+        with self.logger.batch():
+            for ip in ips:
+                try:
+                    network = ipaddress.ip_network(str(ip).strip(), strict=False)
+                except ValueError as exc:
+                    self.logger.log_event("response_error", {"ip": ip, "reason": str(exc)})
+                    continue
+                if not self.is_blocked(network):
+                    pending.add(network)
+            networks = collapse(pending)
+            if not networks:
+                return []
+            labels = [_label(network) for network in networks]
+
+            try:
+                self.backend.apply(networks)
+            except FileNotFoundError:
+                self.logger.log_events(
+                    ("firewall_block_simulated", {"ip": label, "backend": self.backend.name, "detail": "Command not available, simulated"})
+                    for label in labels
+                )
+                return labels
+            except subprocess.CalledProcessError as exc:
+                self.logger.log_event("response_error", {"ips": labels, "backend": self.backend.name, "reason": str(exc)})
+                raise
+
+            self.logger.log_events(("firewall_block", {"ip": label, "backend": self.backend.name}) for label in labels)
+        self._drop_covered(networks)
+        self.blocked.update(networks)
+        self._save()
+        return labels
+
 
-SUPPORTED_BACKENDS = {"ufw": ["ufw", "deny"]}
+def block_ips(
+    ips: Iterable[str], settings_path: Path = Path("config/settings.yaml"), backend: Optional[FirewallBackend] = None
+) -> List[str]:
+    return FirewallResponder(settings_path, backend).block_ips(ips)
 
 
 def block_ip(ip: str, settings_path: Path = Path("config/settings.yaml")) -> None:
-    settings = load_settings(settings_path)
-    backend = settings.get("response", {}).get("firewall", {}).get("backend", "ufw")
-    command = SUPPORTED_BACKENDS.get(backend)
-    logger = AuditLogger(settings_path)
-
-    if not command:
-        logger.log_event("response_error", {"ip": ip, "reason": f"Unsupported backend {backend}"})
-        raise ValueError(f"Unsupported firewall backend: {backend}")
-
-    try:
-        subprocess.run(command + [ip], check=True)
-        logger.log_event("firewall_block", {"ip": ip, "backend": backend})
-    except FileNotFoundError:
-        logger.log_event(
-            "firewall_block_simulated",
-            {"ip": ip, "backend": backend, "detail": "Command not available, simulated"},
-        )
-    except subprocess.CalledProcessError as exc:
-        logger.log_event("response_error", {"ip": ip, "reason": str(exc)})
-        raise
+    block_ips([ip], settings_path)
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Block an IP using configured firewall backend")
-    parser.add_argument("ip", help="IP address to block")
+    parser = argparse.ArgumentParser(description="Block IPs using the configured firewall backend")
+    parser.add_argument("ips", nargs="+", help="IP addresses or CIDR networks to block")
     parser.add_argument(
         "--config",
         type=Path,
@@ -50,7 +279,8 @@ def main() -> None:
         help="Settings file",
     )
     args = parser.parse_args()
-    block_ip(args.ip, args.config)
+    for network in block_ips(args.ips, args.config):
+        print(network)
 
 
 if __name__ == "__main__":
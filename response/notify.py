@@ -8,38 +8,241 @@ if __package__ in {None, ""}:
     sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 import argparse
+import atexit
 import smtplib
+import threading
+import time
 from email.message import EmailMessage
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from config.loader import load_settings
 from logs.audit import AuditLogger
 
+Clock = Callable[[], float]
+
+
+class TokenBucket:
+    """Allow ``burst`` messages at once, refilled at ``rate_per_minute`` (``0`` disables the limit)."""
+
+    def __init__(self, rate_per_minute: float, burst: int, clock: Clock = time.monotonic) -> None:
+        self.rate = rate_per_minute / 60
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Notifier:
+    """Send alert emails over one persistent SMTP connection.
+
+    Alerts queued with ``notify`` are grouped per recipient for
+    ``digest_window_seconds`` and sent as one digest. Sends are limited by a
+    token bucket (``rate_limit_per_minute``, ``rate_limit_burst``); digests
+    that are throttled stay queued and absorb later alerts. A dropped
+    connection is reopened once per send. ``close`` flushes everything,
+    waiting for the rate limit if needed.
+    """
+
+    def __init__(
+        self,
+        settings_path: Path = Path("config/settings.yaml"),
+        smtp_factory: Optional[Callable[[str, int], Any]] = None,
+        clock: Clock = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.conf = load_settings(settings_path).get("response", {}).get("email", {})
+        self.logger = AuditLogger(settings_path)
+        self.enabled = self.conf.get("enabled", False)
+        recipients = self.conf.get("recipient") or []
+        self.recipients: List[str] = [recipients] if isinstance(recipients, str) else list(recipients)
+        self.window = float(self.conf.get("digest_window_seconds", 0))
+        self.bucket = TokenBucket(
+            float(self.conf.get("rate_limit_per_minute", 0)),
+            int(self.conf.get("rate_limit_burst", 1)),
+            clock,
+        )
+        self._smtp_factory = smtp_factory or smtplib.SMTP
+        self._clock = clock
+        self._sleep = sleep
+        self._smtp: Optional[Any] = None
+        self._pending: Dict[str, List[Tuple[str, str]]] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        # Throttled alerts also need the flusher, or they wait for the next notify().
+        if self.enabled and (self.window > 0 or self.bucket.rate > 0):
+            self._flusher = threading.Thread(target=self._run_flusher, name="notify-digest", daemon=True)
+            self._flusher.start()
+
+    def __enter__(self) -> "Notifier":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def notify(self, subject: str, body: str, recipients: Optional[Iterable[str]] = None) -> None:
+        if not self.enabled:
+            self.logger.log_event("notification_skipped", {"subject": subject, "reason": "Email disabled"})
+            return
+        now = self._clock()
+        with self._lock:
+            for recipient in recipients or self.recipients:
+                self._pending.setdefault(recipient, []).append((subject, body))
+                self._opened_at.setdefault(recipient, now)
+        if self.window <= 0:
+            self.flush_due()
+
+    def flush_due(self) -> None:
+        """Send the digests whose window has elapsed, as far as the rate limit allows."""
+
+        now = self._clock()
+        with self._lock:
+            due = [recipient for recipient, opened in self._opened_at.items() if now - opened >= self.window]
+            for recipient in due:
+                if not self.bucket.take():
+                    break
+                self._send_digest(recipient)
+
+    def flush(self) -> None:
+        """Send every queued digest now, sleeping for the rate limit when necessary."""
+
+        with self._lock:
+            for recipient in list(self._pending):
+                while not self.bucket.take():
+                    self._sleep(self.bucket.wait_time())
+                self._send_digest(recipient)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        finally:
+            self._disconnect()
+            self.logger.close()
+
+    def _flush_interval(self) -> float:
+        interval = min(self.window or 1.0, 1.0)
+        with self._lock:
+            wait = self.bucket.wait_time()
+        return min(interval, wait) if wait > 0 else interval
+
+    def _run_flusher(self) -> None:
+        while not self._stop.wait(self._flush_interval()):
+            try:
+                self.flush_due()
+            except Exception:  # already audited; the digest stays queued for the next attempt
+                pass
+
+    def _send_digest(self, recipient: str) -> None:
+        alerts = self._pending.pop(recipient)
+        opened_at = self._opened_at.pop(recipient)
+        message = EmailMessage()
+        message["From"] = self.conf.get("username")
+        message["To"] = recipient
+        if len(alerts) == 1:
+            message["Subject"] = alerts[0][0]
+            message.set_content(alerts[0][1])
+        else:
+            message["Subject"] = f"[SOC Lite] {len(alerts)} alerts"
+            message.set_content("\n\n".join(f"== {subject} ==\n{body}" for subject, body in alerts))
+        try:
+            self._deliver(message)
+        except Exception as exc:
+            if _is_permanent(exc):
+                # Resending a rejected digest would be rejected again; drop it.
+                self.logger.log_event(
+                    "notification_error",
+                    {"subject": message["Subject"], "recipient": recipient, "error": str(exc), "dropped": len(alerts)},
+                )
+                return
+            self._pending[recipient] = alerts + self._pending.get(recipient, [])
+            self._opened_at[recipient] = opened_at
+            self.logger.log_event("notification_error", {"subject": message["Subject"], "recipient": recipient, "error": str(exc)})
+            raise
+        self.logger.log_event("notification_sent", {"subject": message["Subject"], "recipient": recipient, "alerts": len(alerts)})
+
+    def _connect(self) -> Any:
+        if self._smtp is None:
+            smtp = self._smtp_factory(self.conf["smtp_server"], self.conf.get("smtp_port", 587))
+            if self.conf.get("starttls", True):
+                smtp.starttls()
+            if self.conf.get("password"):
+                smtp.login(self.conf["username"], self.conf.get("password", ""))
+            self._smtp = smtp
+        return self._smtp
+
+    def _disconnect(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+
+    def _deliver(self, message: EmailMessage) -> None:
+        try:
+            self._connect().send_message(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The relay dropped an idle connection; reconnect once and retry.
+            self._disconnect()
+            self._connect().send_message(message)
+
+
+def _is_permanent(exc: Exception) -> bool:
+    """Return ``True`` for 5xx rejections, which fail the same way when resent."""
+
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+_notifiers: Dict[Path, Notifier] = {}
+_notifiers_lock = threading.Lock()
+
+
+def get_notifier(settings_path: Path = Path("config/settings.yaml")) -> Notifier:
+    """Return the process-wide notifier for ``settings_path``; it is flushed when the process exits.
+
+    Sharing it keeps one SMTP connection, one digest queue and one rate limit
+    across every caller.
+    """
+
+    key = settings_path.resolve()
+    with _notifiers_lock:
+        notifier = _notifiers.get(key)
+        if notifier is None:
+            notifier = _notifiers[key] = Notifier(settings_path)
+            atexit.register(notifier.close)
+        return notifier
+
 
 def send_email(subject: str, body: str, settings_path: Path = Path("config/settings.yaml")) -> None:
-    settings = load_settings(settings_path)
-    email_conf = settings.get("response", {}).get("email", {})
-    logger = AuditLogger(settings_path)
-
-    if not email_conf.get("enabled", False):
-        logger.log_event("notification_skipped", {"subject": subject, "reason": "Email disabled"})
-        return
-
-    message = EmailMessage()
-    message["From"] = email_conf.get("username")
-    message["To"] = email_conf.get("recipient")
-    message["Subject"] = subject
-    message.set_content(body)
-
-    try:
-        with smtplib.SMTP(email_conf["smtp_server"], email_conf.get("smtp_port", 587)) as smtp:
-            smtp.starttls()
-            if email_conf.get("password"):
-                smtp.login(email_conf["username"], email_conf.get("password", ""))
-            smtp.send_message(message)
-        logger.log_event("notification_sent", {"subject": subject})
-    except Exception as exc:  # pragma: no cover - network side effects
-        logger.log_event("notification_error", {"subject": subject, "error": str(exc)})
-        raise
+    get_notifier(settings_path).notify(subject, body)
 
 
 def main() -> None:
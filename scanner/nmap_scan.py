@@ -9,11 +9,21 @@ if __package__ in {None, ""}:
 
 import argparse
 import datetime as dt
+import ipaddress
 import json
+import os
+import shutil
 import subprocess
-from typing import List
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from xml.sax.saxutils import quoteattr
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
 from config.loader import load_settings
+from logs.audit import AuditLogger
+from logs.metrics import stage
+from logs.rotation import archive_outputs
 
 
 def build_command(targets: List[str], nmap_args: List[str], output_file: Path) -> List[str]:
@@ -23,52 +33,285 @@ def build_command(targets: List[str], nmap_args: List[str], output_file: Path) -
     return cmd
 
 
+def expand_shards(targets: List[str], shard_prefix: int = 24, shard_hosts: Optional[int] = None) -> List[str]:
+    """Split CIDR targets into subnets of ``shard_prefix`` or ``shard_hosts`` addresses.
+
+    Targets that are not CIDRs (hostnames, nmap ranges) form their own shard.
+    """
+
+    shards: List[str] = []
+    for target in targets:
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            shards.append(target)
+            continue
+        prefix = shard_prefix
+        if shard_hosts:
+            host_bits = max(int(shard_hosts) - 1, 0).bit_length()
+            prefix = network.max_prefixlen - host_bits
+        if network.prefixlen >= prefix:
+            shards.append(str(network))
+        else:
+            shards.extend(str(subnet) for subnet in network.subnets(new_prefix=prefix))
+    return shards
+
+
+def scan_shard(target: str, nmap_args: List[str], output_file: Path, timeout: Optional[float], retries: int) -> Path:
+    """Scan one shard, retrying on timeouts and nmap failures."""
+
+    command = build_command([target], nmap_args, output_file)
+    attempts = max(retries, 0) + 1
+    error = ""
+    for _ in range(attempts):
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=timeout)
+            return output_file
+        except subprocess.TimeoutExpired as exc:
+            error = f"timed out after {exc.timeout}s"
+        except subprocess.CalledProcessError as exc:
+            error = exc.stderr.decode("utf-8", errors="replace").strip() or f"exit status {exc.returncode}"
+    raise RuntimeError(f"Nmap shard {target} failed after {attempts} attempt(s): {error}")
+
+
+def iter_sharded_scan(
+    shards: List[str],
+    nmap_args: List[str],
+    shard_dir: Path,
+    max_workers: int,
+    timeout: Optional[float],
+    retries: int,
+) -> Iterator[Tuple[int, str, Optional[Path], Optional[str]]]:
+    """Run shards on a pool of concurrent nmap processes.
+
+    Yields ``(index, shard, output_path, error)`` tuples in completion order so
+    callers can start consuming results while slower shards are still running.
+    """
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+        futures = {
+            pool.submit(scan_shard, shard, nmap_args, shard_dir / f"shard_{index:05d}.xml", timeout, retries): index
+            for index, shard in enumerate(shards)
+        }
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield index, shards[index], future.result(), None
+                except RuntimeError as exc:
+                    yield index, shards[index], None, str(exc)
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def merge_xml(shard_paths: Iterable[Path], output_file: Path, attributes: Dict[str, str]) -> Path:
+    """Concatenate the ``<host>`` elements of several Nmap XML files into one document."""
+
+    with output_file.open("w", encoding="utf-8") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        attrs = "".join(f" {key}={quoteattr(value)}" for key, value in attributes.items())
+        out.write(f"<nmaprun{attrs}>\n")
+        for shard_path in shard_paths:
+            root = None
+            for event, elem in ET.iterparse(shard_path, events=("start", "end")):
+                if root is None:
+                    root = elem
+                    continue
+                if event == "end" and elem.tag == "host":
+                    elem.tail = "\n"
+                    out.write(ET.tostring(elem, encoding="unicode"))
+                    root.clear()
+        out.write("</nmaprun>\n")
+    return output_file
+
+
+def simulate_scan(output_file: Path, timestamp: str, targets: List[str], nmap_args: List[str]) -> Path:
+    # Provide a graceful fallback in environments without nmap
+    simulated_output = {
+        "metadata": {
+            "generated_at": timestamp,
+            "targets": targets,
+            "args": nmap_args,
+            "simulated": True,
+        },
+        "hosts": [
+            {
+                "ip": "192.168.1.10",
+                "hostname": "simulated-host",
+                "ports": [
+                    {"port": 22, "service": "ssh", "state": "open", "product": "OpenSSH"},
+                    {"port": 80, "service": "http", "state": "open", "product": "nginx"},
+                ],
+            }
+        ],
+    }
+    json_file = output_file.with_suffix(".json")
+    with json_file.open("w", encoding="utf-8") as fh:
+        json.dump(simulated_output, fh, indent=2)
+    return json_file
+
+
+def iter_sharded_outputs(
+    targets: List[str], nmap_args: List[str], output_file: Path, shard_conf: Dict[str, Any], errors: List[str]
+) -> Iterator[Path]:
+    """Yield each shard's XML output in shard order, then merge them into ``output_file``.
+
+    A shard is yielded as soon as it and every earlier shard have completed,
+    so consumers see hosts in the same order as the merged file. Shard files
+    only live until the generator finishes, so consume each path before
+    advancing. Shard errors are appended to ``errors``; ``RuntimeError`` is
+    raised when every shard failed.
+    """
+
+    shards = expand_shards(targets, int(shard_conf.get("shard_prefix", 24)), shard_conf.get("shard_hosts"))
+    timeout = shard_conf.get("timeout_seconds")
+    completed: List[Path] = []
+    failed: List[str] = []
+    with tempfile.TemporaryDirectory(dir=output_file.parent, prefix=f"{output_file.stem}.") as tmp:
+        # Finished shards wait here until every earlier shard is done (``None`` when it failed).
+        finished: Dict[int, Optional[Path]] = {}
+        next_index = 0
+        for index, shard, shard_path, error in iter_sharded_scan(
+            shards,
+            nmap_args,
+            Path(tmp),
+            int(shard_conf.get("max_workers", os.cpu_count() or 1)),
+            float(timeout) if timeout else None,
+            int(shard_conf.get("retries", 1)),
+        ):
+            if error is not None:
+                errors.append(error)
+                failed.append(shard)
+            finished[index] = shard_path
+            while next_index in finished:
+                ready = finished.pop(next_index)
+                next_index += 1
+                if ready is not None:
+                    completed.append(ready)
+                    yield ready
+        if not completed:
+            raise RuntimeError("Nmap scan failed for every shard: " + "; ".join(errors))
+        attributes = {"scanner": "nmap", "args": " ".join(nmap_args), "shards": str(len(shards))}
+        if failed:
+            attributes["failed_shards"] = " ".join(failed)
+        merge_xml(completed, output_file, attributes)
+
+
+def failed_shards(scan_path: Path) -> List[str]:
+    """Return the targets of the shards missing from a merged scan.
+
+    Their hosts were not scanned, so their absence says nothing about their ports.
+    """
+
+    if scan_path.suffix != ".xml":
+        return []
+    for _, elem in ET.iterparse(scan_path, events=("start",)):
+        return elem.get("failed_shards", "").split()
+    return []
+
+
+def run_sharded_scan(
+    targets: List[str], nmap_args: List[str], output_file: Path, shard_conf: Dict[str, Any]
+) -> Tuple[Path, List[str]]:
+    """Scan ``targets`` shard by shard and merge the outputs into ``output_file``.
+
+    Returns the merged path and the list of shard errors.
+    """
+
+    errors: List[str] = []
+    for _ in iter_sharded_outputs(targets, nmap_args, output_file, shard_conf, errors):
+        pass
+    return output_file, errors
+
+
+def archive_scans(output_dir: Path, retention_conf: Mapping[str, Any]) -> None:
+    """Compress older scan outputs and drop the oldest ones per ``scanner.retention``."""
+
+    if not retention_conf:
+        return
+    archive_outputs(
+        (path for path in output_dir.glob("nmap_scan_*") if path.is_file()),
+        max(int(retention_conf.get("keep_uncompressed", 5)), 1),
+        int(retention_conf.get("keep", 0)),
+        retention_conf.get("compression", "gzip"),
+    )
+
+
 def run_scan(settings_path: Path) -> Path:
     settings = load_settings(settings_path)
     scanner_conf = settings.get("scanner", {})
     output_dir = Path(scanner_conf.get("output_dir", "logs/scans"))
     output_dir.mkdir(parents=True, exist_ok=True)
+    with stage("scan"):
+        output_file = _run_scan(settings_path, scanner_conf, output_dir)
+    archive_scans(output_dir, scanner_conf.get("retention", {}))
+    return output_file
+
 
+def _run_scan(settings_path: Path, scanner_conf: Mapping[str, Any], output_dir: Path) -> Path:
     timestamp = dt.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     output_file = output_dir / f"nmap_scan_{timestamp}.xml"
 
     targets = scanner_conf.get("targets", [])
     nmap_args = scanner_conf.get("nmap_args", [])
+    shard_conf = scanner_conf.get("sharding", {})
+
+    if shard_conf.get("enabled", False):
+        if shutil.which("nmap") is None:
+            return simulate_scan(output_file, timestamp, targets, nmap_args)
+        output_file, errors = run_sharded_scan(targets, nmap_args, output_file, shard_conf)
+        if errors:
+            _audit_shard_errors(settings_path, output_file, errors)
+        return output_file
 
     command = build_command(targets, nmap_args, output_file)
 
     try:
         subprocess.run(command, check=True, capture_output=True)
     except FileNotFoundError:
-        # Provide a graceful fallback in environments without nmap
-        simulated_output = {
-            "metadata": {
-                "generated_at": timestamp,
-                "targets": targets,
-                "args": nmap_args,
-                "simulated": True,
-            },
-            "hosts": [
-                {
-                    "ip": "192.168.1.10",
-                    "hostname": "simulated-host",
-                    "ports": [
-                        {"port": 22, "service": "ssh", "state": "open", "product": "OpenSSH"},
-                        {"port": 80, "service": "http", "state": "open", "product": "nginx"},
-                    ],
-                }
-            ],
-        }
-        json_file = output_file.with_suffix(".json")
-        with json_file.open("w", encoding="utf-8") as fh:
-            json.dump(simulated_output, fh, indent=2)
-        return json_file
+        return simulate_scan(output_file, timestamp, targets, nmap_args)
     except subprocess.CalledProcessError as exc:
         raise RuntimeError(f"Nmap scan failed: {exc.stderr.decode('utf-8')}") from exc
 
     return output_file
 
 
+def iter_scan(settings_path: Path) -> Iterator[Path]:
+    """Yield scan outputs as they become available.
+
+    With sharding enabled this yields every shard's XML in shard order (the
+    merged file is still written to ``output_dir``); otherwise it yields the
+    single ``run_scan`` output.
+    """
+
+    settings = load_settings(settings_path)
+    scanner_conf = settings.get("scanner", {})
+    shard_conf = scanner_conf.get("sharding", {})
+    if not shard_conf.get("enabled", False) or shutil.which("nmap") is None:
+        yield run_scan(settings_path)
+        return
+
+    output_dir = Path(scanner_conf.get("output_dir", "logs/scans"))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = dt.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    output_file = output_dir / f"nmap_scan_{timestamp}.xml"
+    errors: List[str] = []
+    try:
+        yield from iter_sharded_outputs(
+            scanner_conf.get("targets", []), scanner_conf.get("nmap_args", []), output_file, shard_conf, errors
+        )
+    finally:
+        if errors:
+            _audit_shard_errors(settings_path, output_file, errors)
+        archive_scans(output_dir, scanner_conf.get("retention", {}))
+
+
+def _audit_shard_errors(settings_path: Path, output_file: Path, errors: List[str]) -> None:
+    with AuditLogger(settings_path) as logger:
+        logger.log_events(("scan_shard_failed", {"scan": output_file.name, "error": error}) for error in errors)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Run an automated nmap scan")
     parser.add_argument(
@@ -11,40 +11,60 @@ import argparse
 import csv
 import json
 import xml.etree.ElementTree as ET
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List
+
+from logs.metrics import stage
+from logs.rotation import open_segment, strip_compression
 
 PORT_COLUMNS = ["ip", "hostname", "port", "state", "service", "product"]
 
 
+def _host_records(host: ET.Element) -> Iterator[Dict[str, Any]]:
+    address = host.find("address")
+    ip = address.attrib.get("addr", "unknown") if address is not None else "unknown"
+    hostname_node = host.find("hostnames/hostname")
+    hostname = hostname_node.attrib.get("name") if hostname_node is not None else ""
+    ports_node = host.find("ports")
+    if ports_node is None:
+        return
+    for port in ports_node.findall("port"):
+        state_node = port.find("state")
+        service_node = port.find("service")
+        yield {
+            "ip": ip,
+            "hostname": hostname,
+            "port": int(port.attrib.get("portid", 0)),
+            "state": state_node.attrib.get("state", "unknown") if state_node is not None else "unknown",
+            "service": service_node.attrib.get("name", "") if service_node is not None else "",
+            "product": service_node.attrib.get("product", "") if service_node is not None else "",
+        }
+
+
+def iter_xml(path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream port records from an Nmap XML file one ``<host>`` at a time.
+
+    Processed hosts are cleared from the tree, so peak memory is bounded by the
+    largest ``<host>`` element instead of the whole scan. Archived ``.gz`` /
+    ``.zst`` scans are decompressed on the fly.
+    """
+
+    root = None
+    with open_segment(path, "rb") as fh:
+        for event, elem in ET.iterparse(fh, events=("start", "end")):
+            if root is None:
+                root = elem
+                continue
+            if event == "end" and elem.tag == "host":
+                yield from _host_records(elem)
+                root.clear()
+
+
 def parse_xml(path: Path) -> List[Dict[str, Any]]:
-    root = ET.parse(path).getroot()
-    hosts = []
-    for host in root.findall("host"):
-        address = host.find("address")
-        ip = address.attrib.get("addr", "unknown") if address is not None else "unknown"
-        hostname_node = host.find("hostnames/hostname")
-        hostname = hostname_node.attrib.get("name") if hostname_node is not None else ""
-        ports_node = host.find("ports")
-        if ports_node is None:
-            continue
-        for port in ports_node.findall("port"):
-            state_node = port.find("state")
-            service_node = port.find("service")
-            hosts.append(
-                {
-                    "ip": ip,
-                    "hostname": hostname,
-                    "port": int(port.attrib.get("portid", 0)),
-                    "state": state_node.attrib.get("state", "unknown") if state_node is not None else "unknown",
-                    "service": service_node.attrib.get("name", "") if service_node is not None else "",
-                    "product": service_node.attrib.get("product", "") if service_node is not None else "",
-                }
-            )
-    return hosts
+    return list(iter_xml(path))
 
 
 def parse_json(path: Path) -> List[Dict[str, Any]]:
-    with path.open("r", encoding="utf-8") as fh:
+    with open_segment(path) as fh:
         data = json.load(fh)
     return [
         {**port, "ip": host.get("ip", "unknown"), "hostname": host.get("hostname", "")}
@@ -53,19 +73,30 @@ def parse_json(path: Path) -> List[Dict[str, Any]]:
     ]
 
 
+def iter_results(path: Path) -> Iterator[Dict[str, Any]]:
+    if strip_compression(path).suffix == ".xml":
+        return iter_xml(path)
+    return iter(parse_json(path))
+
+
 def parse_results(path: Path) -> List[Dict[str, Any]]:
-    if path.suffix == ".xml":
-        return parse_xml(path)
-    return parse_json(path)
+    return list(iter_results(path))
+
+
+def csv_row(record: Dict[str, Any]) -> Dict[str, str]:
+    """Return ``record`` exactly as it reads back from the CSV written by ``write_csv``."""
+
+    return {key: "" if record.get(key) is None else str(record.get(key)) for key in PORT_COLUMNS}
 
 
 def write_csv(records: Iterable[Dict[str, Any]], output: Path) -> None:
     output.parent.mkdir(parents=True, exist_ok=True)
-    with output.open("w", encoding="utf-8", newline="") as fh:
+    with stage("write_csv", 0) as measured, output.open("w", encoding="utf-8", newline="") as fh:
         writer = csv.DictWriter(fh, fieldnames=PORT_COLUMNS)
         writer.writeheader()
         for row in records:
             writer.writerow({key: row.get(key, "") for key in PORT_COLUMNS})
+            measured.records += 1
 
 
 def main() -> None:
@@ -75,15 +106,16 @@ def main() -> None:
         "--output",
         type=Path,
         default=None,
-        help="Optional path to store the parsed CSV",
+        help="Optional path to store the parsed records: a snapshot, or a .csv / .parquet export",
     )
     args = parser.parse_args()
 
-    records = parse_results(args.scan_file)
     if args.output:
-        write_csv(records, args.output)
+        from scanner.snapshot import write_records  # the snapshot module builds on this one
+
+        write_records(iter_results(args.scan_file), args.output)
     else:
-        print(json.dumps(records, indent=2))
+        print(json.dumps(parse_results(args.scan_file), indent=2))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+"""Columnar, memory-mapped snapshot of parsed scan records.
+
+Layout (little endian, every block 8-byte aligned)::
+
+    header     magic "SOCS", u16 version, u16 column count, u64 rows
+    directory  one entry per column: name, kind, dictionary size and the
+               offsets of the blocks below
+    values     u32[rows] dictionary codes (string columns) or
+               i32[rows] values, -1 when missing (``port``)
+    offsets    u32[n + 1] byte offsets of each dictionary entry in the blob
+    blob       UTF-8 dictionary entries in first-seen order
+
+Opening a snapshot maps the file and reads the header and directory only.
+Columns are zero-copy ``memoryview`` casts over the map and dictionaries are
+decoded on first use, so load time does not depend on the number of rows.
+Rows read back exactly like the CSV written by ``write_csv``.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import csv
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from scanner.parse_results import PORT_COLUMNS, write_csv
+
+MAGIC = b"SOCS"
+VERSION = 1
+
+DICTIONARY = 0
+INTEGER = 1
+
+INTEGER_COLUMNS = {"port"}
+
+_HEADER = struct.Struct("<4sHHQ")
+_COLUMN = struct.Struct("<8sBxxxIQQQ")
+
+
+def _align(buffer: bytearray) -> None:
+    buffer.extend(b"\0" * (-len(buffer) % 8))
+
+
+def _integer(column: str, value: Any) -> int:
+    if value is None or value == "":
+        return -1
+    try:
+        return int(value)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid {column} value {value!r} for a snapshot") from exc
+
+
+class SnapshotWriter:
+    """Accumulate records column by column and write them as one snapshot.
+
+    Memory grows by a few bytes per row and column plus the distinct values,
+    so the streaming pipeline can feed it chunk by chunk.
+    """
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self._codes: Dict[str, Dict[str, int]] = {
+            column: {} for column in PORT_COLUMNS if column not in INTEGER_COLUMNS
+        }
+        self._values: Dict[str, array] = {
+            column: array("i" if column in INTEGER_COLUMNS else "I") for column in PORT_COLUMNS
+        }
+
+    def add(self, record: Dict[str, Any]) -> None:
+        for column in PORT_COLUMNS:
+            value = record.get(column)
+            if column in INTEGER_COLUMNS:
+                self._values[column].append(_integer(column, value))
+                continue
+            key = "" if value is None else str(value)
+            codes = self._codes[column]
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(codes)
+            self._values[column].append(code)
+        self.rows += 1
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.add(record)
+
+    def to_bytes(self) -> bytes:
+        data_start = _HEADER.size + _COLUMN.size * len(PORT_COLUMNS)
+        directory = bytearray()
+        body = bytearray()
+        for column in PORT_COLUMNS:
+            dictionary = list(self._codes.get(column, {}))
+            offsets = array("I", [0])
+            blob = bytearray()
+            for key in dictionary:
+                blob.extend(key.encode("utf-8"))
+                offsets.append(len(blob))
+            positions = []
+            for block in (self._values[column].tobytes(), offsets.tobytes(), bytes(blob)):
+                positions.append(data_start + len(body))
+                body.extend(block)
+                _align(body)
+            kind = INTEGER if column in INTEGER_COLUMNS else DICTIONARY
+            directory.extend(_COLUMN.pack(column.encode("ascii"), kind, len(dictionary), *positions))
+        header = _HEADER.pack(MAGIC, VERSION, len(PORT_COLUMNS), self.rows)
+        return header + bytes(directory) + bytes(body)
+
+    def write(self, path: Path) -> Path:
+        """Write the snapshot atomically so mapped readers keep a consistent file."""
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(self.to_bytes())
+        os.replace(tmp_path, path)
+        return path
+
+
+def write_snapshot(records: Iterable[Dict[str, Any]], path: Path) -> Path:
+    writer = SnapshotWriter()
+    writer.extend(records)
+    return writer.write(path)
+
+
+def is_snapshot(path: Path) -> bool:
+    with path.open("rb") as fh:
+        return fh.read(len(MAGIC)) == MAGIC
+
+
+class SnapshotColumn:
+    """Read-only view over one column of a mapped snapshot."""
+
+    def __init__(self, buffer: mmap.mmap, view: memoryview, rows: int, entry: Tuple[Any, ...]) -> None:
+        name, self.kind, self.size, off_values, off_offsets, off_blob = entry
+        self.name = name.rstrip(b"\0").decode("ascii")
+        self._buffer = buffer
+        self._blob_start = off_blob
+        self.values = view[off_values : off_values + 4 * rows].cast("i" if self.kind == INTEGER else "I")
+        self._offsets = view[off_offsets : off_offsets + 4 * (self.size + 1)].cast("I")
+        self._dictionary: Optional[List[str]] = None
+
+    @property
+    def dictionary(self) -> List[str]:
+        """Distinct values of a string column, indexed by code."""
+
+        if self._dictionary is None:
+            start, offsets = self._blob_start, self._offsets
+            self._dictionary = [
+                self._buffer[start + offsets[index] : start + offsets[index + 1]].decode("utf-8")
+                for index in range(self.size)
+            ]
+        return self._dictionary
+
+    def strings(self) -> List[str]:
+        """Decode the column to the strings ``csv.DictReader`` would return."""
+
+        if self.kind == INTEGER:
+            return ["" if value < 0 else str(value) for value in self.values]
+        dictionary = self.dictionary
+        return [dictionary[code] for code in self.values]
+
+
+class ScanSnapshot:
+    """Memory-mapped snapshot exposing its columns by name."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as fh:
+            self._buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, column_count, rows = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            self._buffer.close()
+            raise ValueError(f"{path} is not a scan snapshot")
+        if version != VERSION:
+            self._buffer.close()
+            raise ValueError(f"Unsupported scan snapshot version {version} in {path} (expected {VERSION})")
+        self.rows = rows
+        self._view = memoryview(self._buffer)
+        self.columns: Dict[str, SnapshotColumn] = {}
+        for index in range(column_count):
+            entry = _COLUMN.unpack_from(self._buffer, _HEADER.size + index * _COLUMN.size)
+            column = SnapshotColumn(self._buffer, self._view, rows, entry)
+            self.columns[column.name] = column
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __enter__(self) -> "ScanSnapshot":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for column in self.columns.values():
+            column.values.release()
+            column._offsets.release()
+        self.columns = {}
+        self._view.release()
+        self._buffer.close()
+
+    def iter_rows(self) -> Iterator[Dict[str, str]]:
+        columns = [self.columns[column].strings() for column in PORT_COLUMNS]
+        for values in zip(*columns):
+            yield dict(zip(PORT_COLUMNS, values))
+
+
+def read_rows(path: Path) -> Iterator[Dict[str, str]]:
+    """Yield parsed records from a snapshot or a CSV export as string dictionaries."""
+
+    if is_snapshot(path):
+        with ScanSnapshot(path) as snapshot:
+            yield from snapshot.iter_rows()
+        return
+    with path.open("r", encoding="utf-8", newline="") as fh:
+        yield from csv.DictReader(fh)
+
+
+def write_parquet(snapshot: ScanSnapshot, path: Path) -> Path:
+    """Export a snapshot to Parquet with dictionary-encoded string columns (needs ``pyarrow``)."""
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # optional dependency
+        raise ValueError("Parquet export requires the 'pyarrow' package") from exc
+
+    arrays = []
+    for name in PORT_COLUMNS:
+        column = snapshot.columns[name]
+        if column.kind == INTEGER:
+            arrays.append(pa.array([value if value >= 0 else None for value in column.values], type=pa.int32()))
+            continue
+        # Codes stay far below 2**31, so the u32 block is reused as Arrow's int32 indices without a copy.
+        codes = pa.Array.from_buffers(pa.int32(), len(snapshot), [None, pa.py_buffer(column.values)])
+        arrays.append(pa.DictionaryArray.from_arrays(codes, pa.array(column.dictionary, type=pa.string())))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.Table.from_arrays(arrays, names=PORT_COLUMNS), str(path))
+    return path
+
+
+def write_records(records: Iterable[Dict[str, Any]], output: Path) -> Path:
+    """Write parsed records as CSV (``.csv``), Parquet (``.parquet``) or a snapshot (anything else)."""
+
+    if output.suffix == ".csv":
+        write_csv(records, output)
+        return output
+    if output.suffix == ".parquet":
+        tmp_path = write_snapshot(records, output.with_name(output.name + ".snap"))
+        try:
+            with ScanSnapshot(tmp_path) as snapshot:
+                return write_parquet(snapshot, output)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return write_snapshot(records, output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert parsed scan snapshots")
+    parser.add_argument("source", type=Path, help="Snapshot or CSV to read")
+    parser.add_argument("destination", type=Path, help="Output: .csv, .parquet or a snapshot path")
+    args = parser.parse_args()
+    print(write_records(read_rows(args.source), args.destination))
+
+
+if __name__ == "__main__":
+    main()
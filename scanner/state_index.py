@@ -0,0 +1,168 @@
+"""Persistent per-(ip, port) scan state used to diff consecutive scans."""
+from __future__ import annotations
+
+import datetime as dt
+import ipaddress
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from scanner.parse_results import PORT_COLUMNS
+
+CHANGE_EVENT_TYPES = {"opened": "port_opened", "closed": "port_closed", "changed": "service_changed"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS services (
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    hostname TEXT,
+    state TEXT,
+    service TEXT,
+    product TEXT,
+    fingerprint TEXT NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT,
+    PRIMARY KEY (ip, port)
+) WITHOUT ROWID
+"""
+
+
+def unscanned_filter(targets: Iterable[str]) -> Callable[[str], bool]:
+    """Return a predicate telling whether an address belongs to one of the unscanned ``targets``.
+
+    Targets that are not addresses or CIDRs (hostnames, nmap ranges) cannot be
+    matched against stored addresses, so they cover every address.
+    """
+
+    networks = []
+    for target in targets:
+        try:
+            networks.append(ipaddress.ip_network(target, strict=False))
+        except ValueError:
+            return lambda ip: True
+
+    def covered(ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in networks)
+
+    return covered
+
+
+def fingerprint(record: Dict[str, Any]) -> str:
+    return "|".join(
+        str(record.get(key) or "").lower() for key in ("state", "service", "product")
+    )
+
+
+class ScanStateIndex:
+    """SQLite-backed index of the last observed state of every (ip, port).
+
+    ``apply`` stages a new scan next to the stored state, diffs the two with a
+    handful of set-based queries and then replaces the stored state, so only
+    new, changed or disappeared services have to be scored downstream.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "ScanStateIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def apply(
+        self,
+        records: Iterable[Dict[str, Any]],
+        scanned_at: Optional[str] = None,
+        unscanned: Iterable[str] = (),
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Diff ``records`` against the stored state and persist them.
+
+        Returns ``(records_to_score, change_events)``: the new or changed port
+        records in scan order and one change event per opened, closed or
+        changed service. Stored services inside the ``unscanned`` targets (the
+        shards that failed) are neither reported closed nor removed.
+        """
+
+        scanned_at = scanned_at or dt.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        covered = unscanned_filter(unscanned)
+        conn = self.conn
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS temp.current")
+            conn.execute(
+                "CREATE TEMP TABLE current (ip TEXT NOT NULL, port INTEGER NOT NULL, hostname TEXT, state TEXT,"
+                " service TEXT, product TEXT, fingerprint TEXT NOT NULL, UNIQUE (ip, port))"
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO current VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        str(record.get("ip", "unknown")),
+                        int(record.get("port") or 0),
+                        record.get("hostname") or "",
+                        record.get("state") or "",
+                        record.get("service") or "",
+                        record.get("product") or "",
+                        fingerprint(record),
+                    )
+                    for record in records
+                ),
+            )
+
+            delta = conn.execute(
+                "SELECT c.ip, c.hostname, c.port, c.state, c.service, c.product, s.ip IS NULL,"
+                " s.state, s.service, s.product FROM current c"
+                " LEFT JOIN services s ON s.ip = c.ip AND s.port = c.port"
+                " WHERE s.ip IS NULL OR s.fingerprint != c.fingerprint ORDER BY c.rowid"
+            ).fetchall()
+            closed = conn.execute(
+                "SELECT s.ip, s.hostname, s.port, s.state, s.service, s.product FROM services s"
+                " LEFT JOIN current c ON c.ip = s.ip AND c.port = s.port WHERE c.ip IS NULL ORDER BY s.ip, s.port"
+            ).fetchall()
+            closed = [row for row in closed if not covered(row[0])]
+
+            conn.executemany("DELETE FROM services WHERE ip = ? AND port = ?", ((row[0], row[2]) for row in closed))
+            conn.execute(
+                "INSERT INTO services SELECT ip, port, hostname, state, service, product, fingerprint, ?, ?"
+                " FROM current WHERE true ON CONFLICT (ip, port) DO UPDATE SET hostname = excluded.hostname,"
+                " state = excluded.state, service = excluded.service, product = excluded.product,"
+                " fingerprint = excluded.fingerprint, last_seen = excluded.last_seen",
+                (scanned_at, scanned_at),
+            )
+            conn.execute("DROP TABLE temp.current")
+
+        to_score: List[Dict[str, Any]] = []
+        changes: List[Dict[str, Any]] = []
+        for row in delta:
+            record = dict(zip(PORT_COLUMNS, row[:6]))
+            to_score.append(record)
+            if row[6]:
+                changes.append({"change": "opened", "ip": record["ip"], "port": record["port"], "current": record})
+            else:
+                previous = {**record, "state": row[7], "service": row[8], "product": row[9]}
+                changes.append(
+                    {"change": "changed", "ip": record["ip"], "port": record["port"], "previous": previous, "current": record}
+                )
+        for row in closed:
+            previous = dict(zip(PORT_COLUMNS, row))
+            changes.append({"change": "closed", "ip": previous["ip"], "port": previous["port"], "previous": previous})
+        return to_score, changes
+
+
+def write_changes(changes: List[Dict[str, Any]], output: Path, generated_at: str) -> Path:
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w", encoding="utf-8") as fh:
+        json.dump({"generated_at": generated_at, "changes": changes}, fh, indent=2)
+    return output
@@ -0,0 +1,68 @@
+"""Benchmark audit appends to show the cost per event stays flat as history grows."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import json
+import tempfile
+import time
+
+from logs.audit import AuditLogger
+
+
+def run_benchmark(max_events: int, sample: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        config_path = tmp_path / "config.json"
+        config_path.write_text(
+            json.dumps(
+                {
+                    "audit": {
+                        "audit_log": str(tmp_path / "audit.ndjson"),
+                        "wazuh_event_log": str(tmp_path / "wazuh.ndjson"),
+                    }
+                }
+            ),
+            encoding="utf-8",
+        )
+        logger = AuditLogger(config_path)
+        payload = {"ip": "10.0.0.1", "port": 22, "service": "ssh", "score": 0.91, "severity": "critical"}
+
+        checkpoints = []
+        size = 1000
+        while size <= max_events:
+            checkpoints.append(size)
+            size *= 10
+
+        written = 0
+        print(f"{'history':>10} {'us/append':>10}")
+        for checkpoint in checkpoints:
+            # Grow the history cheaply, then time a fixed-size sample of appends.
+            filler = checkpoint - sample - written
+            if filler > 0:
+                event = {"timestamp": logger._now(), "type": "benchmark_filler", "payload": payload}
+                logger.store.append_many(event for _ in range(filler))
+                written += filler
+            start = time.perf_counter()
+            for _ in range(sample):
+                logger.log_event("benchmark", payload)
+            elapsed = time.perf_counter() - start
+            written += sample
+            print(f"{written:>10} {elapsed / sample * 1e6:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark audit append cost")
+    parser.add_argument("--max-events", type=int, default=1_000_000, help="Largest history size to measure")
+    parser.add_argument("--sample", type=int, default=500, help="Appends timed at each history size")
+    args = parser.parse_args()
+    run_benchmark(args.max_events, args.sample)
+
+
+if __name__ == "__main__":
+    main()
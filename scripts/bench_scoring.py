@@ -0,0 +1,106 @@
+"""Benchmark the row-by-row scorer against the columnar batch engine and the IsolationForest detector."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from ai_engine.detect_anomalies import iter_chunks, score_batch, score_rows
+from ai_engine.detectors import DEFAULT_ISOLATION_FOREST, IsolationForestDetector
+from ai_engine.train_model import build_baseline
+
+SERVICES = [("ssh", "openssh"), ("http", "nginx"), ("https", "apache"), ("smtp", "postfix"), ("rdp", "")]
+
+
+def synthetic_records(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    records = []
+    for index in range(count):
+        service, product = rng.choice(SERVICES)
+        records.append(
+            {
+                "ip": f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}",
+                "hostname": "",
+                "port": str(rng.choice([22, 80, 443, 25, 3389, rng.randint(1, 65535)])),
+                "state": "open",
+                "service": service,
+                "product": product,
+            }
+        )
+    return records
+
+
+def chunk_latencies(
+    records: List[Dict[str, Any]], chunk_size: int, score: Callable[[List[Dict[str, Any]]], Any]
+) -> List[float]:
+    latencies = []
+    for chunk in iter_chunks(records, chunk_size):
+        start = time.perf_counter()
+        score(chunk)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, rows: int, latencies: List[float]) -> None:
+    elapsed = sum(latencies)
+    ordered = sorted(latencies)
+    p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    print(
+        f"{name:<17} {elapsed:8.3f}s  ({rows / elapsed:,.0f} rows/s)"
+        f"  chunk p50 {statistics.median(ordered) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark anomaly scoring engines")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of records to score")
+    parser.add_argument("--threshold", type=float, default=0.6, help="Anomaly threshold")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Records per scoring call for latency figures")
+    parser.add_argument(
+        "--isolation-forest",
+        type=Path,
+        nargs="?",
+        const=DEFAULT_ISOLATION_FOREST,
+        default=None,
+        help="Also benchmark the IsolationForest pipeline (needs scikit-learn, joblib and pandas)",
+    )
+    args = parser.parse_args()
+
+    records = synthetic_records(args.rows)
+    model = build_baseline(records[: max(len(records) // 10, 1)])
+
+    start = time.perf_counter()
+    row_scores = [score for score, *_ in score_rows(records, model, args.threshold)]
+    row_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_scores = [score for score, *_ in score_batch(records, model, args.threshold)]
+    batch_elapsed = time.perf_counter() - start
+
+    print(f"rows: {args.rows}")
+    print(f"row engine:   {row_elapsed:8.3f}s  ({args.rows / row_elapsed:,.0f} rows/s)")
+    print(f"batch engine: {batch_elapsed:8.3f}s  ({args.rows / batch_elapsed:,.0f} rows/s)")
+    print(f"identical scores: {row_scores == batch_scores}")
+
+    print(f"per-chunk latency, {args.chunk_size} records per call:")
+    batch_latencies = chunk_latencies(
+        records, args.chunk_size, lambda chunk: list(score_batch(chunk, model, args.threshold))
+    )
+    report("batch engine", args.rows, batch_latencies)
+    if args.isolation_forest is not None:
+        start = time.perf_counter()
+        detector = IsolationForestDetector(args.isolation_forest)
+        print(f"isolation forest load: {time.perf_counter() - start:.3f}s")
+        report("isolation forest", args.rows, chunk_latencies(records, args.chunk_size, detector.score))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,265 @@ if __package__ in {None, ""}:
     sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 import argparse
+import asyncio
+import concurrent.futures
+import datetime as dt
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
-from config.loader import load_settings
-from scanner.nmap_scan import run_scan
-from scanner.parse_results import parse_results, write_csv
-from ai_engine.train_model import train_model
-from ai_engine.detect_anomalies import detect
-from ai_engine.xai_explain import generate_explanations
+from config.loader import AiEngineSettings, load_settings
+from logs.audit import AuditLogger
+from logs.metrics import run_metrics, stage, tally
+from scanner.nmap_scan import failed_shards, iter_scan, run_scan
+from scanner.parse_results import csv_row, iter_results, write_csv
+from scanner.snapshot import SnapshotWriter, read_rows, write_snapshot
+from scanner.state_index import CHANGE_EVENT_TYPES, ScanStateIndex, write_changes
+from ai_engine.compiled_model import CompiledModel
+from ai_engine.detectors import create_ensemble
+from ai_engine.host_scoring import run_host_scoring
+from ai_engine.train_model import train_model, update_model
+from ai_engine.detect_anomalies import (
+    DetectionsOutput,
+    detect_records,
+    finish_run,
+    iter_chunks,
+    iter_detections,
+    load_model,
+    run_detection,
+)
+from ai_engine.xai_explain import ExplanationsOutput, explain_record, generate_explanations
+
+_DONE = object()
+
+PARSED_SNAPSHOT = Path("logs/parsed.snap")
+
+
+def export_csv(parsed_path: Path) -> Path:
+    """Write the CSV export of a parsed snapshot next to it."""
+
+    csv_path = parsed_path.with_suffix(".csv")
+    write_csv(read_rows(parsed_path), csv_path)
+    return csv_path
+
+
+def diff_scan(
+    parsed_path: Path,
+    settings_path: Path,
+    incremental_conf: Mapping[str, Any],
+    ai_conf: AiEngineSettings,
+    unscanned: Iterable[str] = (),
+) -> Path:
+    """Diff the parsed scan against the state index and return a snapshot of the delta.
+
+    ``unscanned`` lists the targets of failed shards, whose stored services are kept as they are.
+    """
+
+    timestamp = dt.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    state_path = Path(incremental_conf.get("state_index", "logs/scan_state.sqlite"))
+    with ScanStateIndex(state_path) as index:
+        records, changes = index.apply(read_rows(parsed_path), timestamp, unscanned)
+
+    delta_path = write_snapshot(records, parsed_path.with_name("parsed_delta.snap"))
+    explanation_dir = ai_conf.explanation_dir
+    write_changes(changes, explanation_dir / f"changes_{timestamp}.json", timestamp)
+    with AuditLogger(settings_path) as logger:
+        logger.log_events((CHANGE_EVENT_TYPES[change["change"]], change) for change in changes)
+    return delta_path
+
+
+def _put_threadsafe(queue: "asyncio.Queue[Any]", item: Any, loop: asyncio.AbstractEventLoop, cancelled: threading.Event) -> bool:
+    future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+    while True:
+        try:
+            future.result(timeout=0.1)
+            return True
+        except concurrent.futures.TimeoutError:
+            if cancelled.is_set():
+                future.cancel()
+                return False
+
+
+def _pump(items: Iterable[Any], queue: "asyncio.Queue[Any]", loop: asyncio.AbstractEventLoop, cancelled: threading.Event) -> None:
+    """Feed a blocking iterable into an asyncio queue from a worker thread, blocking while it is full."""
+
+    try:
+        for item in items:
+            if not _put_threadsafe(queue, item, loop, cancelled):
+                return
+    finally:
+        _put_threadsafe(queue, _DONE, loop, cancelled)
+
+
+async def _stream_stages(settings_path: Path, model: Any, parsed_path: Optional[Path]) -> Tuple[Path, Path]:
+    settings = load_settings(settings_path)
+    ai_conf = settings.ai_engine
+    chunk_size = settings.pipeline.chunk_size
+    queue_size = settings.pipeline.queue_size
+    threshold = ai_conf.anomaly_threshold
+    engine = ai_conf.scoring_engine
+    ensemble = create_ensemble(ai_conf.detectors)
+    host_scoring = bool(ai_conf.host_scoring.get("enabled", False))
+    explanation_dir = ai_conf.explanation_dir
+    explanation_dir.mkdir(parents=True, exist_ok=True)
+
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    record_queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=queue_size)
+    detection_queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=queue_size)
+    logger = AuditLogger(settings_path)
+    # With host scoring the audit log gets one event per host instead of one per port.
+    port_logger = None if host_scoring else logger
+
+    def scan_and_parse() -> Iterator[List[Dict[str, Any]]]:
+        # Shards are parsed in shard order as soon as they are ready while later ones keep scanning.
+        writer = SnapshotWriter() if parsed_path else None
+        for scan_path in iter_scan(settings_path):
+            # Rows take their CSV shape so detections match the file-based path exactly.
+            for chunk in iter_chunks(map(csv_row, iter_results(Path(scan_path))), chunk_size):
+                if writer:
+                    writer.extend(chunk)
+                yield chunk
+        if writer and parsed_path:
+            writer.write(parsed_path)
+            if settings.pipeline.export_csv:
+                export_csv(parsed_path)
+
+    def score_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with tally("score", len(chunk)):
+            return list(detect_records(chunk, model, threshold, engine, port_logger, chunk_size, ensemble))
+
+    async def score() -> None:
+        while (chunk := await record_queue.get()) is not _DONE:
+            await detection_queue.put(await asyncio.to_thread(score_chunk, chunk))
+        await detection_queue.put(_DONE)
+
+    async def explain() -> None:
+        while (batch := await detection_queue.get()) is not _DONE:
+            for detection in batch:
+                explanations_output.write(explain_record(detection, detections_output.records, port_logger))
+                detections_output.write(detection)
+
+    # Both outputs are written as detections arrive; in ndjson format nothing is buffered,
+    # and the steps after the run stream the written detections file.
+    with DetectionsOutput(explanation_dir, ai_conf.output_format) as detections_output:
+        detections_path = detections_output.path
+        with ExplanationsOutput(explanation_dir, detections_path, ai_conf.output_format) as explanations_output:
+            with logger.batch():
+                try:
+                    await asyncio.gather(
+                        asyncio.to_thread(_pump, scan_and_parse(), record_queue, loop, cancelled),
+                        score(),
+                        explain(),
+                    )
+                except BaseException:
+                    cancelled.set()
+                    raise
+
+    if host_scoring:
+        with stage("host_scoring", detections_output.records):
+            run_host_scoring(iter_detections(detections_path), model, ai_conf, logger, detections_path)
+    logger.close()
+    finish_run(detections_path, ai_conf.detection_store)
+    return detections_path, explanations_output.path
+
+
+def run_streaming_pipeline(settings_path: Path, model: Optional[Any] = None) -> Path:
+    """Run scan, parse, detect and explain as overlapping stages joined by bounded queues.
+
+    Records flow between stages in chunks: parsing starts with the first
+    finished shard, scoring starts with the first parsed chunk and
+    explanations are built from in-memory detections. ``logs/parsed.snap`` is
+    only written when ``pipeline.keep_intermediate`` is set. Requires a
+    trained model.
+    """
+
+    settings = load_settings(settings_path)
+    keep_intermediate = settings.pipeline.keep_intermediate
+    owns_model = model is None
+    if owns_model:
+        model = load_model(settings.ai_engine.model_path)
+    try:
+        parsed_path = PARSED_SNAPSHOT if keep_intermediate else None
+        # Scan, parse, scoring and explanations overlap, so they are measured as one stage.
+        with stage("stream"):
+            detections_path, _ = asyncio.run(_stream_stages(settings_path, model, parsed_path))
+    finally:
+        if owns_model and isinstance(model, CompiledModel):
+            model.close()
+    return detections_path
+
+
+def run_pipeline(
+    settings_path: Path,
+    retrain: bool = False,
+    incremental: bool = False,
+    model: Optional[Any] = None,
+    streaming: Optional[bool] = None,
+) -> Path:
+    """Run scan, parse, (re)train, detect and explain once and return the detections path.
+
+    ``model`` lets long-running callers reuse an already loaded baseline.
+    Streaming mode (``pipeline.streaming``) is used when no training or scan
+    diffing has to see the whole scan first. Stage timings are appended to
+    ``pipeline.metrics.file``.
+    """
+
+    metrics_conf = load_settings(settings_path).pipeline.metrics
+    textfile = _optional_path(metrics_conf.get("prometheus_textfile"))
+    # An empty value turns the metrics file off.
+    with run_metrics(_optional_path(metrics_conf.get("file", "logs/run_metrics.ndjson")), textfile):
+        return _run_pipeline(settings_path, retrain, incremental, model, streaming)
+
+
+def _optional_path(value: Optional[str]) -> Optional[Path]:
+    return Path(value) if value else None
+
+
+def _run_pipeline(
+    settings_path: Path, retrain: bool, incremental: bool, model: Optional[Any], streaming: Optional[bool]
+) -> Path:
+    settings = load_settings(settings_path)
+    ai_conf = settings.ai_engine
+    model_path = ai_conf.model_path
+    incremental_conf = settings.get("scanner", {}).get("incremental", {})
+    incremental = incremental or incremental_conf.get("enabled", False)
+    if streaming is None:
+        streaming = settings.pipeline.streaming
+    needs_full_scan = (
+        retrain
+        or incremental
+        or not model_path.exists()
+        or ai_conf.incremental_training.get("enabled", False)
+    )
+    if streaming and not needs_full_scan:
+        return run_streaming_pipeline(settings_path, model)
+
+    scan_path = run_scan(settings_path)
+    with stage("parse") as measured:
+        writer = SnapshotWriter()
+        writer.extend(iter_results(Path(scan_path)))
+        parsed_path = writer.write(PARSED_SNAPSHOT)
+        measured.records = writer.rows
+    if settings.pipeline.export_csv:
+        export_csv(parsed_path)
+
+    if retrain or not model_path.exists():
+        with stage("train", measured.records):
+            train_model(parsed_path, settings_path)
+        model = None
+    elif ai_conf.incremental_training.get("enabled", False):
+        with stage("update_model", measured.records):
+            update_model(parsed_path, settings_path)
+        model = None
+
+    detection_input = parsed_path
+    if incremental:
+        with stage("diff", measured.records):
+            detection_input = diff_scan(parsed_path, settings_path, incremental_conf, ai_conf, failed_shards(Path(scan_path)))
+
+    detections_path, detections = run_detection(detection_input, settings_path, model, partial=incremental)
+    generate_explanations(detection_input, settings_path, detections_path, detections)
+    return detections_path
 
 
 def main() -> None:
@@ -30,22 +282,19 @@ def main() -> None:
         action="store_true",
         help="Force model retraining even if a model already exists",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only score services that changed since the previous scan",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        default=None,
+        help="Overlap scan, parse, scoring and explanation stages",
+    )
     args = parser.parse_args()
-
-    settings = load_settings(args.config)
-    ai_conf = settings.get("ai_engine", {})
-    model_path = Path(ai_conf.get("model_path", "ai_engine/models/baseline_model.json"))
-
-    scan_path = run_scan(args.config)
-    records = parse_results(Path(scan_path))
-    parsed_csv = Path("logs/parsed.csv")
-    write_csv(records, parsed_csv)
-
-    if args.retrain or not model_path.exists():
-        train_model(parsed_csv, args.config)
-
-    detections_path = detect(parsed_csv, args.config)
-    generate_explanations(parsed_csv, args.config, detections_path)
+    run_pipeline(args.config, args.retrain, args.incremental, streaming=args.streaming)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+"""Resident scheduler running the SOC Lite pipeline on the configured intervals."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in {None, ""}:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import datetime as dt
+import fcntl
+import json
+import os
+import signal
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from ai_engine.compiled_model import CompiledModel
+from ai_engine.detect_anomalies import load_model
+from ai_engine.train_model import train_model
+from config.loader import Settings, load_settings
+from logs.metrics import serve_prometheus
+from scripts.run_pipeline import PARSED_SNAPSHOT, run_pipeline
+
+Job = Callable[[], Any]
+
+
+class PipelineScheduler:
+    """Run the pipeline every ``scan_interval_minutes`` and retrain every ``retrain_interval_hours``.
+
+    Jobs run one at a time on the scheduler thread, so a slow run delays the
+    next one instead of overlapping with it; ticks missed meanwhile are
+    counted as skipped rather than queued. The baseline model is loaded once
+    and reused until the model file changes on disk; settings edits are picked
+    up between jobs without a restart (the status file path is fixed at start).
+    """
+
+    def __init__(
+        self,
+        settings_path: Path,
+        status_path: Optional[Path] = None,
+        pipeline_job: Optional[Job] = None,
+        retrain_job: Optional[Job] = None,
+    ) -> None:
+        self.settings_path = settings_path
+        self._apply_settings(load_settings(settings_path))
+        self.status_path = status_path or self.settings.scheduler.status_file
+        self.jobs: Dict[str, Job] = {
+            "pipeline": pipeline_job or self._run_pipeline,
+            "retrain": retrain_job or self._retrain,
+        }
+        self._model: Optional[Any] = None
+        self._model_stamp: Optional[tuple] = None
+        self._stop = threading.Event()
+        now = time.monotonic()
+        # The first pipeline run happens immediately; retraining waits a full interval.
+        self._next_run = {"pipeline": now, "retrain": now + self.intervals["retrain"]}
+        self.status: Dict[str, Any] = {
+            "pid": os.getpid(),
+            "state": "starting",
+            "started_at": self._now(),
+            "jobs": {name: {"runs": 0, "failures": 0, "skipped": 0} for name in self.jobs},
+        }
+
+    def _apply_settings(self, settings: Settings) -> None:
+        self.settings = settings
+        self.intervals = {
+            "pipeline": settings.scheduler.scan_interval_minutes * 60,
+            "retrain": settings.scheduler.retrain_interval_hours * 3600,
+        }
+        self.model_path = settings.ai_engine.model_path
+
+    def reload_settings(self) -> bool:
+        """Adopt edited settings; pending runs are pulled in if an interval got shorter."""
+
+        settings = load_settings(self.settings_path)
+        if settings is self.settings:
+            return False
+        self._apply_settings(settings)
+        now = time.monotonic()
+        for name, interval in self.intervals.items():
+            self._next_run[name] = min(self._next_run[name], now + interval)
+            self._record_next_run(name)
+        self.write_status()
+        return True
+
+    @staticmethod
+    def _now() -> str:
+        return dt.datetime.now(tz=dt.timezone.utc).isoformat()
+
+    def _current_model(self) -> Optional[Any]:
+        """Return the hot model, reloading it only when the file on disk changed."""
+
+        if not self.model_path.exists():
+            return None
+        stat = self.model_path.stat()
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp != self._model_stamp:
+            self._release_model()
+            self._model = load_model(self.model_path)
+            self._model_stamp = stamp
+        return self._model
+
+    def _release_model(self) -> None:
+        if isinstance(self._model, CompiledModel):
+            self._model.close()
+        self._model = None
+        self._model_stamp = None
+
+    def _run_pipeline(self) -> Any:
+        return run_pipeline(self.settings_path, model=self._current_model())
+
+    def _retrain(self) -> Any:
+        # Always a full rebuild: with incremental training on, every pipeline run
+        # has already folded the latest scan into the model.
+        # Installs upgraded from the CSV interchange may only have the old export.
+        candidates = (PARSED_SNAPSHOT, PARSED_SNAPSHOT.with_suffix(".csv"))
+        parsed_path = next((path for path in candidates if path.exists()), None)
+        if parsed_path is None:
+            raise FileNotFoundError("No parsed scan available to retrain on yet")
+        return train_model(parsed_path, self.settings_path)
+
+    def write_status(self) -> None:
+        self.status["updated_at"] = self._now()
+        self.status_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.status_path.with_name(self.status_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.status, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.status_path)
+
+    def run_job(self, name: str) -> None:
+        job_status = self.status["jobs"][name]
+        self.status["state"] = f"running:{name}"
+        job_status["last_started"] = self._now()
+        self.write_status()
+        start = time.monotonic()
+        try:
+            result = self.jobs[name]()
+            job_status["last_status"] = "ok"
+            job_status["last_result"] = str(result) if result is not None else None
+            job_status.pop("last_error", None)
+        except Exception as exc:  # keep the daemon alive; the failure is reported in the status file
+            job_status["last_status"] = "error"
+            job_status["last_error"] = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+            job_status["failures"] += 1
+        finished = time.monotonic()
+        job_status["runs"] += 1
+        job_status["last_finished"] = self._now()
+        job_status["last_duration_seconds"] = round(finished - start, 3)
+
+        interval = self.intervals[name]
+        next_run = self._next_run[name] + interval
+        if next_run < finished:
+            missed = int((finished - next_run) // interval) + 1
+            job_status["skipped"] += missed
+            next_run += missed * interval
+        self._next_run[name] = next_run
+        self._record_next_run(name)
+        self.status["state"] = "idle"
+        self.write_status()
+
+    def _record_next_run(self, name: str) -> None:
+        delay = max(self._next_run[name] - time.monotonic(), 0)
+        next_run_at = dt.datetime.now(tz=dt.timezone.utc) + dt.timedelta(seconds=delay)
+        self.status["jobs"][name]["next_run_at"] = next_run_at.isoformat()
+
+    def stop(self, *_: Any) -> None:
+        self._stop.set()
+
+    def run_forever(self) -> None:
+        for name in self.jobs:
+            self._record_next_run(name)
+        self.status["state"] = "idle"
+        self.write_status()
+        try:
+            while not self._stop.is_set():
+                self.reload_settings()
+                now = time.monotonic()
+                for name in self.jobs:
+                    if self._stop.is_set():
+                        break
+                    if self._next_run[name] <= now:
+                        self.run_job(name)
+                wait = min(self._next_run.values()) - time.monotonic()
+                if wait > 0:
+                    self._stop.wait(wait)
+        finally:
+            self._release_model()
+            self.status["state"] = "stopped"
+            self.write_status()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the SOC Lite pipeline on a schedule")
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=Path("config/settings.yaml"),
+        help="Path to the settings file",
+    )
+    args = parser.parse_args()
+
+    scheduler = PipelineScheduler(args.config)
+    lock_path = scheduler.settings.scheduler.lock_file
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SystemExit(f"Another scheduler already holds {lock_path}")
+        metrics_conf = scheduler.settings.pipeline.metrics
+        if metrics_conf.get("prometheus_port"):
+            # The endpoint serves the last run of the metrics file; its address is fixed at start.
+            serve_prometheus(
+                Path(metrics_conf.get("file") or "logs/run_metrics.ndjson"),
+                int(metrics_conf["prometheus_port"]),
+                metrics_conf.get("prometheus_host", "127.0.0.1"),
+            )
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+        scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
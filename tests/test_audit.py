@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import json
+import socket
+import tempfile
+import threading
+import unittest
+import urllib.request
+from pathlib import Path
+from unittest import mock
+
+from logs.audit import (
+    AuditLogger,
+    AuditStore,
+    AuditTail,
+    _BatchWriter,
+    load_audit_document,
+    migrate_legacy_audit,
+    read_audit_events,
+    tail_audit_events,
+)
+from logs.metrics import run_metrics, serve_prometheus, stage, tally
+from logs.rotation import RotationPolicy, iter_lines, rotated_segments, tail_lines
+from logs.wazuh_forwarder import PROGRAM_NAME, Spool, TcpTransport, WazuhForwarder
+
+
+class AuditStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        self.config_path = self.tmp_path / "config.json"
+        config = {
+            "audit": {
+                "audit_log": str(self.tmp_path / "audit.ndjson"),
+                "wazuh_event_log": str(self.tmp_path / "wazuh.ndjson"),
+            },
+        }
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_log_event_appends_one_line_per_event(self) -> None:
+        logger = AuditLogger(self.config_path)
+        logger.log_event("anomaly_detected", {"ip": "10.0.0.1"})
+        logger.log_event("firewall_block", {"ip": "10.0.0.1"})
+
+        lines = (self.tmp_path / "audit.ndjson").read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])["type"], "firewall_block")
+        events = load_audit_document(self.tmp_path / "audit.ndjson")["events"]
+        self.assertEqual([event["type"] for event in events], ["anomaly_detected", "firewall_block"])
+
+    def test_batch_coalesces_writes(self) -> None:
+        logger = AuditLogger(self.config_path)
+        writes = []
+        original_write = logger._write
+
+        def recording_write(events):
+            writes.append(len(events))
+            original_write(events)
+
+        logger._write = recording_write
+        logger.flush_every = 10
+        logger.flush_interval_ms = 60_000
+        logger.log_events(("anomaly_detected", {"index": index}) for index in range(25))
+
+        self.assertEqual(sum(writes), 25)
+        self.assertLessEqual(len(writes), 3)
+        events = list(logger.store.iter_events())
+        self.assertEqual([event["payload"]["index"] for event in events], list(range(25)))
+        wazuh_lines = (self.tmp_path / "wazuh.ndjson").read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(wazuh_lines), 25)
+
+    def test_failed_writes_report_every_dropped_event(self) -> None:
+        def failing_write(events):
+            raise OSError("disk full")
+
+        writer = _BatchWriter(failing_write, flush_every=10, flush_interval_ms=60_000, queue_size=100)
+        for index in range(25):
+            writer.put({"index": index})
+        writer.start()
+        with self.assertRaisesRegex(RuntimeError, "25 events were not written") as raised:
+            writer.close()
+        self.assertIsInstance(raised.exception.__cause__, OSError)
+
+    def test_batch_keeps_the_exception_raised_inside_the_block(self) -> None:
+        logger = AuditLogger(self.config_path)
+
+        def failing_write(events):
+            raise OSError("disk full")
+
+        logger._write = failing_write
+        with self.assertRaisesRegex(ValueError, "boom") as raised:
+            with logger.batch():
+                logger.log_event("anomaly_detected", {"index": 0})
+                raise ValueError("boom")
+        self.assertIn("1 events were not written", str(raised.exception.__cause__))
+        self.assertIsNone(logger._writer)
+
+    def test_migrate_legacy_document(self) -> None:
+        legacy = self.tmp_path / "audit.json"
+        legacy_events = [{"timestamp": "t0", "type": "old", "payload": {}}]
+        legacy.write_text(json.dumps({"events": legacy_events}, indent=2), encoding="utf-8")
+
+        self.assertEqual(load_audit_document(legacy)["events"], legacy_events)
+        with self.assertRaises(ValueError):
+            AuditStore(legacy)
+
+        count = migrate_legacy_audit(legacy, self.tmp_path / "audit.ndjson")
+        self.assertEqual(count, 1)
+        logger = AuditLogger(self.config_path)
+        logger.log_event("new", {})
+        events = list(logger.store.iter_events())
+        self.assertEqual([event["type"] for event in events], ["old", "new"])
+
+    def test_torn_first_event_is_not_mistaken_for_a_legacy_document(self) -> None:
+        audit_path = self.tmp_path / "audit.ndjson"
+        audit_path.write_text('{"timestamp": "t0", "type": "anomaly_de\n', encoding="utf-8")
+
+        logger = AuditLogger(self.config_path)
+        logger.log_event("firewall_block", {"ip": "10.0.0.1"})
+
+        lines = audit_path.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(json.loads(lines[1])["type"], "firewall_block")
+
+    def test_rotation_compresses_segments_and_readers_span_them(self) -> None:
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["audit"]["rotation"] = {"max_bytes": 400, "retention": 3, "compression": "gzip"}
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+
+        logger = AuditLogger(self.config_path)
+        for index in range(40):
+            logger.log_event("anomaly_detected", {"index": index})
+
+        segments = rotated_segments(self.tmp_path / "audit.ndjson")
+        self.assertEqual(len(segments), 3)
+        # The newest segment waits one rotation before it is compressed, for tailers still reading it.
+        self.assertEqual([segment.suffix == ".gz" for segment in segments], [True, True, False])
+        indexes = [event["payload"]["index"] for event in read_audit_events(self.tmp_path / "audit.ndjson")]
+        self.assertEqual(indexes, list(range(indexes[0], 40)))
+        self.assertGreater(indexes[0], 0)
+        self.assertEqual(len(list(iter_lines(self.tmp_path / "wazuh.ndjson"))), len(indexes))
+
+    def test_time_based_rotation(self) -> None:
+        path = self.tmp_path / "events.ndjson"
+        path.write_text("{}\n", encoding="utf-8")
+        policy = RotationPolicy(interval_hours=1)
+        mtime = path.stat().st_mtime
+        self.assertFalse(policy.should_rotate(path, now=mtime))
+        self.assertTrue(policy.should_rotate(path, now=mtime + 3600))
+
+    def test_tail_reads_backwards_across_segments(self) -> None:
+        path = self.tmp_path / "events.ndjson"
+        path.write_text("".join(f"line {index}\n" for index in range(10)), encoding="utf-8")
+        segment = path.with_name(path.name + ".20240101T000000Z")
+        path.rename(segment)
+        path.write_text("line 10\nline 11\npartial", encoding="utf-8")
+
+        self.assertEqual(tail_lines(path, 3, block_size=4), ["line 9", "line 10", "line 11"])
+        self.assertEqual(tail_lines(path, 1, block_size=4), ["line 11"])
+        self.assertEqual(len(tail_lines(path, 100)), 12)
+
+    def test_audit_tail_reads_only_new_events(self) -> None:
+        logger = AuditLogger(self.config_path)
+        logger.log_events(("anomaly_detected", {"index": index}) for index in range(8))
+        audit_path = self.tmp_path / "audit.ndjson"
+        self.assertEqual([event["payload"]["index"] for event in tail_audit_events(audit_path, 3)], [5, 6, 7])
+
+        tail = AuditTail(audit_path, 3)
+        self.assertTrue(tail.poll())
+        self.assertFalse(tail.poll())
+        logger.log_event("firewall_block", {"index": 8})
+        reset, new_events = tail.read_new()
+        self.assertFalse(reset)
+        self.assertEqual([event["payload"]["index"] for event in new_events], [8])
+        with audit_path.open("a", encoding="utf-8") as fh:
+            fh.write('{"type": "half')
+        self.assertFalse(tail.poll())
+        self.assertEqual([event["payload"]["index"] for event in tail.events], [6, 7, 8])
+
+        audit_path.write_text(json.dumps({"type": "fresh", "payload": {"index": 0}}) + "\n", encoding="utf-8")
+        self.assertTrue(tail.poll())
+        self.assertEqual([event["type"] for event in tail.events], ["fresh"])
+
+
+class SyslogListener(threading.Thread):
+    """Local TCP stand-in for the Wazuh manager's syslog listener."""
+
+    def __init__(self, port: int = 0) -> None:
+        super().__init__(daemon=True)
+        self.server = socket.create_server(("127.0.0.1", port))
+        self.port = self.server.getsockname()[1]
+        self.lines = []
+        self.received = threading.Condition()
+
+    def run(self) -> None:
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn, conn.makefile("rb") as fh:
+                for line in fh:
+                    with self.received:
+                        self.lines.append(line.rstrip(b"\n").decode("utf-8"))
+                        self.received.notify_all()
+
+    def wait_for(self, count: int, timeout: float = 5) -> list:
+        with self.received:
+            self.received.wait_for(lambda: len(self.lines) >= count, timeout=timeout)
+            return list(self.lines)
+
+    def close(self) -> None:
+        self.server.close()
+
+
+class WazuhForwarderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_audit_logger_forwards_syslog_lines_instead_of_the_file(self) -> None:
+        listener = SyslogListener()
+        listener.start()
+        self.addCleanup(listener.close)
+        config_path = self.tmp_path / "config.json"
+        config = {
+            "audit": {
+                "audit_log": str(self.tmp_path / "audit.ndjson"),
+                "wazuh_event_log": str(self.tmp_path / "wazuh.ndjson"),
+                "wazuh_forwarder": {"enabled": True, "port": listener.port, "spool_path": str(self.tmp_path / "spool")},
+            },
+        }
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+
+        logger = AuditLogger(config_path)
+        logger.log_events(("anomaly_detected", {"index": index}) for index in range(3))
+        logger.close()
+
+        lines = listener.wait_for(3)
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("<134>"))
+        self.assertIn(f" {PROGRAM_NAME}: {{", lines[0])
+        self.assertIn('"type":"anomaly_detected"', lines[0])
+        self.assertEqual([json.loads(line.split(": ", 1)[1])["payload"]["index"] for line in lines], [0, 1, 2])
+        self.assertFalse((self.tmp_path / "wazuh.ndjson").exists())
+        self.assertEqual(len(list(read_audit_events(self.tmp_path / "audit.ndjson"))), 3)
+
+    def test_events_are_spooled_while_the_manager_is_down_and_replayed_in_order(self) -> None:
+        probe = socket.create_server(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        spool = Spool(self.tmp_path / "spool.ndjson", max_bytes=1 << 20)
+        forwarder = WazuhForwarder(TcpTransport("127.0.0.1", port, timeout=1), spool, batch_events=2, retry_seconds=0)
+        self.addCleanup(forwarder.close)
+
+        forwarder.send([{"type": "anomaly_detected", "index": index} for index in range(3)])
+        self.assertTrue(spool.pending())
+        forwarder.send([{"type": "anomaly_detected", "index": 3}])
+        self.assertTrue(spool.pending())
+
+        listener = SyslogListener(port)
+        listener.start()
+        self.addCleanup(listener.close)
+        forwarder.send([{"type": "anomaly_detected", "index": 4}])
+        self.assertFalse(spool.pending())
+        self.assertFalse(spool.path.exists())
+        lines = listener.wait_for(5)
+        self.assertEqual([json.loads(line.split(": ", 1)[1])["index"] for line in lines], [0, 1, 2, 3, 4])
+
+    def test_loggers_share_one_forwarder_and_deliver_each_event_once(self) -> None:
+        probe = socket.create_server(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        spool_path = self.tmp_path / "spool.ndjson"
+        config_path = self.tmp_path / "config.json"
+        config = {
+            "audit": {
+                "audit_log": str(self.tmp_path / "audit.ndjson"),
+                "wazuh_event_log": str(self.tmp_path / "wazuh.ndjson"),
+                "wazuh_forwarder": {
+                    "enabled": True,
+                    "port": port,
+                    "spool_path": str(spool_path),
+                    "batch_events": 7,
+                    "retry_seconds": 0,
+                    "timeout_seconds": 1,
+                },
+            },
+        }
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+        first, second = AuditLogger(config_path), AuditLogger(config_path)
+        self.assertIs(first.forwarder, second.forwarder)
+        self.addCleanup(first.close)
+
+        def log(logger: AuditLogger, start: int) -> None:
+            for index in range(start, start + 50):
+                logger.log_event("anomaly_detected", {"index": index})
+
+        def run_concurrently(*targets) -> None:
+            threads = [threading.Thread(target=target, args=args) for target, *args in targets]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        run_concurrently((log, first, 0), (log, second, 50))
+        self.assertTrue(first.forwarder.spool.pending())
+
+        listener = SyslogListener(port)
+        listener.start()
+        self.addCleanup(listener.close)
+        # The drain command runs in its own process with its own forwarder on the same spool.
+        command = WazuhForwarder(
+            TcpTransport("127.0.0.1", port, timeout=1), Spool(spool_path, 1 << 20), batch_events=7, retry_seconds=0
+        )
+        run_concurrently((log, first, 100), (log, second, 150), (command.drain, True))
+        first.close()
+        command.close()
+
+        lines = listener.wait_for(201, timeout=1)
+        indexes = [json.loads(line.split(": ", 1)[1])["payload"]["index"] for line in lines]
+        self.assertEqual(sorted(indexes), list(range(200)))
+        self.assertFalse(spool_path.exists())
+
+    def test_spool_lock_excludes_other_drains(self) -> None:
+        spool = Spool(self.tmp_path / "spool.ndjson", max_bytes=1 << 20)
+        spool.append([b"queued"])
+        forwarder = WazuhForwarder(mock.Mock(), Spool(spool.path, 1 << 20))
+        with spool.lock():
+            drain = threading.Thread(target=forwarder.drain, args=(True,))
+            drain.start()
+            drain.join(0.2)
+            self.assertTrue(drain.is_alive())
+            forwarder.transport.send.assert_not_called()
+        drain.join()
+        forwarder.transport.send.assert_called_once_with([b"queued"])
+        self.assertFalse(spool.pending())
+
+    def test_spool_replay_resumes_after_a_partial_drain(self) -> None:
+        spool = Spool(self.tmp_path / "spool.ndjson", max_bytes=64)
+        self.assertEqual(spool.append([b"a" * 20, b"b" * 20, b"c" * 20, b"d" * 20]), 1)
+        lines, offset = spool.read_batch(2)
+        self.assertEqual(lines, [b"a" * 20, b"b" * 20])
+        spool.commit(offset)
+        self.assertEqual(spool.read_batch(5)[0], [b"c" * 20])
+
+
+class RunMetricsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_stages_are_only_recorded_inside_a_run_and_served_to_prometheus(self) -> None:
+        metrics_path = self.tmp_path / "run_metrics.ndjson"
+        with stage("outside"):
+            pass
+        with self.assertRaises(RuntimeError), run_metrics(metrics_path):
+            with stage("parse", 10) as measured:
+                measured.records = 20
+            for _ in range(3):
+                with tally("audit_write", 2):
+                    pass
+            raise RuntimeError("scan failed")
+
+        run = json.loads(metrics_path.read_text(encoding="utf-8"))
+        self.assertEqual(run["status"], "error")
+        self.assertEqual([entry["stage"] for entry in run["stages"]], ["parse", "audit_write"])
+        self.assertEqual(run["stages"][0]["records"], 20)
+        self.assertEqual((run["stages"][1]["calls"], run["stages"][1]["records"]), (3, 6))
+
+        server = serve_prometheus(metrics_path, 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode("utf-8")
+        self.assertIn('trusted_ai_soc_stage_records{stage="parse"} 20', body)
+        self.assertIn("trusted_ai_soc_run_success 0", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from config.loader import load_settings
+
+
+class SettingsCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = Path(self.tmp.name) / "config.json"
+        self.write({"ai_engine": {"anomaly_threshold": 0.4}, "scanner": {"targets": ["10.0.0.0/24"]}})
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write(self, config: dict, age: float = 0.0) -> None:
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        if age:
+            stat = self.config_path.stat()
+            os.utime(self.config_path, (stat.st_atime - age, stat.st_mtime - age))
+
+    def test_snapshot_is_cached_typed_and_immutable(self) -> None:
+        settings = load_settings(self.config_path)
+        self.assertIs(load_settings(self.config_path), settings)
+        self.assertEqual(settings.ai_engine.anomaly_threshold, 0.4)
+        self.assertEqual(settings.ai_engine.scoring_engine, "row")
+        self.assertEqual(settings.get("scanner", {}).get("targets"), ("10.0.0.0/24",))
+        with self.assertRaises(TypeError):
+            settings["scanner"]["targets"] = []
+
+    def test_changes_are_picked_up(self) -> None:
+        self.write({"ai_engine": {"anomaly_threshold": 0.4}}, age=60)
+        old = load_settings(self.config_path)
+        self.assertIs(load_settings(self.config_path), old)
+
+        self.write({"ai_engine": {"anomaly_threshold": 0.5}})
+        new = load_settings(self.config_path)
+        self.assertIsNot(new, old)
+        self.assertEqual(new.ai_engine.anomaly_threshold, 0.5)
+
+    def test_invalid_values_are_rejected(self) -> None:
+        self.write({"ai_engine": {"scoring_engine": "gpu"}})
+        with self.assertRaises(ValueError):
+            load_settings(self.config_path)
+        self.write({"ai_engine": {"detectors": {"baseline": {"weight": 0}}}})
+        with self.assertRaises(ValueError):
+            load_settings(self.config_path)
+        self.write({"ai_engine": {"detectors": {"autoencoder": {"weight": 1}}}})
+        with self.assertRaises(ValueError):
+            load_settings(self.config_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
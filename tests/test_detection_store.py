@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import datetime as dt
+import tempfile
+import unittest
+from pathlib import Path
+
+from ai_engine.detection_store import DetectionStore
+
+
+def detection(ip: str, port: str, score: float, prediction: bool) -> dict:
+    return {
+        "ip": ip,
+        "hostname": "",
+        "port": port,
+        "state": "open",
+        "service": "ssh",
+        "product": "openssh",
+        "anomaly_score": score,
+        "severity": "high" if prediction else "low",
+        "prediction": prediction,
+        "explanation": [{"feature": "port", "impact": score, "reason": "test"}],
+    }
+
+
+class DetectionStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DetectionStore(Path(self.tmp.name) / "detections.sqlite")
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_runs_timeline_and_top_queries(self) -> None:
+        week_ago = dt.datetime(2024, 5, 1, tzinfo=dt.timezone.utc)
+        self.store.record_run(
+            [detection("10.0.3.7", "22", 0.9, True), detection("10.0.3.8", "80", 0.1, False)], week_ago, "old.json"
+        )
+        latest = self.store.record_run(
+            [detection("10.0.3.7", "22", 0.4, False), detection("10.0.3.7", "3389", 0.8, True)],
+            week_ago + dt.timedelta(days=7),
+            "new.json",
+        )
+
+        run = self.store.latest_run()
+        self.assertEqual((run["run_id"], run["detections_file"], run["total"], run["anomalies"]), (latest, "new.json", 2, 1))
+        detections = self.store.run_detections(latest)
+        self.assertEqual([det["port"] for det in detections], [22, 3389])
+        self.assertEqual(detections[1]["explanation"][0]["reason"], "test")
+        self.assertIs(detections[1]["prediction"], True)
+
+        timeline = self.store.host_timeline("10.0.3.7")
+        self.assertEqual([(det["port"], det["anomaly_score"]) for det in timeline], [(22, 0.9), (3389, 0.8)])
+        recent = self.store.host_timeline("10.0.3.7", since=week_ago + dt.timedelta(days=1), anomalies_only=False)
+        self.assertEqual([det["port"] for det in recent], [22, 3389])
+
+        self.assertEqual([det["anomaly_score"] for det in self.store.top_detections(2)], [0.9, 0.8])
+        self.assertEqual([det["anomaly_score"] for det in self.store.top_detections(1, run_id=latest)], [0.8])
+        self.assertEqual(self.store.severity_counts(latest), {"high": 1, "low": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import json
+import os
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
-from ai_engine.detect_anomalies import detect
+from ai_engine.detect_anomalies import detect, iter_detections, latest_detections_file, run_detection
+from ai_engine.detection_store import DetectionStore
+from ai_engine.json_lines import JsonLinesWriter, iter_records, read_footer, read_header, read_record
 from ai_engine.train_model import train_model
-from ai_engine.xai_explain import generate_explanations
+from ai_engine.xai_explain import generate_explanations, load_explanations
+from logs.metrics import read_runs
 from scanner.parse_results import write_csv
+from scanner.snapshot import write_snapshot
+from scripts.run_pipeline import run_pipeline
 
 
 class PipelineIntegrationTest(unittest.TestCase):
@@ -20,6 +27,7 @@ class PipelineIntegrationTest(unittest.TestCase):
             "ai_engine": {
                 "model_path": str(self.tmp_path / "model.json"),
                 "explanation_dir": str(self.tmp_path / "explanations"),
+                "detection_store": str(self.tmp_path / "detections.sqlite"),
                 "anomaly_threshold": 0.3,
             },
             "audit": {
@@ -55,6 +63,249 @@ class PipelineIntegrationTest(unittest.TestCase):
         explanations = json.loads(explanations_path.read_text(encoding="utf-8"))
         self.assertIn("explanations", explanations)
         self.assertEqual(len(explanations["explanations"]), len(detections["detections"]))
+        self.assertNotIn("explanation", explanations["explanations"][0])
+
+        resolved = load_explanations(explanations_path)
+        self.assertEqual(
+            [item["explanation"] for item in resolved],
+            [detection["explanation"] for detection in detections["detections"]],
+        )
+        self.assertEqual(resolved[0]["ip"], detections["detections"][0]["ip"])
+
+        with DetectionStore(self.tmp_path / "detections.sqlite") as store:
+            run = store.latest_run()
+            self.assertEqual(run["detections_file"], detection_path.name)
+            self.assertEqual(len(store.run_detections(run["run_id"])), len(detections["detections"]))
+
+        latest = json.loads(detection_path.with_name("latest.json").read_text(encoding="utf-8"))
+        self.assertEqual(latest["detections_file"], detection_path.name)
+        self.assertEqual(latest["run_id"], run["run_id"])
+        self.assertEqual(latest["total"], len(detections["detections"]))
+        self.assertEqual(
+            latest["top"][0]["anomaly_score"],
+            max(detection["anomaly_score"] for detection in detections["detections"]),
+        )
+
+    def test_explanations_from_in_memory_detections(self) -> None:
+        train_model(self.data_path, self.config_path)
+        detection_path, detections = run_detection(self.data_path, self.config_path)
+        file_path = generate_explanations(self.data_path, self.config_path, detection_path)
+        from_file = file_path.read_text(encoding="utf-8")
+        memory_path = generate_explanations(self.data_path, self.config_path, detection_path, detections)
+        self.assertEqual(memory_path.read_text(encoding="utf-8"), from_file)
+
+    def test_host_scoring_audits_hosts_instead_of_ports(self) -> None:
+        train_model(self.data_path, self.config_path)
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["ai_engine"]["host_scoring"] = {"enabled": True, "exposure_ports": 10}
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        noisy = [
+            {"ip": "192.168.0.9", "hostname": "", "port": port, "state": "open", "service": f"svc{port}", "product": ""}
+            for port in range(9000, 9040)
+        ]
+        write_csv(noisy, self.data_path)
+
+        detection_path, detections = run_detection(self.data_path, self.config_path)
+        generate_explanations(self.data_path, self.config_path, detection_path, detections)
+
+        self.assertEqual(sum(1 for detection in detections if detection["prediction"]), 40)
+        events = [json.loads(line) for line in (self.tmp_path / "wazuh.ndjson").read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([event["type"] for event in events], ["host_anomaly_detected"])
+        host = events[0]["payload"]
+        self.assertEqual((host["ip"], host["open_ports"], len(host["ports"])), ("192.168.0.9", 40, 40))
+        self.assertEqual(host["jaccard"], None)
+        hosts = json.loads(detection_path.with_name(detection_path.name.replace("detections_", "hosts_")).read_text())
+        self.assertEqual(hosts["hosts"][0]["features"]["exposure"], 1.0)
+
+    def test_incremental_runs_do_not_score_host_churn(self) -> None:
+        train_model(self.data_path, self.config_path)
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["ai_engine"]["host_scoring"] = {"enabled": True}
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        run_detection(self.data_path, self.config_path)
+        changed = [{"ip": "192.168.0.1", "hostname": "host-a", "port": 8443, "state": "open", "service": "https", "product": ""}]
+        write_csv(changed, self.data_path)
+
+        outputs = {}
+        for partial in (False, True):
+            detection_path, _ = run_detection(self.data_path, self.config_path, partial=partial)
+            hosts_path = detection_path.with_name(detection_path.name.replace("detections_", "hosts_"))
+            outputs[partial] = json.loads(hosts_path.read_text(encoding="utf-8"))["hosts"][0]
+        # A full run compares the host against its previous ports; a scan diff cannot.
+        self.assertEqual(outputs[False]["jaccard"], 0.0)
+        self.assertEqual((outputs[True]["jaccard"], outputs[True]["features"]["churn"]), (None, 0.0))
+
+    def test_compiled_model_matches_json_model(self) -> None:
+        train_model(self.data_path, self.config_path)
+        json_detections = json.loads(detect(self.data_path, self.config_path).read_text(encoding="utf-8"))
+
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["ai_engine"]["model_path"] = str(self.tmp_path / "model.socm")
+        config["ai_engine"]["explanation_dir"] = str(self.tmp_path / "compiled")
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        model_path = train_model(self.data_path, self.config_path)
+        self.assertEqual(model_path.read_bytes()[:4], b"SOCM")
+        compiled_detections = json.loads(detect(self.data_path, self.config_path).read_text(encoding="utf-8"))
+        self.assertEqual(compiled_detections["detections"], json_detections["detections"])
+
+    def test_json_lines_output_matches_json_document(self) -> None:
+        train_model(self.data_path, self.config_path)
+        json_path = detect(self.data_path, self.config_path)
+        expected = json.loads(json_path.read_text(encoding="utf-8"))["detections"]
+
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["ai_engine"]["output_format"] = "ndjson"
+        config["ai_engine"]["explanation_dir"] = str(self.tmp_path / "ndjson")
+        config["ai_engine"]["detection_store"] = str(self.tmp_path / "ndjson.sqlite")
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        detections_path, detections = run_detection(self.data_path, self.config_path)
+        self.assertIsNone(detections)
+        self.assertEqual(detections_path.suffix, ".ndjson")
+        self.assertEqual(list(iter_detections(detections_path)), expected)
+        self.assertEqual(read_header(detections_path)["kind"], "detections")
+        footer = read_footer(detections_path)
+        self.assertEqual(footer["records"], len(expected))
+        self.assertEqual(footer["anomalies"], sum(1 for detection in expected if detection["prediction"]))
+        self.assertEqual(read_record(detections_path, 2, footer), expected[2])
+        self.assertEqual(latest_detections_file(self.tmp_path / "ndjson"), detections_path)
+        latest = json.loads((self.tmp_path / "ndjson" / "latest.json").read_text(encoding="utf-8"))
+        self.assertEqual((latest["total"], latest["anomalies"]), (len(expected), footer["anomalies"]))
+        with DetectionStore(self.tmp_path / "ndjson.sqlite") as store:
+            self.assertEqual(store.run_detections(latest["run_id"])[0]["ip"], expected[0]["ip"])
+
+        explanations_path = generate_explanations(self.data_path, self.config_path, detections_path)
+        self.assertEqual(explanations_path.name, "xai_explanations.ndjson")
+        self.assertEqual(
+            [item["explanation"] for item in load_explanations(explanations_path)],
+            [detection["explanation"] for detection in expected],
+        )
+
+        # A truncated detections file leaves the remaining entries unexplained instead of failing.
+        writer = JsonLinesWriter(detections_path, {"kind": "detections"})
+        writer.write(expected[0])
+        writer.close()
+        resolved = load_explanations(explanations_path)
+        self.assertEqual(len(resolved), len(expected))
+        self.assertEqual(resolved[0]["explanation"], expected[0]["explanation"])
+        self.assertEqual(resolved[-1]["explanation"], [])
+
+        detections_path.unlink()
+        self.assertEqual([item["explanation"] for item in load_explanations(explanations_path)], [[]] * len(expected))
+
+    def test_json_lines_seek_through_sparse_index(self) -> None:
+        path = self.tmp_path / "records.ndjson"
+        writer = JsonLinesWriter(path, {"kind": "test"}, index_stride=4)
+        for index in range(10):
+            writer.write({"index": index, "footer": index % 2 == 0})
+        writer.close({"note": "done"})
+
+        footer = read_footer(path, block_size=16)
+        self.assertEqual((footer["records"], footer["note"], len(footer["index"])), (10, "done", 3))
+        self.assertEqual([read_record(path, index, footer)["index"] for index in range(10)], list(range(10)))
+        self.assertEqual([record["index"] for record in iter_records(path)], list(range(10)))
+        with self.assertRaises(IndexError):
+            read_record(path, 10, footer)
+
+    def test_parallel_detection_matches_serial(self) -> None:
+        train_model(self.data_path, self.config_path)
+        records = [
+            {
+                "ip": f"10.1.0.{index % 17}",
+                "hostname": f"host-{index % 17}",
+                "port": 20 + index % 9 if index % 5 else 9000 + index,
+                "state": "open",
+                "service": "ssh" if index % 3 else "unknown",
+                "product": f"product-{index % 4}",
+            }
+            for index in range(120)
+        ]
+        snapshot_path = write_snapshot(records, self.tmp_path / "parsed.snap")
+        csv_path = self.tmp_path / "large.csv"
+        write_csv(records, csv_path)
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["ai_engine"]["host_scoring"] = {"enabled": False}
+        config["ai_engine"]["detection_store"] = ""
+
+        outputs = []
+        for workers, data_path in ((1, snapshot_path), (3, snapshot_path), (3, csv_path)):
+            config["ai_engine"]["workers"] = workers
+            config["audit"]["wazuh_event_log"] = str(self.tmp_path / f"wazuh_{workers}_{data_path.suffix}.ndjson")
+            self.config_path.write_text(json.dumps(config), encoding="utf-8")
+            detections_path, detections = run_detection(data_path, self.config_path)
+            events = Path(config["audit"]["wazuh_event_log"]).read_text(encoding="utf-8").splitlines()
+            outputs.append((json.dumps(detections, indent=2), [json.loads(event)["payload"] for event in events]))
+
+        self.assertGreater(len(outputs[0][1]), 0)
+        self.assertEqual(outputs[1], outputs[0])
+        self.assertEqual(outputs[2], outputs[0])
+        self.assertEqual(list(self.tmp_path.glob("explanations/detect_shards_*")), [])
+
+    def test_pipeline_records_stage_metrics(self) -> None:
+        scan_path = self.tmp_path / "scan.json"
+        hosts = [{"ip": "10.0.0.1", "hostname": "host", "ports": [{"port": 22, "service": "ssh", "state": "open"}]}]
+        scan_path.write_text(json.dumps({"hosts": hosts}), encoding="utf-8")
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["pipeline"] = {"metrics": {"prometheus_textfile": str(self.tmp_path / "soc.prom")}}
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp_path)
+        try:
+            with mock.patch("scripts.run_pipeline.run_scan", return_value=scan_path):
+                run_pipeline(self.config_path)
+        finally:
+            os.chdir(cwd)
+
+        (run,) = read_runs(self.tmp_path / "logs" / "run_metrics.ndjson", 5)
+        self.assertEqual(run["status"], "ok")
+        stages = {entry["stage"]: entry for entry in run["stages"]}
+        self.assertLessEqual({"parse", "train", "detect", "explain"}, set(stages))
+        self.assertEqual((stages["parse"]["records"], stages["detect"]["records"]), (1, 1))
+        self.assertGreater(stages["detect"]["peak_rss_bytes"], 0)
+        textfile = (self.tmp_path / "soc.prom").read_text(encoding="utf-8")
+        self.assertIn('trusted_ai_soc_stage_wall_seconds{stage="detect"}', textfile)
+        self.assertIn("trusted_ai_soc_run_success 1", textfile)
+
+    def test_streaming_pipeline_matches_sequential(self) -> None:
+        scan_path = self.tmp_path / "scan.json"
+        hosts = [
+            {
+                "ip": f"10.0.0.{index}",
+                "hostname": f"host-{index}",
+                "ports": [
+                    {"port": 22, "service": "ssh", "state": "open", "product": "openssh"},
+                    {"port": 8000 + index, "service": "http-alt", "state": "open", "product": f"app-{index % 3}"},
+                ],
+            }
+            for index in range(25)
+        ]
+        scan_path.write_text(json.dumps({"hosts": hosts}), encoding="utf-8")
+        train_model(self.data_path, self.config_path)
+        config = json.loads(self.config_path.read_text(encoding="utf-8"))
+        config["pipeline"] = {"chunk_size": 4, "queue_size": 2, "keep_intermediate": True}
+
+        outputs = {}
+        cwd = os.getcwd()
+        os.chdir(self.tmp_path)
+        try:
+            with mock.patch("scripts.run_pipeline.run_scan", return_value=scan_path), mock.patch(
+                "scripts.run_pipeline.iter_scan", return_value=iter([scan_path])
+            ):
+                for streaming in (False, True):
+                    config["ai_engine"]["explanation_dir"] = str(self.tmp_path / f"streaming_{streaming}")
+                    self.config_path.write_text(json.dumps(config), encoding="utf-8")
+                    detections_path = run_pipeline(self.config_path, streaming=streaming)
+                    explanations_path = next(detections_path.parent.glob("xai_explanations.json"))
+                    outputs[streaming] = (
+                        json.loads(detections_path.read_text(encoding="utf-8"))["detections"],
+                        json.loads(explanations_path.read_text(encoding="utf-8"))["explanations"],
+                        (self.tmp_path / "logs" / "parsed.snap").read_bytes(),
+                    )
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(len(outputs[True][0]), 50)
+        self.assertEqual(outputs[True], outputs[False])
 
 
 if __name__ == "__main__":
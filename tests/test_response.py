@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import ipaddress
+import json
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from email import message_from_bytes
+from pathlib import Path
+from unittest import mock
+
+from logs.audit import read_audit_events
+from response.block_ip import FirewallResponder, NftablesBackend, StubBackend, collapse
+from response.notify import Notifier, get_notifier, send_email
+
+
+class FirewallResponderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        self.config_path = self.tmp_path / "config.json"
+        config = {
+            "response": {"firewall": {"backend": "stub", "state_file": str(self.tmp_path / "blocked.json")}},
+            "audit": {
+                "audit_log": str(self.tmp_path / "audit.ndjson"),
+                "wazuh_event_log": str(self.tmp_path / "wazuh.ndjson"),
+            },
+        }
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_batches_are_collapsed_deduplicated_and_persisted(self) -> None:
+        backend = StubBackend()
+        responder = FirewallResponder(self.config_path, backend)
+        ips = [f"10.0.0.{host}" for host in range(4)] + ["10.0.0.1", "192.168.1.7", "not-an-ip", "2001:db8::1"]
+        self.assertEqual(responder.block_ips(ips), ["10.0.0.0/30", "192.168.1.7", "2001:db8::1"])
+        self.assertEqual(len(backend.calls), 1)
+
+        self.assertEqual(responder.block_ips(["10.0.0.2", "192.168.1.7"]), [])
+        self.assertEqual(len(backend.calls), 1)
+
+        restarted = FirewallResponder(self.config_path, backend)
+        self.assertEqual(restarted.block_ips(["10.0.0.3", "10.0.0.4"]), ["10.0.0.4"])
+        self.assertEqual(backend.calls[-1], [ipaddress.ip_network("10.0.0.4/32")])
+
+        events = list(read_audit_events(self.tmp_path / "audit.ndjson"))
+        self.assertEqual([event["type"] for event in events].count("firewall_block"), 4)
+        self.assertEqual([event["type"] for event in events].count("response_error"), 1)
+
+    def test_network_containing_blocked_entries_replaces_them(self) -> None:
+        backend = StubBackend()
+        responder = FirewallResponder(self.config_path, backend)
+        responder.block_ips(["10.0.0.5", "10.0.1.7", "2001:db8::1"])
+        self.assertEqual(responder.block_ips(["10.0.0.0/24", "10.0.0.9"]), ["10.0.0.0/24"])
+
+        state = json.loads((self.tmp_path / "blocked.json").read_text(encoding="utf-8"))
+        self.assertEqual(state["blocked"], ["10.0.0.0/24", "10.0.1.7/32", "2001:db8::1/128"])
+        # nft rejects overlapping elements in an interval set unless it merges them.
+        script = NftablesBackend().script(backend.calls[-1])
+        self.assertIn("add set inet soc_lite blocklist4 { type ipv4_addr; flags interval; auto-merge; }", script)
+
+    def test_nftables_script_loads_one_transaction(self) -> None:
+        networks = collapse(ipaddress.ip_network(ip) for ip in ["10.0.0.2", "10.0.0.3", "2001:db8::1"])
+        script = NftablesBackend().script(networks)
+        self.assertIn("add element inet soc_lite blocklist4 { 10.0.0.2/31 }", script)
+        self.assertIn("add element inet soc_lite blocklist6 { 2001:db8::1/128 }", script)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages; the server records connections and message bodies."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self) -> None:
+        self.server.connections += 1
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii").strip().upper()
+            if command.startswith("DATA"):
+                self.reply("354 end with .")
+                data = bytearray()
+                while (chunk := self.rfile.readline()) != b".\r\n":
+                    data.extend(chunk[1:] if chunk.startswith(b"..") else chunk)
+                self.server.messages.append(message_from_bytes(bytes(data)))
+                self.reply(self.server.data_reply)
+                if self.server.drop_after_message:
+                    self.server.drop_after_message = False
+                    return
+            elif command.startswith("QUIT"):
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class NotifierTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        self.server.messages = []
+        self.server.drop_after_message = False
+        self.server.data_reply = "250 queued"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.now = 0.0
+        self.slept = []
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def notifier(self, **email_conf) -> Notifier:
+        config_path = self.configure(**email_conf)
+
+        def sleep(seconds: float) -> None:
+            self.slept.append(seconds)
+            self.now += seconds
+
+        return Notifier(config_path, clock=lambda: self.now, sleep=sleep)
+
+    def configure(self, **email_conf) -> Path:
+        config_path = self.tmp_path / "config.json"
+        email = {
+            "enabled": True,
+            "smtp_server": "127.0.0.1",
+            "smtp_port": self.server.server_address[1],
+            "username": "soc@example.com",
+            "recipient": ["a@example.com", "b@example.com"],
+            "starttls": False,
+            **email_conf,
+        }
+        config = {
+            "response": {"email": email},
+            "audit": {
+                "audit_log": str(self.tmp_path / "audit.ndjson"),
+                "wazuh_event_log": str(self.tmp_path / "wazuh.ndjson"),
+            },
+        }
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+        return config_path
+
+    def test_alerts_are_digested_per_recipient_over_one_connection(self) -> None:
+        with self.notifier(digest_window_seconds=3600) as notifier:
+            for index in range(3):
+                notifier.notify(f"alert {index}", f"body {index}")
+            notifier.flush_due()
+            self.assertEqual(self.server.messages, [])
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(sorted(message["To"] for message in self.server.messages), ["a@example.com", "b@example.com"])
+        self.assertEqual(self.server.messages[0]["Subject"], "[SOC Lite] 3 alerts")
+        self.assertIn("body 2", self.server.messages[0].get_payload())
+
+    def test_rate_limit_and_reconnect(self) -> None:
+        self.server.drop_after_message = True
+        with self.notifier(rate_limit_per_minute=6, rate_limit_burst=1) as notifier:
+            notifier.notify("first", "body", ["a@example.com"])
+            notifier.notify("second", "body", ["a@example.com"])
+            notifier.notify("third", "body", ["a@example.com"])
+            self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(self.slept, [10.0])
+        self.assertEqual([message["Subject"] for message in self.server.messages], ["first", "[SOC Lite] 2 alerts"])
+        self.assertEqual(self.server.connections, 2)
+
+    def test_throttled_alerts_are_sent_without_a_digest_window(self) -> None:
+        with self.notifier(rate_limit_per_minute=6, rate_limit_burst=1) as notifier:
+            notifier.notify("first", "body", ["a@example.com"])
+            notifier.notify("second", "body", ["a@example.com"])
+            self.assertEqual(len(self.server.messages), 1)
+            self.now += 10
+            deadline = time.monotonic() + 5
+            while notifier._pending and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(notifier._pending, {})
+        self.assertEqual(self.slept, [])
+        self.assertEqual([message["Subject"] for message in self.server.messages], ["first", "second"])
+
+    def test_permanent_rejection_is_audited_not_resent(self) -> None:
+        self.server.data_reply = "554 5.7.1 message rejected"
+        with self.notifier() as notifier:
+            notifier.notify("rejected", "body", ["a@example.com"])
+            self.assertEqual(notifier._pending, {})
+        self.assertEqual((self.server.connections, len(self.server.messages)), (1, 1))
+        errors = [event for event in read_audit_events(self.tmp_path / "audit.ndjson") if event["type"] == "notification_error"]
+        self.assertEqual(len(errors), 1)
+        self.assertIn("554", errors[0]["payload"]["error"])
+
+    def test_send_email_shares_one_notifier(self) -> None:
+        config_path = self.configure(digest_window_seconds=3600)
+        with mock.patch.dict("response.notify._notifiers", clear=True):
+            send_email("first", "body", config_path)
+            send_email("second", "body", config_path)
+            notifier = get_notifier(config_path)
+            self.assertEqual(len(notifier._pending["a@example.com"]), 2)
+            notifier.close()
+        self.assertEqual([message["Subject"] for message in self.server.messages], ["[SOC Lite] 2 alerts"] * 2)
+        self.assertEqual(self.server.connections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
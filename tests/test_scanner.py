@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from logs.rotation import archive_outputs
+from scanner.nmap_scan import expand_shards, failed_shards, iter_scan, run_scan
+from ai_engine.train_model import count_features, count_path
+from scanner.parse_results import csv_row, iter_results, parse_xml, write_csv
+from scanner.snapshot import ScanSnapshot, read_rows, write_snapshot
+from scanner.state_index import ScanStateIndex
+
+NMAP_XML = """<?xml version="1.0"?>
+<nmaprun scanner="nmap">
+  <hosthint><status state="up"/><address addr="10.0.0.1" addrtype="ipv4"/></hosthint>
+  <host>
+    <address addr="10.0.0.1" addrtype="ipv4"/>
+    <hostnames><hostname name="alpha"/></hostnames>
+    <ports>
+      <port protocol="tcp" portid="22"><state state="open"/><service name="ssh" product="OpenSSH"/></port>
+      <port protocol="tcp" portid="80"><state state="open"/><service name="http"/></port>
+    </ports>
+  </host>
+  <host>
+    <address addr="10.0.0.2" addrtype="ipv4"/>
+    <status state="down"/>
+  </host>
+  <host>
+    <address addr="10.0.0.3" addrtype="ipv4"/>
+    <ports>
+      <port protocol="tcp" portid="443"><state state="filtered"/></port>
+    </ports>
+  </host>
+  <runstats><finished time="0"/></runstats>
+</nmaprun>
+"""
+
+
+class ParseResultsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        self.scan_path = self.tmp_path / "scan.xml"
+        self.scan_path.write_text(NMAP_XML, encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_streaming_parser_yields_port_records(self) -> None:
+        records = iter_results(self.scan_path)
+        first = next(records)
+        self.assertEqual(
+            first,
+            {"ip": "10.0.0.1", "hostname": "alpha", "port": 22, "state": "open", "service": "ssh", "product": "OpenSSH"},
+        )
+        rest = list(records)
+        self.assertEqual([(r["ip"], r["port"]) for r in rest], [("10.0.0.1", 80), ("10.0.0.3", 443)])
+        self.assertEqual(rest[1], {"ip": "10.0.0.3", "hostname": "", "port": 443, "state": "filtered", "service": "", "product": ""})
+        self.assertEqual(parse_xml(self.scan_path), [first, *rest])
+
+    def test_archived_scans_are_compressed_pruned_and_readable(self) -> None:
+        records = parse_xml(self.scan_path)
+        scans = []
+        for index in range(4):
+            path = self.tmp_path / f"nmap_scan_{index}.xml"
+            path.write_text(NMAP_XML, encoding="utf-8")
+            os.utime(path, (index, index))
+            scans.append(path)
+
+        archive_outputs(scans, keep_uncompressed=1, keep=3)
+        remaining = sorted(path.name for path in self.tmp_path.glob("nmap_scan_*"))
+        self.assertEqual(remaining, ["nmap_scan_1.xml.gz", "nmap_scan_2.xml.gz", "nmap_scan_3.xml"])
+        self.assertEqual(list(iter_results(self.tmp_path / "nmap_scan_1.xml.gz")), records)
+
+    def test_snapshot_reads_back_like_the_csv(self) -> None:
+        records = parse_xml(self.scan_path) * 3 + [{"ip": "10.0.0.4", "port": None, "service": "SSH"}]
+        snapshot_path = write_snapshot(records, self.tmp_path / "parsed.snap")
+        csv_path = self.tmp_path / "parsed.csv"
+        write_csv(records, csv_path)
+
+        self.assertEqual(list(read_rows(snapshot_path)), list(read_rows(csv_path)))
+        self.assertEqual(list(read_rows(snapshot_path))[0], csv_row(records[0]))
+        with ScanSnapshot(snapshot_path) as snapshot:
+            self.assertEqual(len(snapshot), 10)
+            self.assertEqual(snapshot.columns["ip"].dictionary, ["10.0.0.1", "10.0.0.3", "10.0.0.4"])
+            self.assertEqual(list(snapshot.columns["port"].values[:3]), [22, 80, 443])
+            self.assertEqual(snapshot.columns["port"].values[-1], -1)
+        self.assertEqual(count_path(snapshot_path), count_features(read_rows(csv_path)))
+
+
+FAKE_NMAP = """#!{python}
+import ipaddress, os, sys, time
+args = sys.argv[1:]
+output = args[args.index("-oX") + 1]
+target = args[-1]
+marker = os.path.join(os.environ["FAKE_NMAP_STATE"], target.replace("/", "_"))
+if target in os.environ.get("FAKE_NMAP_FAIL_ONCE", "").split(",") and not os.path.exists(marker):
+    open(marker, "w").close()
+    sys.stderr.write("transient failure")
+    sys.exit(1)
+if target in os.environ.get("FAKE_NMAP_FAIL", "").split(","):
+    sys.stderr.write("host unreachable")
+    sys.exit(1)
+started = time.time()
+time.sleep(float(os.environ.get("FAKE_NMAP_DELAY", "0")))
+if target in os.environ.get("FAKE_NMAP_SLOW", "").split(","):
+    time.sleep(0.3)
+with open(marker + ".times", "w") as fh:
+    fh.write("%r %r" % (started, time.time()))
+address = ipaddress.ip_network(target, strict=False).network_address + 1
+with open(output, "w") as fh:
+    fh.write('<?xml version="1.0"?><nmaprun><host><address addr="%s" addrtype="ipv4"/>'
+             '<ports><port protocol="tcp" portid="22"><state state="open"/><service name="ssh"/></port></ports>'
+             '</host></nmaprun>' % address)
+"""
+
+
+class ShardedScanTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        bin_dir = self.tmp_path / "bin"
+        bin_dir.mkdir()
+        fake_nmap = bin_dir / "nmap"
+        fake_nmap.write_text(FAKE_NMAP.format(python=sys.executable), encoding="utf-8")
+        fake_nmap.chmod(0o755)
+        self.saved_env = dict(os.environ)
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+        os.environ["FAKE_NMAP_STATE"] = str(self.tmp_path)
+
+        self.config_path = self.tmp_path / "config.json"
+        config = {
+            "scanner": {
+                "targets": ["10.1.0.0/22", "10.2.0.0/24"],
+                "nmap_args": ["-sV"],
+                "output_dir": str(self.tmp_path / "scans"),
+                "sharding": {"enabled": True, "shard_prefix": 24, "max_workers": 5, "retries": 1},
+            },
+            "audit": {
+                "audit_log": str(self.tmp_path / "audit.ndjson"),
+                "wazuh_event_log": str(self.tmp_path / "wazuh.ndjson"),
+            },
+        }
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+
+    def tearDown(self) -> None:
+        os.environ.clear()
+        os.environ.update(self.saved_env)
+        self.tmp.cleanup()
+
+    def test_expand_shards(self) -> None:
+        self.assertEqual(len(expand_shards(["10.0.0.0/16"])), 256)
+        self.assertEqual(expand_shards(["10.0.0.0/24"], shard_hosts=64)[1], "10.0.0.64/26")
+        self.assertEqual(expand_shards(["10.0.0.5", "scanme.example"]), ["10.0.0.5/32", "scanme.example"])
+
+    def test_shards_run_concurrently_and_merge(self) -> None:
+        os.environ["FAKE_NMAP_DELAY"] = "0.5"
+        os.environ["FAKE_NMAP_FAIL_ONCE"] = "10.1.2.0/24"
+        scan_path = run_scan(self.config_path)
+
+        runs = [tuple(map(float, path.read_text().split())) for path in self.tmp_path.glob("*.times")]
+        self.assertEqual(len(runs), 5)
+        # Every shard sleeps, so with one worker per shard the first to finish
+        # ends after the last one started.
+        self.assertLess(max(start for start, _ in runs), min(end for _, end in runs))
+        ips = [record["ip"] for record in iter_results(scan_path)]
+        self.assertEqual(ips, ["10.1.0.1", "10.1.1.1", "10.1.2.1", "10.1.3.1", "10.2.0.1"])
+        self.assertEqual(list((self.tmp_path / "scans").iterdir()), [scan_path])
+
+    def test_streamed_shards_follow_shard_order(self) -> None:
+        os.environ["FAKE_NMAP_SLOW"] = "10.1.0.0/24"
+        streamed = [record["ip"] for path in iter_scan(self.config_path) for record in iter_results(path)]
+        (scan_path,) = (self.tmp_path / "scans").iterdir()
+        self.assertEqual(streamed, [record["ip"] for record in iter_results(scan_path)])
+        self.assertEqual(streamed[0], "10.1.0.1")
+
+    def test_failed_shard_services_are_not_reported_closed(self) -> None:
+        os.environ["FAKE_NMAP_FAIL"] = "10.1.3.0/24"
+        scan_path = run_scan(self.config_path)
+        self.assertEqual(failed_shards(scan_path), ["10.1.3.0/24"])
+
+        previous = [
+            {"ip": "10.1.3.1", "hostname": "", "port": 22, "state": "open", "service": "ssh", "product": ""},
+            {"ip": "10.2.0.1", "hostname": "", "port": 3389, "state": "open", "service": "ms-wbt-server", "product": ""},
+        ]
+        with ScanStateIndex(self.tmp_path / "state.sqlite") as index:
+            index.apply(previous, "t1")
+            _, changes = index.apply(iter_results(scan_path), "t2", failed_shards(scan_path))
+            self.assertEqual(
+                [(c["change"], c["ip"], c["port"]) for c in changes if c["change"] != "opened"],
+                [("closed", "10.2.0.1", 3389)],
+            )
+            # The service survives the failed shard, so the next scan does not report it opened again.
+            _, changes = index.apply([previous[0]], "t3")
+        self.assertNotIn(("opened", "10.1.3.1"), [(c["change"], c["ip"]) for c in changes])
+
+
+class ScanStateIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = ScanStateIndex(Path(self.tmp.name) / "state.sqlite")
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_only_changes_are_returned(self) -> None:
+        first = [
+            {"ip": "10.0.0.1", "hostname": "a", "port": 22, "state": "open", "service": "ssh", "product": "OpenSSH"},
+            {"ip": "10.0.0.1", "hostname": "a", "port": 80, "state": "open", "service": "http", "product": "nginx"},
+            {"ip": "10.0.0.2", "hostname": "b", "port": 443, "state": "open", "service": "https", "product": "apache"},
+        ]
+        records, changes = self.index.apply(first, "t1")
+        self.assertEqual(len(records), 3)
+        self.assertEqual({change["change"] for change in changes}, {"opened"})
+
+        records, changes = self.index.apply([dict(record, port=str(record["port"])) for record in first], "t2")
+        self.assertEqual((records, changes), ([], []))
+
+        second = [
+            first[0],
+            {**first[1], "product": "apache"},
+            {"ip": "10.0.0.3", "hostname": "c", "port": 3389, "state": "open", "service": "ms-wbt-server", "product": ""},
+        ]
+        records, changes = self.index.apply(second, "t3")
+        self.assertEqual([(r["ip"], r["port"]) for r in records], [("10.0.0.1", 80), ("10.0.0.3", 3389)])
+        self.assertEqual(
+            [(c["change"], c["ip"], c["port"]) for c in changes],
+            [("changed", "10.0.0.1", 80), ("opened", "10.0.0.3", 3389), ("closed", "10.0.0.2", 443)],
+        )
+        self.assertEqual(changes[0]["previous"]["product"], "nginx")
+
+
+if __name__ == "__main__":
+    unittest.main()
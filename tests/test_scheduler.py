@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ai_engine.train_model import build_baseline, read_baseline
+from scanner.parse_results import iter_results
+from scripts.scheduler import PipelineScheduler
+
+
+class PipelineSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        self.config_path = self.tmp_path / "config.json"
+        config = {
+            "scheduler": {"scan_interval_minutes": 0.001, "retrain_interval_hours": 0.00005},
+            "ai_engine": {"model_path": str(self.tmp_path / "model.socm")},
+        }
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        self.status_path = self.tmp_path / "status.json"
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_jobs_run_in_turn_and_status_is_reported(self) -> None:
+        events = []
+
+        def slow_job() -> None:
+            events.append(("pipeline", "start", threading.current_thread()))
+            time.sleep(0.1)
+            events.append(("pipeline", "end", threading.current_thread()))
+
+        def failing_job() -> None:
+            events.append(("retrain", "start", threading.current_thread()))
+            events.append(("retrain", "end", threading.current_thread()))
+            raise RuntimeError("no data")
+
+        scheduler = PipelineScheduler(self.config_path, self.status_path, slow_job, failing_job)
+        thread = threading.Thread(target=scheduler.run_forever)
+        thread.start()
+        time.sleep(0.5)
+        scheduler.stop()
+        thread.join(timeout=5)
+
+        self.assertFalse(thread.is_alive())
+        # Every job finishes before the next one starts, all on the scheduler thread.
+        self.assertEqual({event[2] for event in events}, {thread})
+        self.assertEqual([event[1] for event in events], ["start", "end"] * (len(events) // 2))
+        self.assertEqual([event[0] for event in events[::2]], [event[0] for event in events[1::2]])
+        self.assertIn("retrain", [event[0] for event in events])
+        status = json.loads(self.status_path.read_text(encoding="utf-8"))
+        self.assertEqual(status["state"], "stopped")
+        pipeline = status["jobs"]["pipeline"]
+        self.assertEqual(pipeline["runs"], [event[:2] for event in events].count(("pipeline", "end")))
+        self.assertGreaterEqual(pipeline["runs"], 2)
+        self.assertGreater(pipeline["skipped"], 0)
+        self.assertEqual(pipeline["last_status"], "ok")
+        self.assertGreaterEqual(pipeline["last_duration_seconds"], 0.1)
+        self.assertEqual(status["jobs"]["retrain"]["last_status"], "error")
+        self.assertIn("no data", status["jobs"]["retrain"]["last_error"])
+
+    def test_retrain_rebuilds_an_incrementally_trained_model(self) -> None:
+        scan_path = self.tmp_path / "scan.json"
+        hosts = [{"ip": "10.0.0.1", "hostname": "a", "ports": [{"port": 22, "service": "ssh", "state": "open"}]}]
+        scan_path.write_text(json.dumps({"hosts": hosts}), encoding="utf-8")
+        model_path = self.tmp_path / "model.json"
+        config = {
+            "ai_engine": {
+                "model_path": str(model_path),
+                "explanation_dir": str(self.tmp_path / "explanations"),
+                "detection_store": str(self.tmp_path / "detections.sqlite"),
+                "incremental_training": {"enabled": True},
+            },
+            "audit": {
+                "audit_log": str(self.tmp_path / "audit.ndjson"),
+                "wazuh_event_log": str(self.tmp_path / "wazuh.ndjson"),
+            },
+        }
+        self.config_path.write_text(json.dumps(config), encoding="utf-8")
+        expected = build_baseline(iter_results(scan_path))
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp_path)
+        try:
+            scheduler = PipelineScheduler(self.config_path, self.status_path)
+            with mock.patch("scripts.run_pipeline.run_scan", return_value=scan_path):
+                scheduler.run_job("pipeline")
+                scheduler.run_job("pipeline")
+            self.assertEqual(read_baseline(model_path)["port_counts"], {"22": 2})
+            scheduler.run_job("retrain")
+            scheduler._release_model()
+        finally:
+            os.chdir(cwd)
+
+        status = json.loads(self.status_path.read_text(encoding="utf-8"))
+        self.assertEqual([job["last_status"] for job in status["jobs"].values()], ["ok", "ok"])
+        self.assertEqual(read_baseline(model_path), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
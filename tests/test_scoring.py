@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ai_engine.compiled_model import load_compiled_model, write_compiled_model
+from ai_engine.detect_anomalies import detect_records, load_model, score_batch, score_rows
+from ai_engine.detectors import DEFAULT_ISOLATION_FOREST, Detector, DetectorEnsemble, IsolationForestDetector
+from ai_engine.host_scoring import score_hosts
+from ai_engine.train_model import build_baseline, read_baseline, train_model, update_model, write_model
+from scanner.parse_results import write_csv
+
+TRAINING = [
+    {"port": "22", "service": "ssh", "product": "OpenSSH"},
+    {"port": "22", "service": "ssh", "product": "OpenSSH"},
+    {"port": "80", "service": "http", "product": "nginx"},
+    {"port": "443", "service": "https", "product": ""},
+]
+
+SCORING = TRAINING + [
+    {"port": "8080", "service": "http", "product": "nginx"},
+    {"port": "3389", "service": "ms-wbt-server", "product": "Microsoft Terminal Services"},
+    {"port": "22", "service": "", "product": None},
+]
+
+
+class BatchScoringTest(unittest.TestCase):
+    def test_batch_engine_matches_row_engine(self) -> None:
+        model = build_baseline(TRAINING)
+        rows = list(score_rows(SCORING, model, 0.3))
+        batch = list(score_batch(SCORING, model, 0.3))
+
+        self.assertEqual([row[:3] for row in rows], [row[:3] for row in batch])
+        for row, batched in zip(rows, batch):
+            self.assertEqual(batched[3], row[3] if row[2] else [])
+        self.assertTrue(any(row[2] for row in batch))
+
+
+class FlagPortDetector(Detector):
+    name = "flag_port"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def score(self, records):
+        self.calls += 1
+        return [1.0 if record["port"] == "80" else 0.0 for record in records]
+
+
+class DetectorEnsembleTest(unittest.TestCase):
+    def test_scores_are_blended_by_weight(self) -> None:
+        model = build_baseline(TRAINING)
+        detector = FlagPortDetector()
+        ensemble = DetectorEnsemble(3.0, [(detector, 1.0)])
+        baseline = list(score_batch(SCORING, model, 0.3, explain_all=True))
+        detections = list(detect_records(SCORING, model, 0.3, ensemble=ensemble))
+
+        self.assertEqual(detector.calls, 1)
+        for record, (baseline_score, *_), detection in zip(SCORING, baseline, detections):
+            expected = 0.75 * baseline_score + (0.25 if record["port"] == "80" else 0.0)
+            self.assertEqual(detection["anomaly_score"], round(expected, 3))
+            self.assertEqual(detection["prediction"], expected > 0.3)
+            self.assertEqual(detection["explanation"][-1]["feature"], "flag_port")
+            self.assertEqual(len(detection["explanation"]), 5)
+
+
+class _StubForest:
+    offset_ = -0.5
+
+
+class _StubPipeline:
+    """Stands in for ``Pipeline(preprocessor, IsolationForest)``: ``decision_function`` is ``score_samples - offset_``."""
+
+    def __init__(self, score_samples):
+        self.score_samples = score_samples
+
+    def __getitem__(self, index):
+        return _StubForest()
+
+    def decision_function(self, frame):
+        return [sample - _StubForest.offset_ for sample in self.score_samples[: len(frame)]]
+
+
+class IsolationForestDetectorTest(unittest.TestCase):
+    def test_scores_are_the_isolation_scores_clamped_to_one(self) -> None:
+        pipeline = _StubPipeline([-0.75, -0.25, -1.5])
+        with mock.patch("ai_engine.detectors.load_isolation_forest", return_value=pipeline), mock.patch.object(
+            IsolationForestDetector, "frame", lambda self, records: records
+        ):
+            detector = IsolationForestDetector()
+            self.assertEqual(detector.score([]), [])
+            self.assertEqual(detector.score(TRAINING[:3]), [0.75, 0.25, 1.0])
+
+    @unittest.skipUnless(
+        all(importlib.util.find_spec(name) for name in ("sklearn", "joblib", "pandas")),
+        "requires scikit-learn, joblib and pandas",
+    )
+    def test_shipped_model_scores_match_score_samples(self) -> None:
+        detector = IsolationForestDetector(DEFAULT_ISOLATION_FOREST)
+        frame = detector.frame(SCORING)
+        samples = detector.pipeline.score_samples(frame)
+        scores = detector.score(SCORING)
+        self.assertEqual(len(scores), len(SCORING))
+        for sample, score in zip(samples, scores):
+            self.assertAlmostEqual(score, min(max(-float(sample), 0.0), 1.0))
+
+
+class HostScoringTest(unittest.TestCase):
+    def test_hosts_are_scored_against_their_previous_ports(self) -> None:
+        model = build_baseline(TRAINING)
+        records = [
+            {"ip": "10.0.0.1", "port": "22", "state": "open", "service": "ssh", "product": "OpenSSH"},
+            {"ip": "10.0.0.2", "port": "22", "state": "open", "service": "ssh", "product": "OpenSSH"},
+            {"ip": "10.0.0.2", "port": "8080", "state": "open", "service": "http", "product": "nginx"},
+            {"ip": "10.0.0.2", "port": "3389", "state": "filtered", "service": "ms-wbt-server", "product": ""},
+        ]
+        detections = list(detect_records(records, model, 0.9))
+        hosts = score_hosts(detections, model, 0.5, {"10.0.0.1": {"22"}, "10.0.0.2": {"22"}}, exposure_ports=4)
+
+        self.assertEqual([host["ip"] for host in hosts], ["10.0.0.1", "10.0.0.2"])
+        quiet, noisy = hosts
+        self.assertEqual((quiet["jaccard"], quiet["new_ports"], quiet["prediction"]), (1.0, [], False))
+        self.assertEqual(noisy["jaccard"], round(1 / 3, 3))
+        self.assertEqual(noisy["new_ports"], ["3389", "8080"])
+        self.assertEqual(noisy["open_ports"], 2)
+        self.assertEqual(noisy["features"]["exposure"], 0.5)
+        self.assertTrue(noisy["prediction"])
+        self.assertEqual([port["port"] for port in noisy["ports"]], ["8080", "3389"])
+        self.assertGreaterEqual(noisy["host_score"], max(det["anomaly_score"] for det in detections[1:]))
+
+
+class CompiledModelTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model_path = Path(self.tmp.name) / "model.socm"
+        self.baseline = build_baseline(TRAINING)
+        write_compiled_model(self.baseline, self.model_path)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_round_trip_and_lookup(self) -> None:
+        model = load_compiled_model(self.model_path)
+        try:
+            self.assertEqual(model.to_baseline(), self.baseline)
+            ports = model.tables["port"]
+            self.assertEqual(ports.code("8080"), 0)
+            self.assertAlmostEqual(ports.rarity[ports.code("80")], 0.5)
+            self.assertEqual(model.tables["combo"].code("ssh|22"), model.tables["combo"].encode(["ssh|22"])[0])
+        finally:
+            model.close()
+
+    def test_compiled_model_scores_like_json_model(self) -> None:
+        model = load_model(self.model_path)
+        try:
+            compiled = list(score_batch(SCORING, model, 0.3, explain_all=True))
+        finally:
+            model.close()
+        self.assertEqual(compiled, list(score_rows(SCORING, self.baseline, 0.3)))
+
+
+class IncrementalTrainingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        self.model_path = self.tmp_path / "model.socm"
+        self.scans = [TRAINING, SCORING, [{"port": "25", "service": "smtp", "product": "postfix"}] * 3]
+        self.scan_paths = []
+        for index, rows in enumerate(self.scans):
+            path = self.tmp_path / f"scan{index}.csv"
+            write_csv(rows, path)
+            self.scan_paths.append(path)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def configure(self, **incremental: object) -> Path:
+        config_path = self.tmp_path / "config.json"
+        config = {"ai_engine": {"model_path": str(self.model_path), "incremental_training": incremental}}
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+        return config_path
+
+    def test_merging_without_decay_matches_full_retrain(self) -> None:
+        config_path = self.configure()
+        for path in self.scan_paths:
+            update_model(path, config_path)
+        expected = build_baseline(row for rows in self.scans for row in rows)
+        self.assertEqual(read_baseline(self.model_path), expected)
+
+    def test_decay_discounts_older_scans(self) -> None:
+        config_path = self.configure(decay=0.5)
+        write_model(build_baseline(TRAINING), self.model_path)
+        update_model(self.scan_paths[2], config_path)
+        baseline = read_baseline(self.model_path)
+        self.assertEqual(baseline["port_counts"]["22"], 1)
+        self.assertEqual(baseline["port_counts"]["25"], 3)
+        self.assertEqual(baseline["totals"]["max_port_count"], 3)
+        self.assertEqual(baseline["totals"]["records"], 5)
+
+    def test_sliding_window_keeps_last_scans(self) -> None:
+        config_path = self.configure(window_scans=2)
+        for path in self.scan_paths:
+            update_model(path, config_path)
+        expected = build_baseline(row for rows in self.scans[1:] for row in rows)
+        self.assertEqual(read_baseline(self.model_path), expected)
+
+    def test_full_retrain_resets_the_window(self) -> None:
+        config_path = self.configure(window_scans=2)
+        update_model(self.scan_paths[0], config_path)
+        update_model(self.scan_paths[1], config_path)
+        train_model(self.scan_paths[2], config_path)
+        update_model(self.scan_paths[1], config_path)
+        expected = build_baseline(row for rows in (self.scans[2], self.scans[1]) for row in rows)
+        self.assertEqual(read_baseline(self.model_path), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()